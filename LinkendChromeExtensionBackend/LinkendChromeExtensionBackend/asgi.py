@@ -3,6 +3,11 @@ ASGI config for LinkendChromeExtensionBackend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server so the async endpoints under /api/async/ share
+one event loop per worker, e.g.:
+
+    gunicorn LinkendChromeExtensionBackend.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables from .env file
 load_dotenv()
@@ -78,7 +79,26 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "LinkendChromeExtensionBackend.wsgi.application"
 
+# Database connections: kept open for DB_CONN_MAX_AGE seconds and checked before reuse,
+# or (DB_POOL=true) served from psycopg 3's pool (psycopg_pool, from `psycopg[binary,pool]`).
+# Prefer the pool when serving ASGI, where persistent connections are not reused across requests.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true'
+DB_POOL = os.getenv('DB_POOL', 'false').lower() == 'true'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+# Open the connection when a gunicorn worker boots (see gunicorn.conf.py)
+DB_PREWARM = os.getenv('DB_PREWARM', 'true').lower() == 'true'
+
 DB_HOST = os.getenv('DB_HOST', '')
+if DB_HOST and DB_POOL:
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            'DB_POOL=true needs psycopg 3 and its pool package: pip install "psycopg[binary,pool]"'
+        ) from e
 if DB_HOST:
     # Use PostgreSQL (Supabase) for production
     DATABASES = {
@@ -89,13 +109,28 @@ if DB_HOST:
             'PASSWORD': os.getenv('DB_PASSWORD', ''),
             'HOST': DB_HOST,
             'PORT': os.getenv('DB_PORT', '5432'),
+            # The pool replaces persistent connections; Django rejects both at once.
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': DB_POOL_MIN_SIZE,
+                    'max_size': DB_POOL_MAX_SIZE,
+                    'timeout': DB_POOL_TIMEOUT,
+                },
+            } if DB_POOL else {},
         }
     }
 else:
+    # Opt-in for SQLite serving concurrent writers (batch/async endpoints, a job worker):
+    # take the write lock when a transaction starts and wait up to 20s for it instead of
+    # failing with "database is locked". Off by default, as it serialises every transaction.
+    SQLITE_IMMEDIATE_TRANSACTIONS = os.getenv('SQLITE_IMMEDIATE_TRANSACTIONS', 'false').lower() == 'true'
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {'timeout': 20, 'transaction_mode': 'IMMEDIATE'} if SQLITE_IMMEDIATE_TRANSACTIONS else {},
         }
     }
 
@@ -164,14 +199,104 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'if-none-match',
+    'if-modified-since',
 ]
+# Let the extension read the validators for conditional profile lookups
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
 
 # Environment variables
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 GEMINI_API_URL = os.getenv('GEMINI_API_URL', '')
+# Defaults to GEMINI_API_URL with :streamGenerateContent?alt=sse
+GEMINI_STREAM_API_URL = os.getenv('GEMINI_STREAM_API_URL', '')
+GEMINI_CONNECT_TIMEOUT = float(os.getenv('GEMINI_CONNECT_TIMEOUT', '5'))
+GEMINI_READ_TIMEOUT = float(os.getenv('GEMINI_READ_TIMEOUT', '60'))
+# Deadline for one call across all its attempts; read timeouts themselves are never retried.
+GEMINI_TOTAL_TIMEOUT = float(os.getenv('GEMINI_TOTAL_TIMEOUT', '90'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '3'))
+GEMINI_BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', '0.5'))
+GEMINI_BACKOFF_MAX = float(os.getenv('GEMINI_BACKOFF_MAX', '20'))
+GEMINI_POOL_MAXSIZE = int(os.getenv('GEMINI_POOL_MAXSIZE', '10'))
+GEMINI_ASYNC_MAX_CONNECTIONS = int(os.getenv('GEMINI_ASYNC_MAX_CONNECTIONS', '256'))
+# Ask Gemini for application/json constrained by a responseSchema derived from the serializers
+GEMINI_STRUCTURED_OUTPUT = os.getenv('GEMINI_STRUCTURED_OUTPUT', 'true').lower() == 'true'
 SUPABASE_ANON_KEY = os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY', '')
 SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY', '')
 
+# Analysis cache (in-process LRU + analysis_cache table)
+ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true'
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', str(7 * 24 * 3600)))
+ANALYSIS_CACHE_MEMORY_SIZE = int(os.getenv('ANALYSIS_CACHE_MEMORY_SIZE', '256'))
+ANALYSIS_CACHE_DB_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_DB_MAX_ENTRIES', '10000'))
+# Seconds between evictions per worker, and between last_accessed refreshes of a row.
+ANALYSIS_CACHE_EVICT_INTERVAL = int(os.getenv('ANALYSIS_CACHE_EVICT_INTERVAL', '300'))
+ANALYSIS_CACHE_TOUCH_INTERVAL = int(os.getenv('ANALYSIS_CACHE_TOUCH_INTERVAL', '300'))
+
+# Profile lookup cache for get-analyzed-data / get-raw-data.
+# Invalidations only reach the workers that share the backend, so the cache is off by default
+# unless PROFILE_CACHE_BACKEND names a shared one (e.g. django.core.cache.backends.filebased.FileBasedCache
+# with a directory as PROFILE_CACHE_LOCATION, or redis). Locmem is per process: enable it only with one worker.
+PROFILE_CACHE_BACKEND = os.getenv('PROFILE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+PROFILE_CACHE_ENABLED = os.getenv(
+    'PROFILE_CACHE_ENABLED', str(PROFILE_CACHE_BACKEND != 'django.core.cache.backends.locmem.LocMemCache')
+).lower() == 'true'
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '300'))
+PROFILE_CACHE_NEGATIVE_TTL = int(os.getenv('PROFILE_CACHE_NEGATIVE_TTL', '30'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'profiles': {
+        'BACKEND': PROFILE_CACHE_BACKEND,
+        'LOCATION': os.getenv('PROFILE_CACHE_LOCATION', 'profile-lookups'),
+        'TIMEOUT': PROFILE_CACHE_TTL,
+    },
+}
+
+# Batch analyze endpoint
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv('ANALYZE_BATCH_MAX_ITEMS', '50'))
+ANALYZE_BATCH_CONCURRENCY = int(os.getenv('ANALYZE_BATCH_CONCURRENCY', '25'))
+
+# Batch save endpoint
+SAVE_BATCH_MAX_ITEMS = int(os.getenv('SAVE_BATCH_MAX_ITEMS', '500'))
+
+# Bulk profile lookup endpoint
+PROFILE_LOOKUP_MAX_ITEMS = int(os.getenv('PROFILE_LOOKUP_MAX_ITEMS', '500'))
+
+# Full-text profile search endpoint
+SEARCH_DEFAULT_RESULTS = int(os.getenv('SEARCH_DEFAULT_RESULTS', '20'))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '100'))
+
+# Admin changelists estimate row counts at or above this size on Postgres instead of running COUNT(*)
+ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ESTIMATED_COUNT_THRESHOLD', '100000'))
+
+# raw_data blob storage: compression codec ('zlib' or 'lzma') and decoded payloads cached per process
+JSON_BLOB_CODEC = os.getenv('JSON_BLOB_CODEC', 'zlib')
+JSON_BLOB_CACHE_SIZE = int(os.getenv('JSON_BLOB_CACHE_SIZE', '512'))
+
+# Analysis jobs: 'thread' runs jobs inside each web worker, 'external' leaves them to `manage.py run_analysis_worker`
+ANALYSIS_JOB_MODE = os.getenv('ANALYSIS_JOB_MODE', 'thread')
+ANALYSIS_JOB_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', '4'))
+# A running job is stale once its worker's heartbeat (every ANALYSIS_JOB_HEARTBEAT_INTERVAL seconds) is this old
+ANALYSIS_JOB_STALE_AFTER = int(os.getenv('ANALYSIS_JOB_STALE_AFTER', '600'))
+ANALYSIS_JOB_HEARTBEAT_INTERVAL = int(os.getenv('ANALYSIS_JOB_HEARTBEAT_INTERVAL', '60'))
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_JOB_MAX_ATTEMPTS', '3'))
+# Seconds between the 'thread' mode recovery passes that re-queue stale jobs and pick up orphaned pending ones
+ANALYSIS_JOB_RECOVERY_INTERVAL = int(os.getenv('ANALYSIS_JOB_RECOVERY_INTERVAL', '60'))
+
+# Single-flight coalescing of identical concurrent Gemini requests
+SINGLEFLIGHT_CROSS_PROCESS = os.getenv('SINGLEFLIGHT_CROSS_PROCESS', 'true').lower() == 'true'
+SINGLEFLIGHT_LOCK_TIMEOUT = float(os.getenv('SINGLEFLIGHT_LOCK_TIMEOUT', '90'))
+SINGLEFLIGHT_LOCK_DIR = os.getenv('SINGLEFLIGHT_LOCK_DIR', '')
+# Seconds a coalesced call's result is kept for the workers that waited on it (and the TTL of salvaged analyses)
+SINGLEFLIGHT_RESULT_TTL = int(os.getenv('SINGLEFLIGHT_RESULT_TTL', '30'))
+
+# Prompt compaction: estimated input-token budget per Gemini prompt
+PROMPT_INPUT_TOKEN_BUDGET = int(os.getenv('PROMPT_INPUT_TOKEN_BUDGET', '6000'))
+PROMPT_MAX_POSTS = int(os.getenv('PROMPT_MAX_POSTS', '5'))
+PROMPT_MAX_POST_CHARS = int(os.getenv('PROMPT_MAX_POST_CHARS', '1000'))
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [],
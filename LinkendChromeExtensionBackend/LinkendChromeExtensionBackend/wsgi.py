@@ -16,3 +16,9 @@ os.environ.setdefault(
 )
 
 application = get_wsgi_application()
+
+# Django gives every async view its own event loop under WSGI; run the async
+# Gemini calls on one shared loop so they share a client and its connection pool.
+from api import gemini  # noqa: E402
+
+gemini.use_shared_event_loop()
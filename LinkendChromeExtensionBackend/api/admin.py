@@ -1,6 +1,14 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
 from django.utils.html import format_html
-from .models import AnalyzedProfile, RawData
+from . import blobs, search
+from .date_buckets import bucketed
+from .pagination import EstimatedCountPaginator
+from .models import AnalyzedProfile, RawData, AnalysisJob, extract_linkedin_profile_id
 
 # Customize Django Admin Site
 admin.site.site_header = "LinkedIn DISC Analyzer"
@@ -8,7 +16,94 @@ admin.site.site_title = "LinkedIn DISC Analyzer"
 admin.site.index_title = "Welcome to LinkedIn DISC Analyzer Administration"
 
 
+class RawDataBlobForm(forms.ModelForm):
+    """
+    Edits raw_data, which lives in compressed blobs rather than a column, as
+    JSON. A changed value is written back as new blobs by RawDataBlobMixin.
+    """
+    raw_data = forms.JSONField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 20, 'cols': 100}),
+        help_text='Stored compressed and content-addressed; saving a change writes a new blob.',
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['raw_data'].initial = self.instance.raw_data
+
+
+class RawDataBlobMixin:
+    """
+    Save an edited raw_data to the blob store before the row that points at it.
+    """
+    form = RawDataBlobForm
+
+    def save_model(self, request, obj, form, change):
+        if 'raw_data' in form.changed_data:
+            blobs.save_many(blobs.assign(obj, form.cleaned_data['raw_data']))
+            # No longer what the extension last sent, so its next save is written.
+            obj.content_hash = None
+        super().save_model(request, obj, form, change)
+
+
 # Custom Filters
+class FullTextSearchMixin:
+    """
+    Admin search through the full-text index (api.search) instead of icontains
+    over every search field. The whole term is also matched exactly against
+    `exact_search_fields`, with a LinkedIn URL reduced to its profile ID, so
+    identifier searches keep working. Uses the default search when there is no
+    full-text index.
+    """
+    exact_search_fields = ['profile_id']
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        matches = search.matching(queryset, term) if term else None
+        if matches is None:
+            return super().get_search_results(request, queryset, search_term)
+        term = extract_linkedin_profile_id(term) or term
+        for field in self.exact_search_fields:
+            try:
+                matches |= queryset.filter(**{field: term})
+            except ValidationError:
+                pass  # not a valid value for this field, e.g. a non-UUID term for user_id
+        return matches, False
+
+
+class DateBucketChangeList(ChangeList):
+    """
+    Changelist whose date_hierarchy buckets are found with index probes (api.date_buckets).
+    """
+
+    def get_queryset(self, request, exclude_parameters=None):
+        return bucketed(super().get_queryset(request, exclude_parameters))
+
+
+class DateBucketMixin:
+    """
+    Use DateBucketChangeList; only the changelist queryset gets the probing datetimes().
+    """
+
+    def get_changelist(self, request, **kwargs):
+        return DateBucketChangeList
+
+
+# SQLite's planner walks the list-order index, filtering every row, rather
+# than search a score or count index for a one-sided range (x >= ?), and it
+# cannot search a boolean index for a bare "WHERE flag". These spell the same
+# conditions in a form an index can bound (see check_query_plans).
+def at_least(field, value):
+    """`field` >= value, as a range closed at the largest value the column can hold."""
+    return Q(**{f'{field}__range': (value, connection.ops.integer_field_range('IntegerField')[1])})
+
+
+def flag_is(field, value):
+    """`field` = value for a BooleanField, compared explicitly."""
+    return Q(**{f'{field}__in': [value]})
+
+
 class ConfidenceLevelFilter(admin.SimpleListFilter):
     title = 'Confidence Level'
     parameter_name = 'confidence_level'
@@ -23,7 +118,7 @@ class ConfidenceLevelFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'high':
-            return queryset.filter(confidence__gte=80)
+            return queryset.filter(at_least('confidence', 80))
         if self.value() == 'medium':
             return queryset.filter(confidence__gte=50, confidence__lt=80)
         if self.value() == 'low':
@@ -48,7 +143,7 @@ class DISCScoreFilter(admin.SimpleListFilter):
     def queryset(self, request, queryset):
         if self.score_field:
             if self.value() == 'high':
-                return queryset.filter(**{f'{self.score_field}__gte': 70})
+                return queryset.filter(at_least(self.score_field, 70))
             if self.value() == 'medium':
                 return queryset.filter(**{f'{self.score_field}__gte': 40, f'{self.score_field}__lt': 70})
             if self.value() == 'low':
@@ -94,9 +189,9 @@ class HasInsightsFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'yes':
-            return queryset.exclude(key_insights__isnull=True).exclude(key_insights=[])
+            return queryset.filter(at_least('key_insights_count', 1))
         if self.value() == 'no':
-            return queryset.filter(key_insights__isnull=True) | queryset.filter(key_insights=[])
+            return queryset.filter(key_insights_count=0)
 
 
 class HasPainPointsFilter(admin.SimpleListFilter):
@@ -111,9 +206,9 @@ class HasPainPointsFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'yes':
-            return queryset.exclude(pain_points__isnull=True).exclude(pain_points=[])
+            return queryset.filter(at_least('pain_points_count', 1))
         if self.value() == 'no':
-            return queryset.filter(pain_points__isnull=True) | queryset.filter(pain_points=[])
+            return queryset.filter(pain_points_count=0)
 
 
 class HasCommunicationStyleFilter(admin.SimpleListFilter):
@@ -128,9 +223,9 @@ class HasCommunicationStyleFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'yes':
-            return queryset.exclude(communication_style__isnull=True).exclude(communication_style='')
+            return queryset.filter(flag_is('has_communication_style', True))
         if self.value() == 'no':
-            return queryset.filter(communication_style__isnull=True) | queryset.filter(communication_style='')
+            return queryset.filter(flag_is('has_communication_style', False))
 
 
 class HasSalesApproachFilter(admin.SimpleListFilter):
@@ -145,20 +240,20 @@ class HasSalesApproachFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'yes':
-            return queryset.exclude(sales_approach__isnull=True).exclude(sales_approach='')
+            return queryset.filter(flag_is('has_sales_approach', True))
         if self.value() == 'no':
-            return queryset.filter(sales_approach__isnull=True) | queryset.filter(sales_approach='')
+            return queryset.filter(flag_is('has_sales_approach', False))
 
 
 @admin.register(AnalyzedProfile)
-class AnalyzedProfileAdmin(admin.ModelAdmin):
+class AnalyzedProfileAdmin(RawDataBlobMixin, FullTextSearchMixin, DateBucketMixin, admin.ModelAdmin):
     # Display all relevant fields in list view
     list_display = [
         'name', 'profile_id', 'linkedin_profile_link', 'headline_short', 'disc_primary', 'confidence', 
         'dominance', 'influence', 'steadiness', 'compliance', 
         'communication_style_short', 'sales_approach_short', 
-        'key_insights_count', 'pain_points_count', 
-        'communication_dos_count', 'communication_donts_count',
+        'key_insights_count_display', 'pain_points_count_display', 
+        'communication_dos_count_display', 'communication_donts_count_display',
         'raw_data_ref_link', 'created_at'
     ]
     
@@ -180,13 +275,33 @@ class AnalyzedProfileAdmin(admin.ModelAdmin):
         'communication_style', 'sales_approach', 'best_approach', 
         'ideal_pitch', 'user_id'
     ]
+    exact_search_fields = ['profile_id', 'user_id']
     readonly_fields = [
         'id', 'created_at', 'key_insights_display', 'pain_points_display',
-        'communication_dos_display', 'communication_donts_display', 'raw_data_ref_link'
+        'communication_dos_display', 'communication_donts_display', 'raw_data_ref_link',
     ]
     list_per_page = 50
+    list_select_related = ['raw_data_ref']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if match is None or match.url_name != 'api_analyzedprofile_changelist':
+            return queryset
+        # Changelist: the JSON lists are shown through their count columns, so
+        # skip loading them, and load only the id and name of the joined RawData row.
+        raw_data_columns = [
+            f'raw_data_ref__{field.name}' for field in RawData._meta.concrete_fields
+            if field.name not in ('id', 'name')
+        ]
+        return queryset.defer(
+            'key_insights', 'pain_points', 'communication_dos', 'communication_donts',
+            'best_approach', 'ideal_pitch', *raw_data_columns
+        )
     
     # Custom display methods for list view
     def headline_short(self, obj):
@@ -210,33 +325,29 @@ class AnalyzedProfileAdmin(admin.ModelAdmin):
     sales_approach_short.short_description = 'Sales Approach'
     sales_approach_short.admin_order_field = 'sales_approach'
     
-    def key_insights_count(self, obj):
-        if obj.key_insights and isinstance(obj.key_insights, list):
-            count = len(obj.key_insights)
-            return f"{count} insight{'s' if count != 1 else ''}"
-        return '0 insights'
-    key_insights_count.short_description = 'Key Insights'
+    def key_insights_count_display(self, obj):
+        count = obj.key_insights_count
+        return f"{count} insight{'s' if count != 1 else ''}"
+    key_insights_count_display.short_description = 'Key Insights'
+    key_insights_count_display.admin_order_field = 'key_insights_count'
     
-    def pain_points_count(self, obj):
-        if obj.pain_points and isinstance(obj.pain_points, list):
-            count = len(obj.pain_points)
-            return f"{count} point{'s' if count != 1 else ''}"
-        return '0 points'
-    pain_points_count.short_description = 'Pain Points'
+    def pain_points_count_display(self, obj):
+        count = obj.pain_points_count
+        return f"{count} point{'s' if count != 1 else ''}"
+    pain_points_count_display.short_description = 'Pain Points'
+    pain_points_count_display.admin_order_field = 'pain_points_count'
     
-    def communication_dos_count(self, obj):
-        if obj.communication_dos and isinstance(obj.communication_dos, list):
-            count = len(obj.communication_dos)
-            return f"{count} do{'s' if count != 1 else ''}"
-        return '0 dos'
-    communication_dos_count.short_description = 'Do\'s'
+    def communication_dos_count_display(self, obj):
+        count = obj.communication_dos_count
+        return f"{count} do{'s' if count != 1 else ''}"
+    communication_dos_count_display.short_description = 'Do\'s'
+    communication_dos_count_display.admin_order_field = 'communication_dos_count'
     
-    def communication_donts_count(self, obj):
-        if obj.communication_donts and isinstance(obj.communication_donts, list):
-            count = len(obj.communication_donts)
-            return f"{count} don't{'s' if count != 1 else ''}"
-        return '0 don\'ts'
-    communication_donts_count.short_description = 'Don\'ts'
+    def communication_donts_count_display(self, obj):
+        count = obj.communication_donts_count
+        return f"{count} don't{'s' if count != 1 else ''}"
+    communication_donts_count_display.short_description = 'Don\'ts'
+    communication_donts_count_display.admin_order_field = 'communication_donts_count'
     
     def linkedin_profile_link(self, obj):
         if obj.linkedin_profile:
@@ -332,7 +443,7 @@ class AnalyzedProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(RawData)
-class RawDataAdmin(admin.ModelAdmin):
+class RawDataAdmin(RawDataBlobMixin, FullTextSearchMixin, DateBucketMixin, admin.ModelAdmin):
     # Display all relevant fields in list view
     list_display = [
         'name', 'profile_id', 'linkedin_profile_link', 'headline_short', 
@@ -354,6 +465,8 @@ class RawDataAdmin(admin.ModelAdmin):
     ]
     
     list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
     
@@ -437,3 +550,19 @@ class RawDataAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
     )
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'status', 'profile_id', 'cache_status', 'attempts',
+        'created_at', 'started_at', 'finished_at'
+    ]
+    list_filter = ['status', 'created_at']
+    search_fields = ['id', 'profile_id']
+    readonly_fields = [
+        'id', 'status', 'profile_id', 'profile_data', 'result', 'error', 'cache_status',
+        'attempts', 'created_at', 'started_at', 'heartbeat_at', 'finished_at'
+    ]
+    list_per_page = 50
+    ordering = ['-created_at']
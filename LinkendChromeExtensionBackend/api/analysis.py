@@ -0,0 +1,142 @@
+"""
+The profile analysis pipeline: prompt Gemini, validate its answer, and serve
+repeats from the analysis cache, with concurrent identical requests sharing
+one Gemini call.
+
+Shared by the HTTP views (sync and async) and the background job runner.
+"""
+from django.conf import settings
+
+from . import analysis_cache, gemini, singleflight
+from .llm_json import IncompleteJSON, finalize, partial_report
+from .models import extract_linkedin_profile_id
+from .prompts import ANALYSIS_PROMPT_VERSION, build_analysis_prompt
+from .serializers import AnalysisResponseSerializer
+
+
+class InvalidAnalysisResponse(Exception):
+    """
+    Raised when Gemini returns JSON that does not match AnalysisResponseSerializer.
+    """
+    def __init__(self, details):
+        super().__init__('Invalid analysis response from AI')
+        self.details = details
+
+
+def partial_result_ttl(result):
+    """
+    Cache TTL for a result: salvaged results are kept only briefly so the next
+    request retries for a complete one. None means the default TTL.
+    """
+    if partial_report(result) is not None:
+        return getattr(settings, 'SINGLEFLIGHT_RESULT_TTL', 30)
+    return None
+
+
+def failure_details(error):
+    """
+    Error body for an analysis that raised `error` (HTTP responses, batch entries and jobs).
+    """
+    if isinstance(error, IncompleteJSON):
+        return {
+            'error': 'Analysis response from AI was truncated',
+            'truncatedFields': error.report['truncated'],
+            'lostFields': error.report['lost'],
+            'details': error.details,
+        }
+    if isinstance(error, InvalidAnalysisResponse):
+        return {'error': 'Invalid analysis response from AI', 'details': error.details}
+    return {'error': 'Analysis failed', 'message': str(error)}
+
+
+def get_profile_analysis(profile_data):
+    """
+    Return (analysis, cache_status) for validated profile data.
+    Serves repeat profiles from the analysis cache; only responses that pass
+    AnalysisResponseSerializer are cached. Concurrent identical requests share a
+    single Gemini call. cache_status is 'memory', 'database', 'miss' or 'coalesced'.
+    A salvaged analysis carries its report under '_partial'; one that lost
+    required fields raises llm_json.IncompleteJSON.
+    """
+    cache_key = analysis_cache.make_key(profile_data, ANALYSIS_PROMPT_VERSION)
+    cached_result, cache_status = analysis_cache.get(cache_key)
+    if cached_result is not None:
+        return cached_result, cache_status
+
+    def run_analysis():
+        analysis_result = finalize(analyze_with_gemini(profile_data), AnalysisResponseSerializer)
+
+        response_serializer = AnalysisResponseSerializer(data=analysis_result)
+        if not response_serializer.is_valid():
+            raise InvalidAnalysisResponse(response_serializer.errors)
+
+        analysis_cache.store(
+            cache_key, analysis_result, ANALYSIS_PROMPT_VERSION,
+            ttl=partial_result_ttl(analysis_result)
+        )
+        return analysis_result
+
+    analysis_result, shared = singleflight.do(
+        analysis_flight_key(profile_data, cache_key),
+        run_analysis,
+        # After waiting on another worker: its result is in the cache. The miss was counted above.
+        lookup=lambda: analysis_cache.get(cache_key, record=False)[0],
+    )
+    return analysis_result, 'coalesced' if shared else cache_status
+
+
+def analysis_flight_key(profile_data, cache_key):
+    """
+    Single-flight key of an analysis (shared by the sync and async pipelines).
+    """
+    profile_id = extract_linkedin_profile_id(profile_data.get('linkedin_url'))
+    return f"analyze:{profile_id or '-'}:{cache_key}"
+
+
+def analyze_with_gemini(profile_data):
+    """
+    Analyze profile data using Google Gemini API.
+    """
+    prompt = build_analysis_prompt(profile_data)
+    data = gemini.generate_content(prompt.text, prompt.generation_config)
+    return gemini.parse_json_response(data)
+
+
+async def analyze_with_gemini_async(profile_data):
+    """
+    Async version of analyze_with_gemini().
+    """
+    prompt = build_analysis_prompt(profile_data)
+    data = await gemini.agenerate_content(prompt.text, prompt.generation_config)
+    return gemini.parse_json_response(data)
+
+
+async def aget_profile_analysis(profile_data):
+    """
+    Async version of get_profile_analysis().
+    """
+    cache_key = analysis_cache.make_key(profile_data, ANALYSIS_PROMPT_VERSION)
+    cached_result, cache_status = await analysis_cache.aget(cache_key)
+    if cached_result is not None:
+        return cached_result, cache_status
+
+    async def run_analysis():
+        analysis_result = finalize(await analyze_with_gemini_async(profile_data), AnalysisResponseSerializer)
+
+        response_serializer = AnalysisResponseSerializer(data=analysis_result)
+        if not response_serializer.is_valid():
+            raise InvalidAnalysisResponse(response_serializer.errors)
+
+        await analysis_cache.astore(
+            cache_key, analysis_result, ANALYSIS_PROMPT_VERSION,
+            ttl=partial_result_ttl(analysis_result)
+        )
+        return analysis_result
+
+    async def lookup():
+        return (await analysis_cache.aget(cache_key, record=False))[0]
+
+    analysis_result, shared = await singleflight.ado(
+        analysis_flight_key(profile_data, cache_key), run_analysis, lookup=lookup
+    )
+    return analysis_result, 'coalesced' if shared else cache_status
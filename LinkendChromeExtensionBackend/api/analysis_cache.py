@@ -0,0 +1,346 @@
+"""
+Two-tier cache for Gemini profile analyses.
+
+Entries are keyed on a SHA-256 of the canonical (sorted-key) JSON of the
+validated ProfileDataSerializer payload plus the prompt version, so a
+re-sent profile maps to the same key and a prompt change invalidates
+everything produced by the old prompt.
+
+Tier 1 is an in-process LRU (per worker), tier 2 is the `analysis_cache`
+table shared by all workers. Both tiers honour a TTL; the table is also
+capped at ANALYSIS_CACHE_DB_MAX_ENTRIES rows, least recently used evicted
+first. A database hit refreshes the row's `last_accessed` at most once per
+ANALYSIS_CACHE_TOUCH_INTERVAL seconds, and each worker runs the eviction
+at most once per ANALYSIS_CACHE_EVICT_INTERVAL seconds rather than on every
+store.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from . import metrics
+from .models import AnalysisCacheEntry
+
+logger = logging.getLogger(__name__)
+
+SOURCE_MEMORY = 'memory'
+SOURCE_DATABASE = 'database'
+SOURCE_MISS = 'miss'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def make_key(profile_data, prompt_version):
+    """
+    Return the cache key for a validated profile payload and prompt version.
+    """
+    canonical = json.dumps(profile_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(f'{prompt_version}\n{canonical}'.encode('utf-8')).hexdigest()
+
+
+class MemoryLRU:
+    """
+    Thread-safe LRU with per-entry expiry.
+    Values are kept as JSON strings so callers always get a private copy.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(payload)
+
+    def set(self, key, value, ttl=None):
+        if self.max_entries <= 0:
+            return
+        payload = json.dumps(value, separators=(',', ':'))
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.incr('analysis_cache.evictions_memory')
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def _get_memory():
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = MemoryLRU(
+                    max_entries=_setting('ANALYSIS_CACHE_MEMORY_SIZE', 256),
+                    ttl=_setting('ANALYSIS_CACHE_TTL', 7 * 24 * 3600),
+                )
+    return _memory
+
+
+def is_enabled():
+    return _setting('ANALYSIS_CACHE_ENABLED', True)
+
+
+def get(key, record=True):
+    """
+    Look `key` up in memory, then in the database.
+    Returns (value, source) where source is 'memory', 'database' or 'miss'.
+    A database hit is promoted into the memory tier. With record=False the
+    lookup is not counted in the hit/miss metrics (a re-check of a key whose
+    miss was already counted).
+    """
+    if not is_enabled():
+        return None, SOURCE_MISS
+
+    memory = _get_memory()
+    value = memory.get(key)
+    if value is not None:
+        if record:
+            metrics.incr('analysis_cache.hits_memory')
+        return value, SOURCE_MEMORY
+
+    try:
+        entry = (
+            AnalysisCacheEntry.objects
+            .filter(key=key, expires_at__gt=timezone.now())
+            .values('result', 'expires_at', 'last_accessed')
+            .first()
+        )
+        if entry is not None and _needs_touch(entry):
+            AnalysisCacheEntry.objects.filter(key=key).update(last_accessed=timezone.now())
+    except DatabaseError as e:
+        logger.warning('Analysis cache lookup failed: %s', e)
+        entry = None
+
+    if entry is not None:
+        remaining = (entry['expires_at'] - timezone.now()).total_seconds()
+        memory.set(key, entry['result'], ttl=max(remaining, 0))
+        if record:
+            metrics.incr('analysis_cache.hits_database')
+        return entry['result'], SOURCE_DATABASE
+
+    if record:
+        metrics.incr('analysis_cache.misses')
+    return None, SOURCE_MISS
+
+
+def store(key, value, prompt_version, ttl=None):
+    """
+    Store `value` under `key` in both tiers; evict expired/excess rows when due.
+    """
+    if not is_enabled():
+        return
+
+    ttl = ttl if ttl is not None else _setting('ANALYSIS_CACHE_TTL', 7 * 24 * 3600)
+    _get_memory().set(key, value, ttl=ttl)
+    metrics.incr('analysis_cache.stores')
+
+    try:
+        AnalysisCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'prompt_version': prompt_version,
+                'result': value,
+                'expires_at': timezone.now() + timedelta(seconds=ttl),
+                'last_accessed': timezone.now(),
+            }
+        )
+        if _eviction_due():
+            evict()
+    except DatabaseError as e:
+        logger.warning('Analysis cache store failed: %s', e)
+
+
+async def aget(key, record=True):
+    """
+    Async version of get(), using the async ORM for the database tier.
+    """
+    if not is_enabled():
+        return None, SOURCE_MISS
+
+    memory = _get_memory()
+    value = memory.get(key)
+    if value is not None:
+        if record:
+            metrics.incr('analysis_cache.hits_memory')
+        return value, SOURCE_MEMORY
+
+    try:
+        entry = await (
+            AnalysisCacheEntry.objects
+            .filter(key=key, expires_at__gt=timezone.now())
+            .values('result', 'expires_at', 'last_accessed')
+            .afirst()
+        )
+        if entry is not None and _needs_touch(entry):
+            await AnalysisCacheEntry.objects.filter(key=key).aupdate(last_accessed=timezone.now())
+    except DatabaseError as e:
+        logger.warning('Analysis cache lookup failed: %s', e)
+        entry = None
+
+    if entry is not None:
+        remaining = (entry['expires_at'] - timezone.now()).total_seconds()
+        memory.set(key, entry['result'], ttl=max(remaining, 0))
+        if record:
+            metrics.incr('analysis_cache.hits_database')
+        return entry['result'], SOURCE_DATABASE
+
+    if record:
+        metrics.incr('analysis_cache.misses')
+    return None, SOURCE_MISS
+
+
+async def astore(key, value, prompt_version, ttl=None):
+    """
+    Async version of store(), using the async ORM for the database tier.
+    """
+    if not is_enabled():
+        return
+
+    ttl = ttl if ttl is not None else _setting('ANALYSIS_CACHE_TTL', 7 * 24 * 3600)
+    _get_memory().set(key, value, ttl=ttl)
+    metrics.incr('analysis_cache.stores')
+
+    try:
+        await AnalysisCacheEntry.objects.aupdate_or_create(
+            key=key,
+            defaults={
+                'prompt_version': prompt_version,
+                'result': value,
+                'expires_at': timezone.now() + timedelta(seconds=ttl),
+                'last_accessed': timezone.now(),
+            }
+        )
+        if _eviction_due():
+            await aevict()
+    except DatabaseError as e:
+        logger.warning('Analysis cache store failed: %s', e)
+
+
+def _needs_touch(entry):
+    """
+    Whether a database hit should refresh the row's `last_accessed`; throttled
+    so hot entries do not turn every read into a write.
+    """
+    interval = timedelta(seconds=_setting('ANALYSIS_CACHE_TOUCH_INTERVAL', 300))
+    return entry['last_accessed'] <= timezone.now() - interval
+
+
+_last_eviction = None
+_eviction_lock = threading.Lock()
+
+
+def _eviction_due():
+    """
+    True at most once per ANALYSIS_CACHE_EVICT_INTERVAL seconds in this process.
+    """
+    global _last_eviction
+
+    now = time.monotonic()
+    with _eviction_lock:
+        if _last_eviction is not None and now - _last_eviction < _setting('ANALYSIS_CACHE_EVICT_INTERVAL', 300):
+            return False
+        _last_eviction = now
+        return True
+
+
+def _excess_ids():
+    # Rows past the cap in last_accessed order; an index walk of the cap, no COUNT(*).
+    max_entries = _setting('ANALYSIS_CACHE_DB_MAX_ENTRIES', 10000)
+    return AnalysisCacheEntry.objects.order_by('-last_accessed').values_list('id', flat=True)[max_entries:]
+
+
+def evict():
+    """
+    Delete expired rows, then the least recently used rows beyond
+    ANALYSIS_CACHE_DB_MAX_ENTRIES. Returns the number of rows deleted.
+    """
+    deleted, _ = AnalysisCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    excess_ids = list(_excess_ids())
+    if excess_ids:
+        deleted += AnalysisCacheEntry.objects.filter(id__in=excess_ids).delete()[0]
+
+    if deleted:
+        metrics.incr('analysis_cache.evictions_database', deleted)
+    return deleted
+
+
+async def aevict():
+    """
+    Async version of evict().
+    """
+    deleted, _ = await AnalysisCacheEntry.objects.filter(expires_at__lte=timezone.now()).adelete()
+
+    excess_ids = [entry_id async for entry_id in _excess_ids()]
+    if excess_ids:
+        deleted += (await AnalysisCacheEntry.objects.filter(id__in=excess_ids).adelete())[0]
+
+    if deleted:
+        metrics.incr('analysis_cache.evictions_database', deleted)
+    return deleted
+
+
+def clear():
+    """
+    Empty both tiers.
+    """
+    _get_memory().clear()
+    AnalysisCacheEntry.objects.all().delete()
+
+
+def stats():
+    """
+    Return hit/miss counters and current tier sizes for this worker.
+    """
+    hits_memory = metrics.get('analysis_cache.hits_memory')
+    hits_database = metrics.get('analysis_cache.hits_database')
+    misses = metrics.get('analysis_cache.misses')
+    lookups = hits_memory + hits_database + misses
+    return {
+        'enabled': is_enabled(),
+        'hitsMemory': hits_memory,
+        'hitsDatabase': hits_database,
+        'misses': misses,
+        'hitRatio': round((hits_memory + hits_database) / lookups, 4) if lookups else None,
+        'stores': metrics.get('analysis_cache.stores'),
+        'evictionsMemory': metrics.get('analysis_cache.evictions_memory'),
+        'evictionsDatabase': metrics.get('analysis_cache.evictions_database'),
+        'memoryEntries': len(_get_memory()),
+    }
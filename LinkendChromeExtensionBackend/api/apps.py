@@ -1,7 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
     verbose_name = "LinkedIn DISC Analyzer"
+
+    def ready(self):
+        # Connects the profile lookup cache invalidation and connection-count signals.
+        from . import db_pool, profile_cache  # noqa: F401
+        from . import search
+
+        post_migrate.connect(search.repair_after_migrate, sender=self)
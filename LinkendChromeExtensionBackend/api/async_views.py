@@ -0,0 +1,218 @@
+"""
+Native async versions of the Gemini-backed endpoints.
+
+These are plain Django async views (DRF function views are sync-only). Under
+an ASGI server (see asgi.py) a worker serves every in-flight Gemini call from
+one event loop instead of parking a thread per request, and database access
+goes through Django's async ORM. Identical concurrent requests are coalesced
+with the sync views' (singleflight.ado), so a sync and an async request for
+the same analysis or message also share one Gemini call.
+"""
+import asyncio
+import json
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import gemini, singleflight
+from .analysis import aget_profile_analysis, failure_details
+from .llm_json import IncompleteJSON, finalize
+from .streaming import (
+    amessage_events, event_stream_response, format_ndjson, ndjson_response, wants_ndjson, wants_stream,
+)
+from .serializers import ProfileDataSerializer
+from .prompts import build_message_prompt
+from .views import (
+    MESSAGE_RESPONSE_SERIALIZERS,
+    batch_result_entry,
+    get_batch_concurrency,
+    message_flight_key,
+    parse_batch_profiles,
+    set_salvage_headers,
+    validate_message_request,
+)
+
+
+def _parse_json_body(request):
+    """
+    Decode the JSON request body; returns (data, error_response).
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        data = None
+    if not isinstance(data, dict):
+        return None, JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+    return data, None
+
+
+async def generate_custom_message_async(message_type, query, profile_data):
+    """
+    Async version of views.generate_custom_message.
+    """
+    prompt = build_message_prompt(message_type, query, profile_data)
+    data = await gemini.agenerate_content(prompt.text, prompt.generation_config)
+    return finalize(gemini.parse_json_response(data), MESSAGE_RESPONSE_SERIALIZERS[message_type])
+
+
+async def agenerate_message_coalesced(message_type, query, profile_data):
+    """
+    Async version of views.generate_message_coalesced.
+    """
+    return await singleflight.ado(
+        message_flight_key(message_type, query, profile_data),
+        lambda: generate_custom_message_async(message_type, query, profile_data),
+        handoff=True,
+    )
+
+
+@csrf_exempt
+@require_POST
+async def analyze_profile_async(request):
+    """
+    Async version of analyze-profile. Same request and response bodies.
+
+    Example: POST /api/async/analyze-profile/
+    """
+    data, error_response = _parse_json_body(request)
+    if error_response:
+        return error_response
+
+    serializer = ProfileDataSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(
+            {'error': 'Invalid profile data', 'details': serializer.errors},
+            status=400
+        )
+
+    try:
+        analysis_result, cache_status = await aget_profile_analysis(serializer.validated_data)
+        response = JsonResponse(analysis_result, status=200)
+        response['X-Analysis-Cache'] = cache_status
+        return set_salvage_headers(response, analysis_result)
+    except IncompleteJSON as e:
+        return JsonResponse(failure_details(e), status=422)
+    except Exception as e:
+        return JsonResponse(failure_details(e), status=500)
+
+
+async def analyze_batch_item_async(index, profile_data, semaphore):
+    """
+    Async version of views.analyze_batch_item; `semaphore` bounds concurrent Gemini calls.
+    """
+    async with semaphore:
+        try:
+            analysis_result, cache_status = await aget_profile_analysis(profile_data)
+            return batch_result_entry(index, analysis_result, cache_status)
+        except Exception as e:
+            return {'index': index, 'status': 'error', **failure_details(e)}
+
+
+async def aiter_batch_results(items, concurrency):
+    """
+    Async version of views.iter_batch_results.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+    for index, profile_data, errors in items:
+        if errors is not None:
+            yield {'index': index, 'status': 'error', 'error': 'Invalid profile data', 'details': errors}
+        else:
+            tasks.append(asyncio.ensure_future(analyze_batch_item_async(index, profile_data, semaphore)))
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@csrf_exempt
+@require_POST
+async def analyze_profiles_batch_async(request):
+    """
+    Async version of analyze-profiles/batch. Same request and response bodies,
+    including ?stream=ndjson.
+
+    Example: POST /api/async/analyze-profiles/batch/
+    """
+    data, error_response = _parse_json_body(request)
+    if error_response:
+        return error_response
+
+    items, error = parse_batch_profiles(data)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    concurrency = get_batch_concurrency(data, len(items))
+
+    if wants_ndjson(request):
+        return ndjson_response(format_ndjson(entry) async for entry in aiter_batch_results(items, concurrency))
+
+    results = sorted(
+        [entry async for entry in aiter_batch_results(items, concurrency)],
+        key=lambda entry: entry['index']
+    )
+    succeeded = sum(1 for entry in results if entry['status'] == 'ok')
+    return JsonResponse(
+        {
+            'results': results,
+            'summary': {
+                'total': len(results),
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded,
+                'concurrency': concurrency,
+            }
+        },
+        status=200
+    )
+
+
+@csrf_exempt
+@require_POST
+async def generate_message_async(request):
+    """
+    Async version of generate-message. Same request and response bodies,
+    including the "stream" option for Server-Sent Events.
+
+    Example: POST /api/async/generate-message/
+    """
+    data, error_response = _parse_json_body(request)
+    if error_response:
+        return error_response
+
+    message_type = data.get('messageType')
+    query = data.get('query')
+    profile_data = data.get('profileData')
+
+    error = validate_message_request(message_type, query, profile_data)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    if wants_stream(request, data):
+        try:
+            prompt = build_message_prompt(message_type, query, profile_data)
+        except Exception as e:
+            return JsonResponse(
+                {'error': 'Message generation failed', 'message': str(e)},
+                status=500
+            )
+        return event_stream_response(amessage_events(prompt.text, prompt.generation_config))
+
+    try:
+        result, shared = await agenerate_message_coalesced(message_type, query, profile_data)
+        response = JsonResponse(result, status=200)
+        response['X-Request-Coalesced'] = 'true' if shared else 'false'
+        return set_salvage_headers(response, result)
+    except IncompleteJSON as e:
+        return JsonResponse(
+            {'error': 'Message response from AI was truncated', 'lostFields': e.report['lost'], 'details': e.details},
+            status=422
+        )
+    except Exception as e:
+        return JsonResponse(
+            {'error': 'Message generation failed', 'message': str(e)},
+            status=500
+        )
@@ -0,0 +1,215 @@
+"""
+Content-addressed, compressed storage for the raw_data JSON payloads.
+
+A payload is stored once in the `json_blobs` table under the SHA-256 of its
+canonical JSON encoding, compressed with zlib (or lzma, per
+JSON_BLOB_CODEC). RawData and AnalyzedProfile point at blobs by hash. The
+rawProfileData nested in an AnalyzedProfile payload is stored as a blob of
+its own (normally the RawData one) and referenced from the
+raw_profile_blob column, so a profile's scraped data is kept once instead
+of twice.
+
+A save writes its blobs before the rows that reference them, and
+delete_unreferenced only removes blobs older than a grace period. Saving
+a blob that already exists refreshes its created_at, so a concurrent prune
+skips it.
+
+Blobs are immutable, so decoded payloads are cached in-process by hash.
+"""
+import hashlib
+import json
+import lzma
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .models import AnalyzedProfile, JSONBlob, RawData
+
+CODEC_ZLIB = 'zlib'
+CODEC_LZMA = 'lzma'
+
+_compressors = {
+    CODEC_ZLIB: lambda data: zlib.compress(data, 6),
+    CODEC_LZMA: lzma.compress,
+}
+_decompressors = {
+    CODEC_ZLIB: zlib.decompress,
+    CODEC_LZMA: lzma.decompress,
+}
+
+
+def encode(value):
+    """
+    Canonical JSON encoding of `value` (sorted keys, no whitespace).
+    """
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+class PendingBlob:
+    """
+    A payload with its hash computed; compressed only if it has to be written.
+    """
+    def __init__(self, value):
+        self.value = value
+        self.encoded = encode(value)
+        self.hash = hashlib.sha256(self.encoded).hexdigest()
+
+    def to_row(self):
+        codec = getattr(settings, 'JSON_BLOB_CODEC', CODEC_ZLIB)
+        return JSONBlob(
+            hash=self.hash,
+            codec=codec,
+            data=_compressors[codec](self.encoded),
+            size=len(self.encoded),
+        )
+
+
+def save_many(pending):
+    """
+    Write the blobs in `pending` that are not stored yet, and refresh created_at
+    on those that are. Call it in the transaction that writes the referencing rows.
+    """
+    by_hash = {blob.hash: blob for blob in pending}
+    if not by_hash:
+        return
+    # The UPDATE locks the reused rows until commit; a prune deleting them
+    # concurrently either finished first (they are re-inserted below) or
+    # re-checks created_at after this commit and keeps them.
+    JSONBlob.objects.filter(hash__in=list(by_hash)).update(created_at=timezone.now())
+    existing = set(JSONBlob.objects.filter(hash__in=list(by_hash)).values_list('hash', flat=True))
+    missing = [blob.to_row() for blob_hash, blob in by_hash.items() if blob_hash not in existing]
+    if missing:
+        JSONBlob.objects.bulk_create(missing, ignore_conflicts=True)
+        metrics.incr('json_blobs.written', len(missing))
+
+
+def decode_row(codec, data):
+    return json.loads(_decompressors[codec](bytes(data)))
+
+
+class _DecodedCache:
+    """
+    Small thread-safe LRU of decoded payloads keyed by blob hash.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is None:
+                return None
+            self._entries.move_to_end(key)
+        # Callers may mutate the result; hand out a private copy.
+        return json.loads(encoded)
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        encoded = json.dumps(value)
+        with self._lock:
+            self._entries[key] = encoded
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = _DecodedCache(getattr(settings, 'JSON_BLOB_CACHE_SIZE', 512))
+
+
+def load(blob_hash):
+    """
+    Return the payload stored under `blob_hash`, or {} for a missing hash.
+    """
+    if not blob_hash:
+        return {}
+    value = _cache.get(blob_hash)
+    if value is None:
+        row = JSONBlob.objects.filter(hash=blob_hash).values_list('codec', 'data').first()
+        if row is None:
+            return {}
+        value = decode_row(*row)
+        _cache.set(blob_hash, value)
+        metrics.incr('json_blobs.loaded')
+    return value
+
+
+def load_related(instance, field_name):
+    """
+    Payload of the blob `instance`'s foreign key `field_name` points at.
+    Decodes the joined row when the blob was select_related (see
+    BlobQuerySet.with_blobs()), otherwise loads it by hash.
+    """
+    field = instance._meta.get_field(field_name)
+    if not field.is_cached(instance):
+        return load(getattr(instance, field.attname))
+    blob = field.get_cached_value(instance)
+    if blob is None:
+        return {}
+    value = _cache.get(blob.hash)
+    if value is None:
+        value = decode_row(blob.codec, blob.data)
+        _cache.set(blob.hash, value)
+        metrics.incr('json_blobs.loaded')
+    return value
+
+
+def assign(instance, value):
+    """
+    Point a RawData or AnalyzedProfile at blobs holding `value` as its raw_data.
+    An AnalyzedProfile payload's rawProfileData goes to raw_profile_blob, as
+    profile_store stores it. Returns the PendingBlobs to save_many() in the
+    transaction that saves `instance`.
+    """
+    if not value:
+        for field_name in instance.BLOB_FIELDS:
+            setattr(instance, field_name, None)
+        return []
+    pending = []
+    if isinstance(instance, AnalyzedProfile):
+        nested = value.get('rawProfileData') if isinstance(value, dict) else None
+        instance.raw_profile_blob = None
+        if isinstance(nested, dict) and nested:
+            nested_blob = PendingBlob(nested)
+            value = {key: item for key, item in value.items() if key != 'rawProfileData'}
+            instance.raw_profile_blob_id = nested_blob.hash
+            pending.append(nested_blob)
+    blob = PendingBlob(value)
+    instance.raw_data_blob_id = blob.hash
+    pending.append(blob)
+    return pending
+
+
+def _chunks(values, size=500):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def delete_unreferenced(min_age=timedelta(hours=1)):
+    """
+    Delete blobs no row points at; returns the number deleted.
+    Blobs created or reused within `min_age` are kept, since a save in progress
+    writes its blobs before the rows that reference them.
+    """
+    referenced = set()
+    for model, fields in ((RawData, ['raw_data_blob']), (AnalyzedProfile, ['raw_data_blob', 'raw_profile_blob'])):
+        for field in fields:
+            referenced.update(model.objects.exclude(**{field: None}).values_list(f'{field}_id', flat=True))
+
+    cutoff = timezone.now() - min_age
+    candidates = JSONBlob.objects.filter(created_at__lt=cutoff).values_list('hash', flat=True)
+    orphans = [blob_hash for blob_hash in candidates.iterator() if blob_hash not in referenced]
+    deleted = 0
+    for chunk in _chunks(orphans):
+        # Re-check the age: a save may have reused the blob since it was listed.
+        deleted += JSONBlob.objects.filter(hash__in=chunk, created_at__lt=cutoff).delete()[0]
+    return deleted
@@ -0,0 +1,102 @@
+"""
+Date hierarchy buckets found with index probes.
+
+QuerySet.datetimes(), which backs the admin's date_hierarchy, truncates the
+date of every matching row and sorts the distinct results. That reads the
+whole filtered table on every changelist load.
+
+DateBucketQuerySet.datetimes() does it differently:
+1. It reads the first and last value through the date column's index.
+2. It lists the candidate years, months or days between them.
+3. It checks every candidate with one query of EXISTS range probes.
+
+Each probe is an index range seek, so the cost grows with the number of
+candidate buckets, not with the number of rows.
+
+Its datetimes() returns a list rather than a chainable queryset, so it is
+not a model manager. `bucketed()` applies it to the admin changelist
+queryset only (see admin.DateBucketChangeList), which the date_hierarchy
+tag reads and never chains.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Exists
+from django.utils import timezone
+
+BUCKET_KINDS = ('year', 'month', 'day')
+# Above this many candidate buckets, the regular DISTINCT query is cheaper.
+MAX_BUCKETS = 400
+
+
+def _truncate(value, kind):
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind == 'year':
+        return value.replace(month=1, day=1)
+    if kind == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def _next_bucket(value, kind):
+    if kind == 'year':
+        return value.replace(year=value.year + 1)
+    if kind == 'month':
+        return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+    return value + timedelta(days=1)
+
+
+class DateBucketQuerySet(models.QuerySet):
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        """
+        Like QuerySet.datetimes() for 'year', 'month' and 'day', but answered from
+        the index on `field_name` and returned as a list.
+        """
+        if kind not in BUCKET_KINDS or '__' in field_name:
+            return super().datetimes(field_name, kind, order, tzinfo)
+
+        values = self.order_by(field_name).values_list(field_name, flat=True)
+        first, last = values.first(), values.last()
+        if first is None:
+            return []
+
+        # Buckets are computed on local wall-clock time, like the database truncation.
+        tz = (tzinfo or timezone.get_current_timezone()) if settings.USE_TZ else None
+        if tz is not None:
+            first = timezone.make_naive(first, tz)
+            last = timezone.make_naive(last, tz)
+
+        starts = []
+        start = _truncate(first, kind)
+        while start <= last:
+            starts.append(start)
+            if len(starts) > MAX_BUCKETS:
+                return list(super().datetimes(field_name, kind, order, tzinfo))
+            start = _next_bucket(start, kind)
+
+        def bound(value):
+            return timezone.make_aware(value, tz) if tz is not None else value
+
+        probes = {
+            f'bucket_{i}': Exists(self.filter(**{
+                f'{field_name}__gte': bound(start),
+                f'{field_name}__lt': bound(_next_bucket(start, kind)),
+            }))
+            for i, start in enumerate(starts)
+        }
+        # Any single row carries the probe results; [:1] rather than first(), which would sort by pk.
+        rows = list(self.order_by().annotate(**probes).values_list(*probes)[:1])
+        buckets = [bound(start) for start, found in zip(starts, rows[0] if rows else ()) if found]
+        return buckets if order == 'ASC' else buckets[::-1]
+
+
+def bucketed(queryset):
+    """
+    Copy of `queryset` whose datetimes() probes buckets by index.
+    """
+    clone = queryset._chain()
+    # Same query and state; only datetimes() differs.
+    clone.__class__ = DateBucketQuerySet
+    return clone
@@ -0,0 +1,97 @@
+"""
+Database connection reuse: pre-warming at worker boot and connection / pool metrics.
+
+Postgres connections are either kept open between requests (CONN_MAX_AGE =
+DB_CONN_MAX_AGE, with CONN_HEALTH_CHECKS) or, with DB_POOL = True, served from
+psycopg 3's connection pool (Django's OPTIONS['pool']). Either way a cold
+connection costs a TLS handshake to the remote database, so `prewarm()` opens
+it when a worker boots instead of on that worker's first request; the
+gunicorn config (gunicorn.conf.py) calls it from post_worker_init.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+@receiver(connection_created)
+def _count_connection(sender, connection, **kwargs):
+    # With persistent or pooled connections this should stay near the worker/pool count.
+    metrics.incr('db.connections_opened')
+
+
+def get_pool(alias='default'):
+    """
+    The psycopg connection pool for `alias`, or None when pooling is off.
+    """
+    return getattr(connections[alias], 'pool', None)
+
+
+def prewarm(alias='default'):
+    """
+    Open the database connection (and fill the pool to its min_size) ahead of the first request.
+    Failures are logged, not raised: the request path will simply connect later.
+    """
+    if not _setting('DB_PREWARM', True):
+        return
+    connection = connections[alias]
+    started = time.monotonic()
+    try:
+        connection.ensure_connection()
+        pool = get_pool(alias)
+        if pool is not None:
+            pool.wait(timeout=_setting('DB_POOL_TIMEOUT', 10))
+            # Give the checked-out connection back; the pool keeps it open.
+            connection.close()
+    except Exception as e:  # DatabaseError, or the pool's PoolTimeout
+        logger.warning('Database pre-warm failed: %s', e)
+        metrics.incr('db.prewarm_failed')
+        return
+    metrics.observe('db.prewarm', time.monotonic() - started)
+
+
+def stats(alias='default'):
+    """
+    Connections opened and, when pooling is on, the pool's size and checkout waits.
+    Connection settings are left out: the metrics endpoint should not describe the database.
+    """
+    result = {
+        'connectionsOpened': metrics.get('db.connections_opened'),
+        'pool': None,
+    }
+    try:
+        pool = get_pool(alias)
+    except Exception as e:  # psycopg_pool missing
+        logger.warning('Database pool unavailable: %s', e)
+        return result
+    if pool is None:
+        return result
+
+    pool_stats = pool.get_stats()
+    queued = pool_stats.get('requests_queued', 0)
+    wait_ms = pool_stats.get('requests_wait_ms', 0)
+    result['pool'] = {
+        'minSize': pool_stats.get('pool_min'),
+        'maxSize': pool_stats.get('pool_max'),
+        'size': pool_stats.get('pool_size'),
+        'available': pool_stats.get('pool_available'),
+        'waiting': pool_stats.get('requests_waiting'),
+        'checkouts': pool_stats.get('requests_num', 0),
+        # Checkouts that had to wait for a free connection, and how long they waited.
+        'queued': queued,
+        'waitMsTotal': wait_ms,
+        'avgQueuedWaitMs': round(wait_ms / queued, 1) if queued else 0.0,
+        'timeouts': pool_stats.get('requests_errors', 0),
+    }
+    return result
@@ -0,0 +1,600 @@
+"""
+Shared HTTP client for the Gemini generateContent API.
+
+Each worker process keeps one long-lived requests.Session, so TCP/TLS
+connections to Gemini are reused between calls instead of being re-opened
+for every analysis. Calls use GEMINI_CONNECT_TIMEOUT / GEMINI_READ_TIMEOUT,
+and 429/5xx responses and connection errors are retried with jittered
+exponential backoff that honours Retry-After. Read timeouts are not retried:
+Gemini may still be generating, so a retry would pay for the call twice.
+All attempts of one call share a GEMINI_TOTAL_TIMEOUT deadline.
+
+AsyncGeminiClient does the same over httpx for the async views, with one
+connection pool per event loop. Under ASGI that is one pool per worker.
+Under WSGI, Django runs every async view on a new event loop. wsgi.py
+therefore calls use_shared_event_loop(), and async calls then run on one
+background loop per process that holds the only client.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+
+import httpx
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .llm_json import PartialJSON, extract_json_object
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+DEFAULT_GENERATION_CONFIG = {
+    'temperature': 0.8
+}
+
+
+class GeminiError(Exception):
+    """
+    Raised when Gemini answers with a non-200 status after all retries.
+    """
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date) into seconds.
+    Returns None when the header is missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max((retry_at - timezone.now()).total_seconds(), 0.0)
+
+
+def compute_backoff(attempt, base, maximum):
+    """
+    Full-jitter exponential backoff: a random delay in [0, min(maximum, base * 2**attempt)].
+    """
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+def build_payload(prompt, generation_config=None):
+    """
+    Build the generateContent request body for a single text prompt.
+    """
+    return {
+        'contents': [{
+            'parts': [{
+                'text': prompt
+            }]
+        }],
+        'generationConfig': generation_config or dict(DEFAULT_GENERATION_CONFIG)
+    }
+
+
+def structured_generation_config(response_schema):
+    """
+    generationConfig that makes Gemini return bare JSON matching `response_schema`.
+    Returns None (the default config) when GEMINI_STRUCTURED_OUTPUT is off.
+    """
+    if not _setting('GEMINI_STRUCTURED_OUTPUT', True):
+        return None
+    return dict(
+        DEFAULT_GENERATION_CONFIG,
+        responseMimeType='application/json',
+        responseSchema=response_schema,
+    )
+
+
+def get_stream_url(api_url):
+    """
+    Return the streamGenerateContent (SSE) URL for a generateContent URL.
+    GEMINI_STREAM_API_URL overrides the derived URL.
+    """
+    override = _setting('GEMINI_STREAM_API_URL', '')
+    if override:
+        return override
+    stream_url = api_url.replace(':generateContent', ':streamGenerateContent')
+    if 'alt=sse' not in stream_url:
+        stream_url += ('&' if '?' in stream_url else '?') + 'alt=sse'
+    return stream_url
+
+
+def parse_sse_line(line):
+    """
+    Decode one `data: {...}` line from Gemini's SSE stream; other lines return None.
+    """
+    if not line or not line.startswith('data:'):
+        return None
+    payload = line[len('data:'):].strip()
+    if not payload:
+        return None
+    return json.loads(payload)
+
+
+def chunk_text(chunk):
+    """
+    Concatenate the text parts of one response chunk.
+    """
+    candidates = chunk.get('candidates') or [{}]
+    parts = (candidates[0].get('content') or {}).get('parts') or []
+    return ''.join(part.get('text', '') for part in parts)
+
+
+def chunk_finish_reason(chunk):
+    candidates = chunk.get('candidates') or [{}]
+    return candidates[0].get('finishReason', '')
+
+
+class _RetryPolicy:
+    """
+    Retry/backoff rules shared by the sync and async clients.
+    """
+    max_retries = 3
+    backoff_base = 0.5
+    backoff_max = 20.0
+    read_timeout = 60.0
+    total_timeout = 90.0
+
+    def retry_delay_for_status(self, status_code, retry_after_header, attempt, started):
+        """
+        Seconds to wait before retrying a non-200 response, or None if it is final.
+        A Retry-After longer than backoff_max is not worth waiting for.
+        """
+        if status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+            return None
+        retry_after = parse_retry_after(retry_after_header)
+        if retry_after is not None:
+            return self._within_deadline(retry_after, started) if retry_after <= self.backoff_max else None
+        return self._within_deadline(compute_backoff(attempt, self.backoff_base, self.backoff_max), started)
+
+    def retry_delay_for_error(self, attempt, started):
+        """
+        Seconds to wait before retrying a connection error or connect timeout, or None.
+        """
+        if attempt >= self.max_retries:
+            return None
+        return self._within_deadline(compute_backoff(attempt, self.backoff_base, self.backoff_max), started)
+
+    def _within_deadline(self, delay, started):
+        """
+        `delay`, or None when waiting it out would leave no time before the call's deadline.
+        """
+        if time.monotonic() - started + delay >= self.total_timeout:
+            metrics.incr('gemini.deadline_exceeded')
+            return None
+        return delay
+
+    def attempt_read_timeout(self, started):
+        """
+        Read timeout for the next attempt: read_timeout, cut to what is left of the deadline.
+        """
+        return max(min(self.read_timeout, self.total_timeout - (time.monotonic() - started)), 1.0)
+
+    def record_call(self, started, attempts):
+        elapsed = time.monotonic() - started
+        metrics.incr('gemini.calls')
+        metrics.observe('gemini.call', elapsed)
+        logger.info('Gemini call finished in %.0f ms after %d attempt(s)', elapsed * 1000, attempts)
+
+
+class GeminiClient(_RetryPolicy):
+    """
+    Pooled, retrying client for one Gemini model endpoint.
+    """
+
+    def __init__(self, api_key, api_url, connect_timeout=5.0, read_timeout=60.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=20.0, pool_maxsize=10, total_timeout=90.0):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'x-goog-api-key': api_key,
+        })
+
+    def generate_content(self, prompt, generation_config=None):
+        """
+        Send `prompt` to Gemini and return the decoded JSON response.
+        """
+        return self.post(build_payload(prompt, generation_config))
+
+    def stream_generate_content(self, prompt, generation_config=None):
+        """
+        Send `prompt` to the streaming endpoint and yield each decoded response chunk.
+        Only opening the stream is retried; once chunks flow, errors propagate.
+        """
+        payload = build_payload(prompt, generation_config)
+        started = time.monotonic()
+        response = self.post(payload, url=get_stream_url(self.api_url), stream=True)
+        first_chunk = True
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                chunk = parse_sse_line(line)
+                if chunk is None:
+                    continue
+                if first_chunk:
+                    metrics.observe('gemini.stream_first_chunk', time.monotonic() - started)
+                    first_chunk = False
+                yield chunk
+        finally:
+            response.close()
+            metrics.observe('gemini.stream', time.monotonic() - started)
+
+    def post(self, payload, url=None, stream=False):
+        """
+        POST `payload` to the model endpoint, retrying transient failures.
+        Returns the decoded JSON body, or the open response when `stream` is set.
+        """
+        started = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                timeout = (self.connect_timeout, self.attempt_read_timeout(started))
+                try:
+                    response = self.session.post(url or self.api_url, json=payload, timeout=timeout, stream=stream)
+                except requests.ReadTimeout as e:
+                    metrics.incr('gemini.errors')
+                    raise GeminiError(f'Gemini API request timed out: {e}') from e
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    delay = self.retry_delay_for_error(attempt, started)
+                    if delay is None:
+                        metrics.incr('gemini.errors')
+                        raise GeminiError(f'Gemini API request failed: {e}') from e
+                    logger.warning('Gemini request failed (%s), retrying in %.2fs', e, delay)
+                else:
+                    if response.status_code == 200:
+                        return response if stream else response.json()
+                    delay = self.retry_delay_for_status(response.status_code, response.headers.get('Retry-After'), attempt, started)
+                    if delay is None:
+                        metrics.incr('gemini.errors')
+                        raise GeminiError(
+                            f'Gemini API error: {response.status_code} - {response.text}',
+                            status_code=response.status_code
+                        )
+                    logger.warning('Gemini returned %s, retrying in %.2fs', response.status_code, delay)
+
+                metrics.incr('gemini.retries')
+                attempt += 1
+                time.sleep(delay)
+        finally:
+            self.record_call(started, attempt + 1)
+
+
+class AsyncGeminiClient(_RetryPolicy):
+    """
+    httpx-based async counterpart of GeminiClient.
+    One instance (and one connection pool) is shared by every coroutine on an event loop.
+    """
+
+    def __init__(self, api_key, api_url, connect_timeout=5.0, read_timeout=60.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=20.0, max_connections=256, total_timeout=90.0):
+        self.api_url = api_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client = httpx.AsyncClient(
+            headers={
+                'Content-Type': 'application/json',
+                'x-goog-api-key': api_key,
+            },
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=read_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def generate_content(self, prompt, generation_config=None):
+        """
+        Send `prompt` to Gemini and return the decoded JSON response.
+        """
+        return await self.post(build_payload(prompt, generation_config))
+
+    async def stream_generate_content(self, prompt, generation_config=None):
+        """
+        Async version of GeminiClient.stream_generate_content().
+        """
+        payload = build_payload(prompt, generation_config)
+        started = time.monotonic()
+        response = await self.post(payload, url=get_stream_url(self.api_url), stream=True)
+        first_chunk = True
+        try:
+            async for line in response.aiter_lines():
+                chunk = parse_sse_line(line)
+                if chunk is None:
+                    continue
+                if first_chunk:
+                    metrics.observe('gemini.stream_first_chunk', time.monotonic() - started)
+                    first_chunk = False
+                yield chunk
+        finally:
+            await response.aclose()
+            metrics.observe('gemini.stream', time.monotonic() - started)
+
+    async def post(self, payload, url=None, stream=False):
+        """
+        POST `payload` to the model endpoint, retrying transient failures.
+        Returns the decoded JSON body, or the open response when `stream` is set.
+        """
+        started = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                read_timeout = self.attempt_read_timeout(started)
+                try:
+                    request = self.client.build_request(
+                        'POST', url or self.api_url, json=payload,
+                        timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout, pool=read_timeout),
+                    )
+                    response = await self.client.send(request, stream=stream)
+                except httpx.ReadTimeout as e:
+                    metrics.incr('gemini.errors')
+                    raise GeminiError(f'Gemini API request timed out: {e}') from e
+                except httpx.TransportError as e:
+                    delay = self.retry_delay_for_error(attempt, started)
+                    if delay is None:
+                        metrics.incr('gemini.errors')
+                        raise GeminiError(f'Gemini API request failed: {e}') from e
+                    logger.warning('Gemini request failed (%s), retrying in %.2fs', e, delay)
+                else:
+                    if response.status_code == 200:
+                        return response if stream else response.json()
+                    if stream:
+                        await response.aread()
+                        await response.aclose()
+                    delay = self.retry_delay_for_status(response.status_code, response.headers.get('Retry-After'), attempt, started)
+                    if delay is None:
+                        metrics.incr('gemini.errors')
+                        raise GeminiError(
+                            f'Gemini API error: {response.status_code} - {response.text}',
+                            status_code=response.status_code
+                        )
+                    logger.warning('Gemini returned %s, retrying in %.2fs', response.status_code, delay)
+
+                metrics.incr('gemini.retries')
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            self.record_call(started, attempt + 1)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return this process's shared GeminiClient, creating it on first use.
+    A new client is built after a fork so workers never share sockets.
+    """
+    global _client, _client_pid
+
+    gemini_api_key = settings.GEMINI_API_KEY
+    if not gemini_api_key:
+        raise ValueError('GEMINI_API_KEY is not configured in environment variables')
+
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = GeminiClient(
+                    api_key=gemini_api_key,
+                    api_url=settings.GEMINI_API_URL,
+                    connect_timeout=_setting('GEMINI_CONNECT_TIMEOUT', 5.0),
+                    read_timeout=_setting('GEMINI_READ_TIMEOUT', 60.0),
+                    max_retries=_setting('GEMINI_MAX_RETRIES', 3),
+                    backoff_base=_setting('GEMINI_BACKOFF_BASE', 0.5),
+                    backoff_max=_setting('GEMINI_BACKOFF_MAX', 20.0),
+                    pool_maxsize=_setting('GEMINI_POOL_MAXSIZE', 10),
+                    total_timeout=_setting('GEMINI_TOTAL_TIMEOUT', 90.0),
+                )
+                _client_pid = pid
+    return _client
+
+
+def generate_content(prompt, generation_config=None):
+    """
+    Send `prompt` to Gemini through the shared client and return the decoded JSON response.
+    """
+    return get_client().generate_content(prompt, generation_config)
+
+
+def stream_generate_content(prompt, generation_config=None):
+    """
+    Stream `prompt` through the shared client, yielding decoded response chunks.
+    """
+    return get_client().stream_generate_content(prompt, generation_config)
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+_use_shared_loop = False
+_shared_loop = None
+_shared_loop_pid = None
+_shared_loop_lock = threading.Lock()
+
+
+def use_shared_event_loop():
+    """
+    Run async Gemini calls on one background event loop per process instead of
+    the caller's loop. For WSGI, where each async view gets a loop of its own.
+    """
+    global _use_shared_loop
+    _use_shared_loop = True
+
+
+def _get_shared_loop():
+    global _shared_loop, _shared_loop_pid
+
+    pid = os.getpid()
+    if _shared_loop is None or _shared_loop_pid != pid:
+        with _shared_loop_lock:
+            if _shared_loop is None or _shared_loop_pid != pid:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='gemini-async', daemon=True).start()
+                _shared_loop, _shared_loop_pid = loop, pid
+    return _shared_loop
+
+
+async def _on_shared_loop(coroutine):
+    """
+    Await `coroutine` on the shared loop; cancelling the caller cancels it there too.
+    """
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, _get_shared_loop()))
+
+
+def get_async_client():
+    """
+    Return the AsyncGeminiClient bound to the running event loop.
+    Under an ASGI server there is one loop per worker, and under WSGI calls run on
+    the shared loop, so either way every in-flight call shares one pool.
+    """
+    gemini_api_key = settings.GEMINI_API_KEY
+    if not gemini_api_key:
+        raise ValueError('GEMINI_API_KEY is not configured in environment variables')
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncGeminiClient(
+            api_key=gemini_api_key,
+            api_url=settings.GEMINI_API_URL,
+            connect_timeout=_setting('GEMINI_CONNECT_TIMEOUT', 5.0),
+            read_timeout=_setting('GEMINI_READ_TIMEOUT', 60.0),
+            max_retries=_setting('GEMINI_MAX_RETRIES', 3),
+            backoff_base=_setting('GEMINI_BACKOFF_BASE', 0.5),
+            backoff_max=_setting('GEMINI_BACKOFF_MAX', 20.0),
+            max_connections=_setting('GEMINI_ASYNC_MAX_CONNECTIONS', 256),
+            total_timeout=_setting('GEMINI_TOTAL_TIMEOUT', 90.0),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def agenerate_content(prompt, generation_config=None):
+    """
+    Async version of generate_content().
+    """
+    if _use_shared_loop:
+        return await _on_shared_loop(_agenerate_content(prompt, generation_config))
+    return await _agenerate_content(prompt, generation_config)
+
+
+async def _agenerate_content(prompt, generation_config):
+    return await get_async_client().generate_content(prompt, generation_config)
+
+
+_STREAM_END = object()
+
+
+async def astream_generate_content(prompt, generation_config=None):
+    """
+    Async version of stream_generate_content(); an async iterator of chunks.
+    """
+    if not _use_shared_loop:
+        async for chunk in get_async_client().stream_generate_content(prompt, generation_config):
+            yield chunk
+        return
+
+    chunks = None
+
+    async def next_chunk():
+        nonlocal chunks
+        if chunks is None:
+            chunks = get_async_client().stream_generate_content(prompt, generation_config)
+        return await anext(chunks, _STREAM_END)
+
+    try:
+        while (chunk := await _on_shared_loop(next_chunk())) is not _STREAM_END:
+            yield chunk
+    finally:
+        if chunks is not None:
+            await _on_shared_loop(chunks.aclose())
+
+
+def parse_json_response(data):
+    """
+    Extract the JSON object from a generateContent response.
+    """
+    finish_reason = data.get('candidates', [{}])[0].get('finishReason', '')
+    text_response = data['candidates'][0]['content']['parts'][0]['text']
+    return parse_json_text(text_response, finish_reason)
+
+
+def parse_json_text(text_response, finish_reason=''):
+    """
+    Extract the JSON object from model output text (full or reassembled from stream chunks).
+    Structured-output responses are bare JSON and are decoded directly; other
+    text goes through the single-pass extractor, which also salvages the
+    complete fields of a truncated object (returned as llm_json.PartialJSON).
+    """
+    if finish_reason == 'MAX_TOKENS':
+        logger.warning('Gemini response was truncated due to MAX_TOKENS limit')
+
+    if text_response.lstrip().startswith('{'):
+        try:
+            result = json.loads(text_response)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(result, dict):
+                metrics.incr('gemini.json_direct')
+                return result
+
+    metrics.incr('gemini.json_fallback')
+    try:
+        result = extract_json_object(text_response)
+    except ValueError as e:
+        logger.warning('JSON parsing error: %s. Attempted to parse: %s...', e, text_response[:500])
+        if finish_reason == 'MAX_TOKENS':
+            raise Exception('Response was truncated by token limit. Please increase maxOutputTokens or reduce prompt size.')
+        raise Exception(f'Could not parse AI response as JSON: {e}')
+
+    if isinstance(result, PartialJSON):
+        metrics.incr('gemini.json_salvaged')
+        logger.warning(
+            'Salvaged truncated JSON response (finishReason=%s); truncated: %s; lost: %s',
+            finish_reason or 'unknown', result.truncated_fields, result.lost_fields
+        )
+    return result
@@ -0,0 +1,275 @@
+"""
+Local job queue for long-running DISC analyses.
+
+Jobs are rows in the `analysis_jobs` table, so no external broker is needed.
+With ANALYSIS_JOB_MODE = 'thread' (the default) each web worker runs jobs on
+its own thread pool of ANALYSIS_JOB_WORKERS threads. With 'external' the web
+tier only enqueues, and `manage.py run_analysis_worker` processes jobs, so
+analysis capacity scales independently of web workers.
+
+Workers claim a job with a conditional UPDATE (status pending -> running), so
+several workers can poll the same table without double-processing a job.
+
+While a job runs, its worker refreshes the job's heartbeat every
+ANALYSIS_JOB_HEARTBEAT_INTERVAL seconds. A running job whose heartbeat is
+older than ANALYSIS_JOB_STALE_AFTER lost its worker; a slow Gemini call
+alone never makes a job stale.
+
+Jobs orphaned by a restarted worker are recovered by whoever runs jobs:
+run_analysis_worker in 'external' mode. In 'thread' mode, each web worker starts
+a recovery thread (from gunicorn's post_worker_init, or on its first submit).
+Every ANALYSIS_JOB_RECOVERY_INTERVAL seconds, that thread re-queues stale
+running jobs and claims pending jobs that no worker picked up.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .analysis import failure_details, get_profile_analysis
+from .models import AnalysisJob, extract_linkedin_profile_id
+
+logger = logging.getLogger(__name__)
+
+MODE_THREAD = 'thread'
+MODE_EXTERNAL = 'external'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_setting('ANALYSIS_JOB_WORKERS', 4),
+                    thread_name_prefix='analysis-job',
+                )
+                _executor_pid = pid
+    return _executor
+
+
+def submit(profile_data, cached_result=None, cache_status=None):
+    """
+    Create a job for validated profile data and return it.
+    A job whose analysis is already cached is stored as succeeded straight away.
+    """
+    profile_id = extract_linkedin_profile_id(profile_data.get('linkedin_url'))
+
+    if cached_result is not None:
+        now = timezone.now()
+        metrics.incr('analysis_jobs.completed_from_cache')
+        return AnalysisJob.objects.create(
+            status=AnalysisJob.STATUS_SUCCEEDED,
+            profile_id=profile_id,
+            profile_data=profile_data,
+            result=cached_result,
+            cache_status=cache_status,
+            started_at=now,
+            finished_at=now,
+        )
+
+    job = AnalysisJob.objects.create(profile_id=profile_id, profile_data=profile_data)
+    metrics.incr('analysis_jobs.submitted')
+
+    if _setting('ANALYSIS_JOB_MODE', MODE_THREAD) == MODE_THREAD:
+        start_recovery()
+        job_id = job.id
+        transaction.on_commit(lambda: _get_executor().submit(run_job, job_id))
+    return job
+
+
+def claim(job_id):
+    """
+    Atomically move a pending job to running. Returns True if this caller won it.
+    """
+    now = timezone.now()
+    claimed = AnalysisJob.objects.filter(id=job_id, status=AnalysisJob.STATUS_PENDING).update(
+        status=AnalysisJob.STATUS_RUNNING,
+        started_at=now,
+        heartbeat_at=now,
+        attempts=F('attempts') + 1,
+    )
+    return claimed == 1
+
+
+def claim_next(limit=1, created_before=None):
+    """
+    Claim up to `limit` of the oldest pending jobs and return their ids.
+    With `created_before`, only jobs created before that time are considered.
+    """
+    claimed = []
+    pending = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_PENDING)
+    if created_before is not None:
+        pending = pending.filter(created_at__lt=created_before)
+    candidates = pending.order_by('created_at').values_list('id', flat=True)[:limit * 2]
+    for job_id in candidates:
+        if claim(job_id):
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def run_job(job_id, already_claimed=False):
+    """
+    Claim (unless already claimed) and process one job, storing its result or error.
+    """
+    try:
+        if not already_claimed and not claim(job_id):
+            return
+
+        profile_data = AnalysisJob.objects.values_list('profile_data', flat=True).get(id=job_id)
+        started = time.monotonic()
+        with _heartbeat(job_id):
+            try:
+                analysis_result, cache_status = get_profile_analysis(profile_data)
+            except Exception as e:
+                _finish(job_id, AnalysisJob.STATUS_FAILED, error=failure_details(e))
+            else:
+                _finish(job_id, AnalysisJob.STATUS_SUCCEEDED, result=analysis_result, cache_status=cache_status)
+        metrics.observe('analysis_jobs.run', time.monotonic() - started)
+    except Exception:
+        logger.exception('Analysis job %s crashed', job_id)
+    finally:
+        connections.close_all()
+
+
+def beat(job_id):
+    """
+    Refresh a running job's heartbeat. Returns False once the job is no longer running.
+    """
+    return AnalysisJob.objects.filter(id=job_id, status=AnalysisJob.STATUS_RUNNING).update(heartbeat_at=timezone.now()) == 1
+
+
+@contextmanager
+def _heartbeat(job_id):
+    """
+    Keep `job_id`'s heartbeat fresh from a side thread while the block runs.
+    """
+    stopped = threading.Event()
+
+    def run():
+        try:
+            while not stopped.wait(_setting('ANALYSIS_JOB_HEARTBEAT_INTERVAL', 60)):
+                try:
+                    if not beat(job_id):
+                        return
+                except Exception:
+                    logger.exception('Heartbeat for analysis job %s failed', job_id)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name='analysis-job-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+
+
+def _finish(job_id, status, result=None, error=None, cache_status=None):
+    AnalysisJob.objects.filter(id=job_id).update(
+        status=status,
+        result=result,
+        error=error,
+        cache_status=cache_status,
+        finished_at=timezone.now(),
+    )
+    metrics.incr(f'analysis_jobs.{status}')
+
+
+def requeue_stale():
+    """
+    Return running jobs whose heartbeat stopped (their worker died) to pending,
+    or fail them once they have used up ANALYSIS_JOB_MAX_ATTEMPTS. Returns (requeued, failed).
+    """
+    cutoff = timezone.now() - timedelta(seconds=_setting('ANALYSIS_JOB_STALE_AFTER', 600))
+    stale = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_RUNNING, heartbeat_at__lt=cutoff)
+    max_attempts = _setting('ANALYSIS_JOB_MAX_ATTEMPTS', 3)
+
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=AnalysisJob.STATUS_FAILED,
+        error={'error': 'Analysis failed', 'message': 'Worker stopped before the job finished'},
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status=AnalysisJob.STATUS_PENDING)
+    return requeued, failed
+
+
+_recovery_pid = None
+_recovery_lock = threading.Lock()
+
+
+def start_recovery():
+    """
+    Start this process's recovery thread in 'thread' mode; a no-op when it is
+    already running or jobs run externally.
+    """
+    global _recovery_pid
+
+    if _setting('ANALYSIS_JOB_MODE', MODE_THREAD) != MODE_THREAD:
+        return
+    pid = os.getpid()
+    if _recovery_pid == pid:
+        return
+    with _recovery_lock:
+        if _recovery_pid == pid:
+            return
+        threading.Thread(target=_recovery_loop, name='analysis-job-recovery', daemon=True).start()
+        _recovery_pid = pid
+
+
+def recover(in_flight=()):
+    """
+    One recovery pass for 'thread' mode: re-queue stale jobs, then claim pending
+    jobs older than ANALYSIS_JOB_RECOVERY_INTERVAL for this process's pool.
+    Newer jobs are still on their way to the pool of the worker that created them.
+    Returns the futures of the claimed jobs.
+    """
+    requeued, failed = requeue_stale()
+    if requeued or failed:
+        logger.info('Re-queued %s stale analysis job(s), failed %s', requeued, failed)
+        metrics.incr('analysis_jobs.requeued', requeued)
+
+    free_slots = _setting('ANALYSIS_JOB_WORKERS', 4) - len(in_flight)
+    if free_slots <= 0:
+        return []
+    cutoff = timezone.now() - timedelta(seconds=_setting('ANALYSIS_JOB_RECOVERY_INTERVAL', 60))
+    executor = _get_executor()
+    return [
+        executor.submit(run_job, job_id, already_claimed=True)
+        for job_id in claim_next(limit=free_slots, created_before=cutoff)
+    ]
+
+
+def _recovery_loop():
+    in_flight = set()
+    while True:
+        try:
+            in_flight = {future for future in in_flight if not future.done()}
+            in_flight.update(recover(in_flight))
+        except Exception:
+            logger.exception('Analysis job recovery failed')
+        finally:
+            connections.close_all()
+        time.sleep(_setting('ANALYSIS_JOB_RECOVERY_INTERVAL', 60))
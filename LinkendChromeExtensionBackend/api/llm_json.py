@@ -0,0 +1,229 @@
+"""
+Single-pass JSON object extraction from LLM output.
+
+The scanner walks the text once, finds the first balanced `{...}` (ignoring
+code fences and any prose around it) and decodes only that span. When the
+text ends inside the object - Gemini stopped at MAX_TOKENS, or a stream was
+cut - it salvages what was complete instead of failing:
+
+- a string value that was being written is closed and kept, and reported
+  in `truncated_fields`;
+- anything else after the last complete value (a half-written number, a
+  key without a value, a nested object) is dropped and reported in
+  `lost_fields`;
+- every open array and object is then closed.
+
+Salvaged results are returned as PartialJSON, a dict that carries those
+two lists. `finalize()` turns one into a plain dict with the report stored
+under `_partial`, so the marker survives JSON storage (the analysis cache,
+single-flight hand-offs, job rows), and rejects a salvage that lacks fields
+the response needs.
+"""
+import json
+import re
+
+WHITESPACE = ' \t\r\n'
+PRIMITIVE_END = ',}]' + WHITESPACE
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+# An incomplete \uXXXX escape at the end of a cut string cannot be closed as-is.
+_INCOMPLETE_UNICODE_ESCAPE = re.compile(r'(?<!\\)((?:\\\\)*)\\u[0-9a-fA-F]{0,3}$')
+
+
+class PartialJSON(dict):
+    """
+    An object recovered from truncated output.
+    """
+    def __init__(self, value, truncated_fields=(), lost_fields=()):
+        super().__init__(value)
+        self.truncated_fields = list(truncated_fields)
+        self.lost_fields = list(lost_fields)
+
+
+PARTIAL_KEY = '_partial'
+
+
+class IncompleteJSON(ValueError):
+    """
+    Raised when an object salvaged from truncated output is missing fields the
+    response needs. `report` is the salvage report, `details` the validation errors.
+    """
+    def __init__(self, report, details):
+        super().__init__('Response was truncated; lost: ' + ', '.join(report['lost'] + report['truncated']))
+        self.report = report
+        self.details = details
+
+
+def finalize(result, serializer_class):
+    """
+    Return `result` ready to serve and store. Complete results are returned
+    unchanged. A PartialJSON becomes a plain dict with
+    {'truncated': [...], 'lost': [...]} under PARTIAL_KEY, where `lost` also
+    names the serializer's fields that never arrived. Raises IncompleteJSON
+    when the salvaged fields do not validate against `serializer_class`.
+    """
+    if not isinstance(result, PartialJSON):
+        return result
+    missing = [name for name in serializer_class().fields if name not in result]
+    report = {
+        'truncated': result.truncated_fields,
+        'lost': list(dict.fromkeys(result.lost_fields + missing)),
+    }
+    serializer = serializer_class(data=result)
+    if not serializer.is_valid():
+        raise IncompleteJSON(report, serializer.errors)
+    return {**result, PARTIAL_KEY: report}
+
+
+def partial_report(result):
+    """
+    The salvage report of a finalized result, or None for a complete one.
+    """
+    return result.get(PARTIAL_KEY) if isinstance(result, dict) else None
+
+
+class _Frame:
+    __slots__ = ('closer', 'path', 'key', 'count', 'expect', 'pending')
+
+    def __init__(self, opener, path):
+        self.closer = '}' if opener == '{' else ']'
+        self.path = path
+        self.key = None
+        self.count = 0
+        self.expect = 'key' if opener == '{' else 'value'
+        # True while a member/element has been started but not completed.
+        self.pending = False
+
+    def child_path(self):
+        if self.closer == ']':
+            return f'{self.path}[{self.count}]'
+        return f'{self.path}.{self.key}' if self.path else self.key
+
+    def value_done(self):
+        self.count += 1
+        self.expect = 'comma'
+        self.pending = False
+
+
+def _closers(stack):
+    return ''.join(frame.closer for frame in reversed(stack))
+
+
+def extract_json_object(text):
+    """
+    Decode the first JSON object in `text`. Returns a dict, or a PartialJSON
+    when the object had to be salvaged from truncated text.
+    Raises ValueError when no object can be recovered.
+    """
+    start = text.find('{')
+    while start != -1:
+        result = _scan(text, start)
+        if result is not None:
+            return result
+        # A balanced span that is not JSON (e.g. braces in prose): try the next one.
+        start = text.find('{', start + 1)
+    raise ValueError('No JSON object found')
+
+
+def _scan(text, start):
+    stack = []
+    in_string = False
+    escape = False
+    string_start = 0
+    # Last point where the object could be cut and closed: (end, depth, closers).
+    safe = None
+    i = start
+    n = len(text)
+
+    while i < n:
+        if in_string:
+            # Jump straight to the next quote or backslash.
+            match = _STRING_SPECIAL.search(text, i)
+            if match is None:
+                break
+            i = match.start()
+            if text[i] == '\\':
+                if i + 1 == n:
+                    escape = True
+                    break
+                i += 2
+                continue
+            in_string = False
+            frame = stack[-1]
+            if frame.expect == 'key':
+                frame.key = json.loads(text[string_start:i + 1])
+                frame.expect = 'colon'
+                frame.pending = True
+            else:
+                frame.value_done()
+                safe = (i + 1, len(stack), _closers(stack))
+            i += 1
+            continue
+
+        ch = text[i]
+        if ch == '"':
+            in_string = True
+            string_start = i
+            if stack and stack[-1].closer == ']':
+                stack[-1].pending = True
+        elif ch in '{[':
+            path = stack[-1].child_path() if stack else ''
+            if stack:
+                stack[-1].pending = True
+            stack.append(_Frame(ch, path))
+        elif ch in '}]':
+            stack.pop()
+            if not stack:
+                try:
+                    return json.loads(text[start:i + 1])
+                except json.JSONDecodeError:
+                    return None
+            stack[-1].value_done()
+            safe = (i + 1, len(stack), _closers(stack))
+        elif ch == ':':
+            stack[-1].expect = 'value'
+        elif ch == ',':
+            stack[-1].expect = 'key' if stack[-1].closer == '}' else 'value'
+        elif ch not in WHITESPACE:
+            # Number, true, false or null: complete only once a delimiter follows.
+            stack[-1].pending = True
+            j = i
+            while j < n and text[j] not in PRIMITIVE_END:
+                j += 1
+            if j == n:
+                break
+            stack[-1].value_done()
+            safe = (j, len(stack), _closers(stack))
+            i = j
+            continue
+        i += 1
+
+    return _salvage(text, start, stack, in_string, escape, string_start, safe)
+
+
+def _salvage(text, start, stack, in_string, escape, string_start, safe):
+    if in_string and stack[-1].expect != 'key':
+        partial = text[string_start:-1] if escape else text[string_start:]
+        partial = _INCOMPLETE_UNICODE_ESCAPE.sub(r'\1', partial)
+        candidate = text[start:string_start] + partial + '"' + _closers(stack)
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+        else:
+            return PartialJSON(value, truncated_fields=[stack[-1].child_path()])
+
+    if safe is None:
+        raise ValueError('Response was truncated before any field was complete')
+
+    end, depth, closers = safe
+    lost = []
+    if len(stack) > depth or stack[depth - 1].pending:
+        frame = stack[depth - 1]
+        if frame.closer == ']' or frame.key is not None:
+            lost.append(frame.child_path())
+    try:
+        value = json.loads(text[start:end] + closers)
+    except json.JSONDecodeError as e:
+        raise ValueError(f'Could not repair truncated JSON: {e}')
+    return PartialJSON(value, lost_fields=lost)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api import query_plans
+from api.models import AnalyzedProfile, RawData
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the admin changelist queries and fail if any of them needs a full table scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to explain the queries on (default: "default")',
+        )
+
+    def handle(self, *args, **options):
+        vendor = connections[options['database']].vendor
+        if not query_plans.supports(vendor):
+            raise CommandError(f'Query plan checks are not supported on {vendor}')
+
+        results = query_plans.check_changelists([AnalyzedProfile, RawData], using=options['database'])
+        failed = [result for result in results if result.full_scans]
+        for result in results:
+            status = self.style.ERROR('SCAN') if result.full_scans else self.style.SUCCESS('OK  ')
+            details = ', '.join(result.indexes) or 'no index'
+            if result.full_scans:
+                details += f"; full scan of {', '.join(result.full_scans)}"
+            if result.sorted:
+                details += '; sorts'
+            self.stdout.write(f'{status} {result.label} ({details})')
+            if options['verbosity'] > 1:
+                self.stdout.write(result.plan)
+
+        if failed:
+            raise CommandError(f'{len(failed)} of {len(results)} queries cannot use an index')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} queries use an index'))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api import blobs
+
+
+class Command(BaseCommand):
+    help = 'Delete raw_data blobs that no RawData or AnalyzedProfile row references anymore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=float, default=1.0,
+            help='Keep blobs younger than this many hours (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        deleted = blobs.delete_unreferenced(min_age=timedelta(hours=options['min_age']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unreferenced blob(s)'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from api import search
+from api.models import AnalyzedProfile, RawData
+
+
+class Command(BaseCommand):
+    help = (
+        'Recreate the SQLite FTS5 sync triggers and rebuild the search tables from their content tables '
+        '(e.g. after VACUUM or a migration that rebuilt a table).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to rebuild the search tables on (default: "default")',
+        )
+
+    def handle(self, *args, **options):
+        for model in (RawData, AnalyzedProfile):
+            if search.rebuild(model, using=options['database']):
+                self.stdout.write(self.style.SUCCESS(f'Rebuilt the search index of {model._meta.db_table}'))
+            else:
+                self.stdout.write(f'{model._meta.db_table}: nothing to rebuild on this database')
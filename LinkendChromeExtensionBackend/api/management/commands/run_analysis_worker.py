@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Process pending analysis jobs from the analysis_jobs table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'ANALYSIS_JOB_WORKERS', 4),
+            help='Number of jobs to run concurrently (default: ANALYSIS_JOB_WORKERS)',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to sleep when no job is pending',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain the pending jobs and exit instead of polling forever',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+        self.stdout.write(f'Analysis worker started with {workers} worker thread(s)')
+
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-worker') as executor:
+            try:
+                while True:
+                    requeued, failed = jobs.requeue_stale()
+                    if requeued or failed:
+                        self.stdout.write(f'Re-queued {requeued} stale job(s), failed {failed}')
+
+                    in_flight = {future for future in in_flight if not future.done()}
+                    free_slots = workers - len(in_flight)
+                    claimed = jobs.claim_next(limit=free_slots) if free_slots > 0 else []
+                    for job_id in claimed:
+                        in_flight.add(executor.submit(jobs.run_job, job_id, already_claimed=True))
+
+                    if options['once'] and not claimed and not in_flight:
+                        break
+                    if not claimed:
+                        time.sleep(poll_interval)
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping; waiting for running jobs to finish')
+
+        self.stdout.write(self.style.SUCCESS('Analysis worker stopped'))
@@ -0,0 +1,85 @@
+"""
+Lightweight in-process counters and timings exposed through the api/metrics/ endpoint.
+
+Values live in the memory of the current worker process, so each gunicorn
+worker reports its own numbers.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+
+
+def incr(name, amount=1):
+    """
+    Increment the counter called `name` by `amount`.
+    """
+    with _lock:
+        _counters[name] += amount
+
+
+def get(name):
+    """
+    Return the current value of the counter called `name`.
+    """
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def observe(name, seconds):
+    """
+    Record one duration (in seconds) for the timing called `name`.
+    """
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+        timing['count'] += 1
+        timing['total'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+        timing['last'] = seconds
+
+
+def timings():
+    """
+    Return count, average, max and last duration (in milliseconds) for every timing.
+    """
+    with _lock:
+        items = [(name, dict(timing)) for name, timing in _timings.items()]
+
+    return {
+        name: {
+            'count': timing['count'],
+            'avgMs': round(timing['total'] / timing['count'] * 1000, 1),
+            'maxMs': round(timing['max'] * 1000, 1),
+            'lastMs': round(timing['last'] * 1000, 1),
+        }
+        for name, timing in sorted(items)
+    }
+
+
+def snapshot():
+    """
+    Return a copy of every counter, grouped by the prefix before the first dot.
+
+    Example: {'analysis_cache': {'hits_memory': 3, 'misses': 1}}
+    """
+    with _lock:
+        items = list(_counters.items())
+
+    grouped = {}
+    for name, value in sorted(items):
+        group, _, key = name.partition('.')
+        grouped.setdefault(group, {})[key or group] = value
+    return grouped
+
+
+def reset():
+    """
+    Clear all counters and timings.
+    """
+    with _lock:
+        _counters.clear()
+        _timings.clear()
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:38
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_remove_rawdata_followers_count_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisCacheEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('key', models.CharField(help_text='SHA-256 of the canonical profile payload and prompt version', max_length=64, unique=True)),
+                ('prompt_version', models.CharField(help_text='Prompt version used to produce the result', max_length=32)),
+                ('result', models.JSONField(default=dict, help_text='Validated analysis response from Gemini')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Creation timestamp')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='Entry is ignored and purged after this time')),
+            ],
+            options={
+                'verbose_name': 'Analysis Cache Entry',
+                'verbose_name_plural': 'Analysis Cache Entries',
+                'db_table': 'analysis_cache',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:44
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_analysiscacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', help_text='Job status', max_length=20)),
+                ('profile_id', models.CharField(blank=True, db_index=True, help_text='LinkedIn profile ID, when a linkedin_url was supplied', max_length=255, null=True)),
+                ('profile_data', models.JSONField(default=dict, help_text='Validated profile payload to analyze')),
+                ('result', models.JSONField(blank=True, help_text='Analysis response from Gemini', null=True)),
+                ('error', models.JSONField(blank=True, help_text='Error details when the job failed', null=True)),
+                ('cache_status', models.CharField(blank=True, help_text='Analysis cache outcome (memory, database or miss)', max_length=20, null=True)),
+                ('attempts', models.IntegerField(default=0, help_text='Number of times a worker picked up this job')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Creation timestamp')),
+                ('started_at', models.DateTimeField(blank=True, help_text='When a worker last picked up the job', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, help_text='When the job succeeded or failed', null=True)),
+            ],
+            options={
+                'verbose_name': 'Analysis Job',
+                'verbose_name_plural': 'Analysis Jobs',
+                'db_table': 'analysis_jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='analysis_jobs_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Fingerprint of the last saved payload; unchanged saves are skipped', max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='rawdata',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Fingerprint of the last written values; unchanged saves are skipped', max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:57
+
+import hashlib
+import json
+import lzma
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+BLOB_REF_KEY = '$blob'
+
+
+def _encode(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def _decode(codec, data):
+    decompress = lzma.decompress if codec == 'lzma' else zlib.decompress
+    return json.loads(decompress(bytes(data)))
+
+
+def move_raw_data_to_blobs(apps, schema_editor):
+    """
+    Store every raw_data payload as a compressed blob; the rawProfileData nested
+    in AnalyzedProfile payloads becomes a reference to its own (shared) blob.
+    """
+    JSONBlob = apps.get_model('api', 'JSONBlob')
+    pending = {}
+
+    def store(value):
+        encoded = _encode(value)
+        blob_hash = hashlib.sha256(encoded).hexdigest()
+        if blob_hash not in pending:
+            pending[blob_hash] = JSONBlob(hash=blob_hash, codec='zlib', data=zlib.compress(encoded, 6), size=len(encoded))
+        return blob_hash
+
+    def flush(model, rows):
+        JSONBlob.objects.bulk_create(list(pending.values()), ignore_conflicts=True)
+        pending.clear()
+        model.objects.bulk_update(rows, ['raw_data_blob'])
+        rows.clear()
+
+    for model_name in ('RawData', 'AnalyzedProfile'):
+        model = apps.get_model('api', model_name)
+        rows = []
+        for row in model.objects.only('id', 'raw_data').iterator(chunk_size=BATCH_SIZE):
+            payload = row.raw_data or {}
+            nested = payload.get('rawProfileData') if model_name == 'AnalyzedProfile' and isinstance(payload, dict) else None
+            if isinstance(nested, dict) and nested:
+                payload = dict(payload, rawProfileData={BLOB_REF_KEY: store(nested)})
+            row.raw_data_blob_id = store(payload)
+            rows.append(row)
+            if len(rows) >= BATCH_SIZE:
+                flush(model, rows)
+        flush(model, rows)
+
+
+def restore_raw_data_from_blobs(apps, schema_editor):
+    JSONBlob = apps.get_model('api', 'JSONBlob')
+
+    def load(blob_hash):
+        blob = JSONBlob.objects.filter(hash=blob_hash).first()
+        if blob is None:
+            return {}
+        value = _decode(blob.codec, blob.data)
+        if isinstance(value, dict):
+            for key, nested in value.items():
+                if isinstance(nested, dict) and len(nested) == 1 and BLOB_REF_KEY in nested:
+                    value[key] = load(nested[BLOB_REF_KEY])
+        return value
+
+    for model_name in ('RawData', 'AnalyzedProfile'):
+        model = apps.get_model('api', model_name)
+        rows = []
+        for row in model.objects.exclude(raw_data_blob=None).only('id', 'raw_data_blob').iterator(chunk_size=BATCH_SIZE):
+            row.raw_data = load(row.raw_data_blob_id)
+            rows.append(row)
+            if len(rows) >= BATCH_SIZE:
+                model.objects.bulk_update(rows, ['raw_data'])
+                rows.clear()
+        model.objects.bulk_update(rows, ['raw_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_analyzedprofile_content_hash_rawdata_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JSONBlob',
+            fields=[
+                ('hash', models.CharField(help_text='SHA-256 of the canonical JSON encoding', max_length=64, primary_key=True, serialize=False)),
+                ('codec', models.CharField(default='zlib', help_text='Compression codec (zlib or lzma)', max_length=8)),
+                ('data', models.BinaryField(help_text='Compressed canonical JSON')),
+                ('size', models.PositiveIntegerField(help_text='Uncompressed size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Creation timestamp')),
+            ],
+            options={
+                'verbose_name': 'JSON Blob',
+                'verbose_name_plural': 'JSON Blobs',
+                'db_table': 'json_blobs',
+            },
+        ),
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='raw_data_blob',
+            field=models.ForeignKey(blank=True, db_column='raw_data_hash', help_text='Full saved payload (compressed, content-addressed; rawProfileData is shared with RawData)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.jsonblob'),
+        ),
+        migrations.AddField(
+            model_name='rawdata',
+            name='raw_data_blob',
+            field=models.ForeignKey(blank=True, db_column='raw_data_hash', help_text='Complete raw scraped data as JSON (compressed, content-addressed)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.jsonblob'),
+        ),
+        migrations.RunPython(move_raw_data_to_blobs, restore_raw_data_from_blobs),
+        migrations.RemoveField(
+            model_name='analyzedprofile',
+            name='raw_data',
+        ),
+        migrations.RemoveField(
+            model_name='rawdata',
+            name='raw_data',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_jsonblob_raw_data_blob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(fields=['profile_id', 'disc_primary', 'dominance', 'influence', 'steadiness', 'compliance', 'updated_at'], name='analyzed_profile_lookup_idx'),
+        ),
+    ]
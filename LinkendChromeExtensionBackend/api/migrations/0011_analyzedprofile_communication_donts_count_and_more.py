@@ -0,0 +1,88 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:08
+
+from django.db import migrations, models
+from django.db.models import Case, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
+
+
+class JSONArrayLength(Func):
+    """
+    Number of elements of a JSON array column; 0 for JSON values that are not
+    arrays, NULL for SQL NULL.
+
+    jsonb_array_length() on PostgreSQL (guarded, since it raises on non-arrays),
+    json_array_length() on SQLite, JSON_LENGTH() on MySQL.
+    """
+    function = 'JSON_ARRAY_LENGTH'
+    arity = 1
+    output_field = IntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="CASE WHEN jsonb_typeof(%(expressions)s) = 'array' THEN jsonb_array_length(%(expressions)s) ELSE 0 END",
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='JSON_LENGTH', **extra_context)
+
+
+def backfill_summary_fields(apps, schema_editor):
+    AnalyzedProfile = apps.get_model('api', 'AnalyzedProfile')
+
+    def has_text(field):
+        return Case(
+            When(Q(**{f'{field}__isnull': False}) & ~Q(**{field: ''}), then=Value(True)),
+            default=Value(False),
+        )
+
+    AnalyzedProfile.objects.update(
+        key_insights_count=Coalesce(JSONArrayLength('key_insights'), 0),
+        pain_points_count=Coalesce(JSONArrayLength('pain_points'), 0),
+        communication_dos_count=Coalesce(JSONArrayLength('communication_dos'), 0),
+        communication_donts_count=Coalesce(JSONArrayLength('communication_donts'), 0),
+        has_communication_style=has_text('communication_style'),
+        has_sales_approach=has_text('sales_approach'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_analyzedprofile_analyzed_profile_lookup_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='communication_donts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Number of communication don'ts"),
+        ),
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='communication_dos_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Number of communication do's"),
+        ),
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='has_communication_style',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Communication style is set'),
+        ),
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='has_sales_approach',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Sales approach is set'),
+        ),
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='key_insights_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Number of key insights'),
+        ),
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='pain_points_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Number of pain points'),
+        ),
+        migrations.RunPython(backfill_summary_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_analyzedprofile_communication_donts_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(fields=['-created_at', '-id'], name='analyzed_profile_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(fields=['disc_primary', '-created_at'], name='analyzed_profile_primary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(fields=['confidence', '-created_at'], name='analyzed_profile_conf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(fields=['dominance', '-created_at'], name='analyzed_profile_dom_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(fields=['influence', '-created_at'], name='analyzed_profile_inf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(fields=['steadiness', '-created_at'], name='analyzed_profile_ste_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(fields=['compliance', '-created_at'], name='analyzed_profile_com_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(condition=models.Q(('dominance__gte', 70)), fields=['-created_at'], name='analyzed_profile_dom_high_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(condition=models.Q(('influence__gte', 70)), fields=['-created_at'], name='analyzed_profile_inf_high_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(condition=models.Q(('steadiness__gte', 70)), fields=['-created_at'], name='analyzed_profile_ste_high_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedprofile',
+            index=models.Index(condition=models.Q(('compliance__gte', 70)), fields=['-created_at'], name='analyzed_profile_com_high_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rawdata',
+            index=models.Index(fields=['-created_at', '-id'], name='raw_data_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rawdata',
+            index=models.Index(fields=['updated_at'], name='raw_data_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:11
+
+from django.db import migrations
+
+# Indexed text columns per table, with their weight (A ranks highest).
+SEARCH_COLUMNS = {
+    'raw_data': {
+        'name': 'A', 'headline': 'A',
+        'current_company': 'B', 'top_skills': 'B', 'skills': 'B',
+        'about': 'C', 'experience': 'C',
+        'education': 'D', 'location': 'D',
+    },
+    'analyzed_profiles': {
+        'name': 'A', 'headline': 'A',
+        'disc_primary': 'B', 'communication_style': 'B', 'sales_approach': 'B',
+        'best_approach': 'C', 'ideal_pitch': 'C',
+    },
+}
+
+# bm25 column weights matching Postgres' default ts_rank weights {D: 0.1, C: 0.2, B: 0.4, A: 1.0}.
+BM25_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+
+def _postgres_vector(columns):
+    parts = []
+    for weight in 'ABCD':
+        names = [name for name, column_weight in columns.items() if column_weight == weight]
+        if names:
+            text = " || ' ' || ".join(f"coalesce({name}, '')" for name in names)
+            parts.append(f"setweight(to_tsvector('english', {text}), '{weight}')")
+    return ' || '.join(parts)
+
+
+def _sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for table, columns in SEARCH_COLUMNS.items():
+            schema_editor.execute(
+                f'ALTER TABLE {table} ADD COLUMN search_vector tsvector '
+                f'GENERATED ALWAYS AS ({_postgres_vector(columns)}) STORED'
+            )
+            schema_editor.execute(f'CREATE INDEX {table}_search_idx ON {table} USING gin (search_vector)')
+    elif vendor == 'sqlite' and _sqlite_has_fts5(schema_editor):
+        for table, columns in SEARCH_COLUMNS.items():
+            names = ', '.join(columns)
+            new_values = ', '.join(f'new.{name}' for name in columns)
+            old_values = ', '.join(f'old.{name}' for name in columns)
+            weights = ', '.join(str(BM25_WEIGHTS[weight]) for weight in columns.values())
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {table}_fts USING fts5({names}, content='{table}', "
+                f"tokenize='porter unicode61 remove_diacritics 2')"
+            )
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO {table}_fts(rowid, {names}) VALUES (new.rowid, {new_values}); END'
+            )
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN '
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.rowid, {old_values}); END"
+            )
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {names} ON {table} BEGIN '
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.rowid, {old_values}); "
+                f'INSERT INTO {table}_fts(rowid, {names}) VALUES (new.rowid, {new_values}); END'
+            )
+            schema_editor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+            schema_editor.execute(f"INSERT INTO {table}_fts({table}_fts, rank) VALUES ('rank', 'bm25({weights})')")
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in SEARCH_COLUMNS:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_idx')
+            schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+        elif vendor == 'sqlite':
+            for trigger in ('insert', 'delete', 'update'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{trigger}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_analyzedprofile_analyzed_profile_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
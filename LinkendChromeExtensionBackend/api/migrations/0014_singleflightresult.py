@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_full_text_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SingleFlightResult',
+            fields=[
+                ('key', models.CharField(help_text='SHA-256 of the single-flight key', max_length=64, primary_key=True, serialize=False)),
+                ('result', models.JSONField(help_text='Result of the shared call')),
+                ('finished_at', models.DateTimeField(db_index=True, help_text='When the shared call finished')),
+            ],
+            options={
+                'verbose_name': 'Single-flight Result',
+                'verbose_name_plural': 'Single-flight Results',
+                'db_table': 'singleflight_results',
+            },
+        ),
+    ]
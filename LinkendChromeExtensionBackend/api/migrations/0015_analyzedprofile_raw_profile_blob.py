@@ -0,0 +1,116 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:28
+
+import hashlib
+import json
+import lzma
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+# The in-payload reference written by 0009 and earlier saves.
+BLOB_REF_KEY = '$blob'
+
+
+def _encode(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def _decode(codec, data):
+    decompress = lzma.decompress if codec == 'lzma' else zlib.decompress
+    return json.loads(decompress(bytes(data)))
+
+
+def _rewrite_payloads(apps, convert):
+    """
+    Pass every AnalyzedProfile payload blob through `convert(payload, raw_profile_hash)`,
+    which returns (payload, raw_profile_hash) or None to leave the row alone.
+    """
+    JSONBlob = apps.get_model('api', 'JSONBlob')
+    AnalyzedProfile = apps.get_model('api', 'AnalyzedProfile')
+    pending = {}
+
+    def store(value):
+        encoded = _encode(value)
+        blob_hash = hashlib.sha256(encoded).hexdigest()
+        if blob_hash not in pending:
+            pending[blob_hash] = JSONBlob(hash=blob_hash, codec='zlib', data=zlib.compress(encoded, 6), size=len(encoded))
+        return blob_hash
+
+    def flush(rows):
+        JSONBlob.objects.bulk_create(list(pending.values()), ignore_conflicts=True)
+        pending.clear()
+        AnalyzedProfile.objects.bulk_update(rows, ['raw_data_blob', 'raw_profile_blob'])
+        rows.clear()
+
+    rows = []
+    profiles = AnalyzedProfile.objects.exclude(raw_data_blob=None).only('id', 'raw_data_blob', 'raw_profile_blob')
+    for profile in profiles.iterator(chunk_size=BATCH_SIZE):
+        blob = JSONBlob.objects.filter(hash=profile.raw_data_blob_id).values_list('codec', 'data').first()
+        if blob is None:
+            continue
+        payload = _decode(*blob)
+        converted = convert(payload, profile.raw_profile_blob_id) if isinstance(payload, dict) else None
+        if converted is None:
+            continue
+        payload, profile.raw_profile_blob_id = converted
+        profile.raw_data_blob_id = store(payload)
+        rows.append(profile)
+        if len(rows) >= BATCH_SIZE:
+            flush(rows)
+    flush(rows)
+
+
+def move_nested_refs_to_column(apps, schema_editor):
+    """
+    Replace the {"$blob": hash} rawProfileData inside payload blobs with raw_profile_blob.
+    The old payload blobs are left for prune_json_blobs.
+    """
+    JSONBlob = apps.get_model('api', 'JSONBlob')
+
+    def convert(payload, raw_profile_hash):
+        nested = payload.get('rawProfileData')
+        if not (isinstance(nested, dict) and len(nested) == 1 and BLOB_REF_KEY in nested):
+            return None
+        if not JSONBlob.objects.filter(hash=nested[BLOB_REF_KEY]).exists():
+            return None
+        return {key: value for key, value in payload.items() if key != 'rawProfileData'}, nested[BLOB_REF_KEY]
+
+    _rewrite_payloads(apps, convert)
+
+
+def move_nested_refs_to_payload(apps, schema_editor):
+
+    def convert(payload, raw_profile_hash):
+        if not raw_profile_hash:
+            return None
+        return dict(payload, rawProfileData={BLOB_REF_KEY: raw_profile_hash}), None
+
+    _rewrite_payloads(apps, convert)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_singleflightresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='raw_profile_blob',
+            field=models.ForeignKey(blank=True, db_column='raw_profile_hash', help_text='rawProfileData of the saved payload, stored as its own blob (normally shared with RawData)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.jsonblob'),
+        ),
+        migrations.AlterField(
+            model_name='analyzedprofile',
+            name='raw_data_blob',
+            field=models.ForeignKey(blank=True, db_column='raw_data_hash', help_text='Saved payload (compressed, content-addressed), without rawProfileData when raw_profile_blob is set', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.jsonblob'),
+        ),
+        migrations.AlterField(
+            model_name='jsonblob',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, help_text='Creation timestamp, refreshed whenever a save reuses the blob'),
+        ),
+        migrations.RunPython(move_nested_refs_to_column, move_nested_refs_to_payload),
+    ]
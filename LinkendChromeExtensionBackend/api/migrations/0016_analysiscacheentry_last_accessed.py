@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:42
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_last_accessed(apps, schema_editor):
+    # Until the first hit, existing entries keep their insertion order.
+    AnalysisCacheEntry = apps.get_model('api', 'AnalysisCacheEntry')
+    AnalysisCacheEntry.objects.update(last_accessed=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_analyzedprofile_raw_profile_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysiscacheentry',
+            name='last_accessed',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, help_text='Last cache hit (refreshed at most every few minutes); eviction order'),
+        ),
+        migrations.RunPython(backfill_last_accessed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:07
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+full_text_search = import_module('api.migrations.0013_full_text_search')
+
+
+def _create_triggers(schema_editor, table, names):
+    new_values = ', '.join(f'new.{name}' for name in names)
+    old_values = ', '.join(f'old.{name}' for name in names)
+    columns = ', '.join(names)
+    schema_editor.execute(
+        f'CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN '
+        f'UPDATE {table} SET search_id = (SELECT coalesce(max(search_id), 0) + 1 FROM {table}) '
+        f'WHERE rowid = new.rowid AND search_id IS NULL; '
+        f'INSERT INTO {table}_fts(rowid, {columns}) SELECT search_id, {columns} FROM {table} WHERE rowid = new.rowid; END'
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} WHEN old.search_id IS NOT NULL BEGIN '
+        f"INSERT INTO {table}_fts({table}_fts, rowid, {columns}) VALUES ('delete', old.search_id, {old_values}); END"
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {columns} ON {table} '
+        f'WHEN coalesce(new.search_id, old.search_id) IS NOT NULL BEGIN '
+        f"INSERT INTO {table}_fts({table}_fts, rowid, {columns}) "
+        f"SELECT 'delete', old.search_id, {old_values} WHERE old.search_id IS NOT NULL; "
+        f'INSERT INTO {table}_fts(rowid, {columns}) VALUES (coalesce(new.search_id, old.search_id), {new_values}); END'
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER {table}_fts_key AFTER UPDATE OF search_id ON {table} '
+        f'WHEN new.search_id IS NULL AND old.search_id IS NOT NULL BEGIN '
+        f'UPDATE {table} SET search_id = old.search_id WHERE rowid = new.rowid; END'
+    )
+
+
+def _drop_search_tables(schema_editor):
+    for table in full_text_search.SEARCH_COLUMNS:
+        for trigger in ('insert', 'delete', 'update', 'key'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{trigger}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+def key_on_search_id(apps, schema_editor):
+    """
+    Re-create the SQLite FTS5 tables keyed on search_id instead of the
+    implicit rowid, which VACUUM and table rebuilds renumber.
+    """
+    if schema_editor.connection.vendor != 'sqlite' or not full_text_search._sqlite_has_fts5(schema_editor):
+        return
+    _drop_search_tables(schema_editor)
+    for table, columns in full_text_search.SEARCH_COLUMNS.items():
+        names = list(columns)
+        weights = ', '.join(str(full_text_search.BM25_WEIGHTS[weight]) for weight in columns.values())
+        schema_editor.execute(f'UPDATE {table} SET search_id = rowid')
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {table}_fts USING fts5({', '.join(names)}, content='{table}', "
+            f"content_rowid='search_id', tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        _create_triggers(schema_editor, table, names)
+        schema_editor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+        schema_editor.execute(f"INSERT INTO {table}_fts({table}_fts, rank) VALUES ('rank', 'bm25({weights})')")
+
+
+def key_on_rowid(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    _drop_search_tables(schema_editor)
+    full_text_search.create_search_indexes(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_analysisjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyzedprofile',
+            name='search_id',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Key of the row in its SQLite full-text index, assigned by the database (see api/search.py)', null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='rawdata',
+            name='search_id',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Key of the row in its SQLite full-text index, assigned by the database (see api/search.py)', null=True, unique=True),
+        ),
+        migrations.RunPython(key_on_search_id, key_on_rowid),
+    ]
@@ -1,6 +1,7 @@
 import uuid
 import re
 from django.db import models
+from django.utils import timezone
 
 
 def extract_linkedin_profile_id(url):
@@ -21,6 +22,48 @@ def extract_linkedin_profile_id(url):
     return None
 
 
+def _list_length(value):
+    return len(value) if isinstance(value, list) else 0
+
+
+def _has_text(value):
+    return bool(value)
+
+
+class BlobQuerySet(models.QuerySet):
+    """
+    QuerySet for models whose raw_data lives in JSONBlob rows (see BLOB_FIELDS).
+    """
+
+    def with_blobs(self):
+        """
+        Join the blob rows behind raw_data, so reading it for each row of a
+        result decodes the joined data instead of running a query per row.
+        """
+        return self.select_related(*self.model.BLOB_FIELDS)
+
+
+class JSONBlob(models.Model):
+    """
+    Compressed JSON payload stored once under the SHA-256 of its canonical encoding.
+    Referenced by RawData.raw_data_blob, AnalyzedProfile.raw_data_blob and
+    AnalyzedProfile.raw_profile_blob.
+    """
+    hash = models.CharField(max_length=64, primary_key=True, help_text="SHA-256 of the canonical JSON encoding")
+    codec = models.CharField(max_length=8, default='zlib', help_text="Compression codec (zlib or lzma)")
+    data = models.BinaryField(help_text="Compressed canonical JSON")
+    size = models.PositiveIntegerField(help_text="Uncompressed size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True, help_text="Creation timestamp, refreshed whenever a save reuses the blob")
+
+    class Meta:
+        db_table = 'json_blobs'
+        verbose_name = 'JSON Blob'
+        verbose_name_plural = 'JSON Blobs'
+
+    def __str__(self):
+        return f"{self.hash[:12]} ({self.size} bytes)"
+
+
 class RawData(models.Model):
     """
     Stores raw scraped LinkedIn profile data before analysis.
@@ -42,20 +85,46 @@ class RawData(models.Model):
     activity = models.TextField(blank=True, null=True, help_text="Activity")
     posts = models.JSONField(default=list, blank=True, help_text="Recent posts")
     
-    raw_data = models.JSONField(default=dict, blank=True, help_text="Complete raw scraped data as JSON")
+    raw_data_blob = models.ForeignKey(
+        'JSONBlob',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        db_column='raw_data_hash',
+        related_name='+',
+        help_text="Complete raw scraped data as JSON (compressed, content-addressed)"
+    )
+    content_hash = models.CharField(max_length=64, blank=True, null=True, editable=False, help_text="Fingerprint of the last written values; unchanged saves are skipped")
+    search_id = models.BigIntegerField(null=True, blank=True, unique=True, editable=False, help_text="Key of the row in its SQLite full-text index, assigned by the database (see api/search.py)")
     
     created_at = models.DateTimeField(auto_now_add=True, help_text="Creation timestamp")
     updated_at = models.DateTimeField(auto_now=True, help_text="Last update timestamp")
 
+    objects = BlobQuerySet.as_manager()
+
+    # Foreign keys to the JSONBlob rows that make up raw_data.
+    BLOB_FIELDS = ('raw_data_blob',)
+
     class Meta:
         db_table = 'raw_data'
         ordering = ['-created_at']
         verbose_name = 'Raw Data'
         verbose_name_plural = 'Raw Data'
+        indexes = [
+            # Changelist ordering (-created_at, -pk) and the created_at/updated_at filters.
+            models.Index(fields=['-created_at', '-id'], name='raw_data_created_idx'),
+            models.Index(fields=['updated_at'], name='raw_data_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.profile_id}"
 
+    @property
+    def raw_data(self):
+        """Complete raw scraped data as JSON, loaded from its blob."""
+        from .blobs import load_related
+        return load_related(self, 'raw_data_blob')
+
 
 class AnalyzedProfile(models.Model):
     """
@@ -96,15 +165,203 @@ class AnalyzedProfile(models.Model):
     communication_dos = models.JSONField(default=list, blank=True, help_text="Communication do's as list of strings")
     communication_donts = models.JSONField(default=list, blank=True, help_text="Communication don'ts as list of strings")
     
-    raw_data = models.JSONField(default=dict, blank=True, help_text="Full analysis response from Gemini")
+    raw_data_blob = models.ForeignKey(
+        'JSONBlob',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        db_column='raw_data_hash',
+        related_name='+',
+        help_text="Saved payload (compressed, content-addressed), without rawProfileData when raw_profile_blob is set"
+    )
+    raw_profile_blob = models.ForeignKey(
+        'JSONBlob',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        db_column='raw_profile_hash',
+        related_name='+',
+        help_text="rawProfileData of the saved payload, stored as its own blob (normally shared with RawData)"
+    )
+    content_hash = models.CharField(max_length=64, blank=True, null=True, editable=False, help_text="Fingerprint of the last saved payload; unchanged saves are skipped")
+    search_id = models.BigIntegerField(null=True, blank=True, unique=True, editable=False, help_text="Key of the row in its SQLite full-text index, assigned by the database (see api/search.py)")
+
+    # Denormalised from the fields above (see SUMMARY_FIELDS) so the admin can filter on indexes.
+    key_insights_count = models.PositiveIntegerField(default=0, db_index=True, editable=False, help_text="Number of key insights")
+    pain_points_count = models.PositiveIntegerField(default=0, db_index=True, editable=False, help_text="Number of pain points")
+    communication_dos_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of communication do's")
+    communication_donts_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of communication don'ts")
+    has_communication_style = models.BooleanField(default=False, db_index=True, editable=False, help_text="Communication style is set")
+    has_sales_approach = models.BooleanField(default=False, db_index=True, editable=False, help_text="Sales approach is set")
+
     created_at = models.DateTimeField(auto_now_add=True, help_text="Creation timestamp")
     updated_at = models.DateTimeField(auto_now=True, help_text="Last update timestamp")
 
+    objects = BlobQuerySet.as_manager()
+
+    # Foreign keys to the JSONBlob rows that make up raw_data.
+    BLOB_FIELDS = ('raw_data_blob', 'raw_profile_blob')
+
+    # Denormalised column -> (source field, function computing it from the source value).
+    SUMMARY_FIELDS = {
+        'key_insights_count': ('key_insights', _list_length),
+        'pain_points_count': ('pain_points', _list_length),
+        'communication_dos_count': ('communication_dos', _list_length),
+        'communication_donts_count': ('communication_donts', _list_length),
+        'has_communication_style': ('communication_style', _has_text),
+        'has_sales_approach': ('sales_approach', _has_text),
+    }
+
     class Meta:
         db_table = 'analyzed_profiles'
         ordering = ['-created_at']
         verbose_name = 'Analyzed Profile'
         verbose_name_plural = 'Analyzed Profiles'
+        indexes = [
+            # Covering index for the bulk profile lookup (every column it reads is in the key).
+            models.Index(
+                fields=['profile_id', 'disc_primary', 'dominance', 'influence', 'steadiness', 'compliance', 'updated_at'],
+                name='analyzed_profile_lookup_idx',
+            ),
+            # Admin changelist: default ordering (-created_at, -pk) and date_hierarchy.
+            models.Index(fields=['-created_at', '-id'], name='analyzed_profile_created_idx'),
+            # disc_primary filter (and its DISTINCT choices query), confidence and DISC score
+            # ranges, each followed by the list ordering.
+            models.Index(fields=['disc_primary', '-created_at'], name='analyzed_profile_primary_idx'),
+            models.Index(fields=['confidence', '-created_at'], name='analyzed_profile_conf_idx'),
+            models.Index(fields=['dominance', '-created_at'], name='analyzed_profile_dom_idx'),
+            models.Index(fields=['influence', '-created_at'], name='analyzed_profile_inf_idx'),
+            models.Index(fields=['steadiness', '-created_at'], name='analyzed_profile_ste_idx'),
+            models.Index(fields=['compliance', '-created_at'], name='analyzed_profile_com_idx'),
+            # "High" score buckets, already in list order, so the first page is read
+            # without sorting every matching row. Partial indexes are skipped on MySQL.
+            models.Index(fields=['-created_at'], condition=models.Q(dominance__gte=70), name='analyzed_profile_dom_high_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(influence__gte=70), name='analyzed_profile_inf_high_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(steadiness__gte=70), name='analyzed_profile_ste_high_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(compliance__gte=70), name='analyzed_profile_com_high_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.disc_primary or 'No DISC type'}"
+
+    @property
+    def raw_data(self):
+        """Full saved payload as JSON, loaded from its blob(s)."""
+        from .blobs import load_related
+        payload = load_related(self, 'raw_data_blob')
+        if self.raw_profile_blob_id and isinstance(payload, dict):
+            payload['rawProfileData'] = load_related(self, 'raw_profile_blob')
+        return payload
+
+    @classmethod
+    def summary_fields_for(cls, field_names):
+        """
+        The denormalised columns that depend on any of `field_names`.
+        """
+        return [name for name, (source, _) in cls.SUMMARY_FIELDS.items() if source in field_names]
+
+    def update_summary_fields(self, field_names=None):
+        """
+        Recompute the denormalised columns (only those depending on `field_names`, if given).
+        Bulk writes, which bypass save(), call this themselves.
+        """
+        names = self.SUMMARY_FIELDS if field_names is None else self.summary_fields_for(field_names)
+        for name in names:
+            source, compute = self.SUMMARY_FIELDS[name]
+            setattr(self, name, compute(getattr(self, source)))
+        return list(names)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.update_summary_fields()
+        else:
+            update_fields = list(update_fields)
+            kwargs['update_fields'] = update_fields + self.update_summary_fields(update_fields)
+        super().save(*args, **kwargs)
+
+
+class AnalysisCacheEntry(models.Model):
+    """
+    Persistent tier of the analysis cache.
+    Stores a validated Gemini analysis keyed by a hash of the profile payload and prompt version.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the canonical profile payload and prompt version")
+    prompt_version = models.CharField(max_length=32, help_text="Prompt version used to produce the result")
+    result = models.JSONField(default=dict, help_text="Validated analysis response from Gemini")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, help_text="Creation timestamp")
+    expires_at = models.DateTimeField(db_index=True, help_text="Entry is ignored and purged after this time")
+    last_accessed = models.DateTimeField(default=timezone.now, db_index=True, help_text="Last cache hit (refreshed at most every few minutes); eviction order")
+
+    class Meta:
+        db_table = 'analysis_cache'
+        ordering = ['-created_at']
+        verbose_name = 'Analysis Cache Entry'
+        verbose_name_plural = 'Analysis Cache Entries'
+
+    def __str__(self):
+        return f"{self.key[:12]} - {self.prompt_version}"
+
+
+class SingleFlightResult(models.Model):
+    """
+    Result of a coalesced call, handed to the workers that waited on its lock.
+    Only callers that were already waiting when the call finished read it; rows
+    are purged after SINGLEFLIGHT_RESULT_TTL seconds.
+    """
+    key = models.CharField(max_length=64, primary_key=True, help_text="SHA-256 of the single-flight key")
+    result = models.JSONField(help_text="Result of the shared call")
+    finished_at = models.DateTimeField(db_index=True, help_text="When the shared call finished")
+
+    class Meta:
+        db_table = 'singleflight_results'
+        verbose_name = 'Single-flight Result'
+        verbose_name_plural = 'Single-flight Results'
+
+    def __str__(self):
+        return f"{self.key[:12]} - {self.finished_at}"
+
+
+class AnalysisJob(models.Model):
+    """
+    Background DISC analysis request.
+    Created by the submit endpoint and processed by the in-process worker pool
+    or by `manage.py run_analysis_worker`.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, help_text="Job status")
+    profile_id = models.CharField(max_length=255, blank=True, null=True, db_index=True, help_text="LinkedIn profile ID, when a linkedin_url was supplied")
+    profile_data = models.JSONField(default=dict, help_text="Validated profile payload to analyze")
+    result = models.JSONField(blank=True, null=True, help_text="Analysis response from Gemini")
+    error = models.JSONField(blank=True, null=True, help_text="Error details when the job failed")
+    cache_status = models.CharField(max_length=20, blank=True, null=True, help_text="Analysis cache outcome (memory, database or miss)")
+    attempts = models.IntegerField(default=0, help_text="Number of times a worker picked up this job")
+
+    created_at = models.DateTimeField(auto_now_add=True, help_text="Creation timestamp")
+    started_at = models.DateTimeField(blank=True, null=True, help_text="When a worker last picked up the job")
+    heartbeat_at = models.DateTimeField(blank=True, null=True, help_text="Last sign of life from the worker running the job")
+    finished_at = models.DateTimeField(blank=True, null=True, help_text="When the job succeeded or failed")
+
+    class Meta:
+        db_table = 'analysis_jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='analysis_jobs_status_idx'),
+        ]
+        verbose_name = 'Analysis Job'
+        verbose_name_plural = 'Analysis Jobs'
+
+    def __str__(self):
+        return f"{self.id} - {self.status}"
@@ -0,0 +1,63 @@
+"""
+Admin pagination that estimates large counts instead of running COUNT(*).
+
+On Postgres, an exact COUNT(*) reads every matching row (or index entry).
+EstimatedCountPaginator asks the planner instead:
+- unfiltered tables use pg_class.reltuples, which VACUUM/ANALYZE keep current;
+- filtered querysets use the row estimate from EXPLAIN.
+
+The estimate is used only when it is at least ESTIMATED_COUNT_THRESHOLD rows.
+Smaller results, and every other database, still get an exact count.
+
+An estimate can be off by a few percent. The last page may then be short
+or empty, or the final rows may be unreachable through the page links;
+filters and search still reach them. Use it together with
+ModelAdmin.show_full_result_count = False, so the changelist does not run
+a second, unfiltered COUNT(*).
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+from . import metrics
+
+
+def estimate_count(queryset):
+    """
+    Planner estimate of the number of rows in `queryset` on Postgres; None elsewhere
+    or when the table has never been analyzed.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        if not queryset.query.where and not queryset.query.distinct:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(queryset.model._meta.db_table)],
+                )
+                row = cursor.fetchone()
+            estimate = row[0] if row else -1
+        else:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            estimate = plan[0]['Plan']['Plan Rows']
+    except (DatabaseError, KeyError, IndexError, ValueError):
+        return None
+    # reltuples is -1 for a table that has never been vacuumed or analyzed.
+    return int(estimate) if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        threshold = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 100000)
+        estimate = estimate_count(self.object_list) if hasattr(self.object_list, 'query') else None
+        if estimate is None or estimate < threshold:
+            return super().count
+        metrics.incr('admin.estimated_counts')
+        return estimate
@@ -0,0 +1,138 @@
+"""
+Read-through cache for the profile lookup endpoints (get-analyzed-data and
+get-raw-data), on the Django cache configured as CACHES['profiles'].
+
+Each entry is the full serialized row with the values the ETag is derived
+from (updated_at, content_hash); sparse ?fields= requests are trimmed from
+it. Lookups for profiles that do not exist are cached as MISSING for
+PROFILE_CACHE_NEGATIVE_TTL seconds, so repeated 404s do not reach the
+database.
+
+Entries are dropped after the transaction that changes a row commits:
+post_save / post_delete signals cover model saves (admin, .save()), and
+profile_store invalidates explicitly for its bulk writes, which send no
+signals.
+
+Invalidation only reaches processes that share the cache backend, so the
+cache is off by default on the per-process LocMemCache; `manage.py check`
+warns when it is enabled there.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics
+from .models import AnalyzedProfile, RawData
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'profiles'
+
+RESOURCE_ANALYZED = 'analyzed'
+RESOURCE_RAW = 'raw'
+RESOURCES = (RESOURCE_ANALYZED, RESOURCE_RAW)
+
+MISSING = 'missing'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+@register()
+def check_shared_backend(app_configs, **kwargs):
+    if _setting('PROFILE_CACHE_ENABLED', False) and isinstance(_cache(), LocMemCache):
+        return [Warning(
+            'PROFILE_CACHE_ENABLED is on with the per-process LocMemCache.',
+            hint='With more than one worker, the other workers keep serving stale profiles after a write. '
+                 'Set PROFILE_CACHE_BACKEND to a shared backend, or run a single worker.',
+            id='api.W001',
+        )]
+    return []
+
+
+def cache_key(resource, profile_id):
+    # Profile IDs can contain characters some backends reject in keys.
+    digest = hashlib.sha256(profile_id.encode('utf-8')).hexdigest()[:40]
+    return f'profile-lookup:{resource}:{digest}'
+
+
+def get(resource, profile_id):
+    """
+    Return the cached entry for `profile_id`, MISSING for a cached 404, or None.
+    """
+    if not _setting('PROFILE_CACHE_ENABLED', False):
+        return None
+    try:
+        entry = _cache().get(cache_key(resource, profile_id))
+    except Exception as e:
+        logger.warning('Profile cache read failed: %s', e)
+        return None
+    metrics.incr(f'profile_cache.{resource}.{"miss" if entry is None else "hit"}')
+    return entry
+
+
+def store(resource, profile_id, data, updated_at, content_hash):
+    """
+    Cache the full serialized row for `profile_id`.
+    """
+    _set(resource, profile_id, {'data': data, 'updated_at': updated_at, 'content_hash': content_hash})
+
+
+def store_missing(resource, profile_id):
+    """
+    Remember briefly that `profile_id` has no row.
+    """
+    _set(resource, profile_id, MISSING, _setting('PROFILE_CACHE_NEGATIVE_TTL', 30))
+
+
+def _set(resource, profile_id, entry, timeout=DEFAULT_TIMEOUT):
+    if not _setting('PROFILE_CACHE_ENABLED', False):
+        return
+    try:
+        _cache().set(cache_key(resource, profile_id), entry, timeout)
+    except Exception as e:
+        logger.warning('Profile cache write failed: %s', e)
+
+
+def invalidate(*profile_ids):
+    """
+    Drop the cached lookups (both resources) for `profile_ids`.
+    """
+    keys = [cache_key(resource, profile_id) for profile_id in profile_ids if profile_id for resource in RESOURCES]
+    if not keys:
+        return
+    try:
+        _cache().delete_many(keys)
+    except Exception as e:
+        logger.warning('Profile cache invalidation failed: %s', e)
+
+
+def invalidate_on_commit(profile_ids):
+    """
+    Invalidate `profile_ids` once the current transaction commits (immediately outside one).
+    Invalidating earlier would let a concurrent lookup re-cache the old row.
+    """
+    profile_ids = [profile_id for profile_id in profile_ids if profile_id]
+    if profile_ids:
+        transaction.on_commit(lambda: invalidate(*profile_ids))
+
+
+@receiver(post_save, sender=AnalyzedProfile)
+@receiver(post_save, sender=RawData)
+@receiver(post_delete, sender=AnalyzedProfile)
+@receiver(post_delete, sender=RawData)
+def _invalidate_profile(sender, instance, **kwargs):
+    invalidate_on_commit([instance.profile_id])
@@ -0,0 +1,434 @@
+"""
+Database writes for analyzed profiles and their raw scraped data.
+
+Shared by save-analyzed-data and its batch variant so both normalize the
+payload, extract the profile ID and map rawProfileData onto RawData the
+same way.
+
+Both tables carry a content_hash fingerprint of what was last written
+(the RawData column values, and the save payload for AnalyzedProfile, which
+is stored as its raw_data blobs). The extension re-saves the same
+analysis often; a save whose fingerprints match the stored ones writes
+nothing, and a changed save writes only the columns the payload sent.
+
+The raw_data payloads themselves go to the content-addressed blob store
+(see blobs.py) before the rows that reference them are written. Every
+write also invalidates the profile lookup cache on commit.
+"""
+import hashlib
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import blobs, metrics, profile_cache
+from .models import AnalyzedProfile, RawData, extract_linkedin_profile_id
+from .serializers import AnalyzedProfileSaveSerializer
+
+# camelCase keys (as returned by the analysis endpoint) accepted for snake_case fields.
+SAVE_FIELD_MAPPING = {
+    'linkedin_url': 'linkedin_profile',
+    'primaryType': 'disc_primary',
+    'keyInsights': 'key_insights',
+    'painPoints': 'pain_points',
+    'communicationStyle': 'communication_style',
+    'salesApproach': 'sales_approach',
+    'bestApproach': 'best_approach',
+    'idealPitch': 'ideal_pitch',
+    'communicationDos': 'communication_dos',
+    'communicationDonts': 'communication_donts',
+}
+
+# Analysis fields copied from the validated payload; on update only the ones sent are changed.
+ANALYSIS_FIELDS = [
+    'name', 'headline', 'confidence', 'dominance', 'influence', 'steadiness', 'compliance',
+    'disc_primary', 'key_insights', 'pain_points', 'communication_style', 'sales_approach',
+    'best_approach', 'ideal_pitch', 'communication_dos', 'communication_donts',
+]
+
+# Defaults for analysis fields missing from a payload when the profile is created.
+ANALYSIS_CREATE_DEFAULTS = {
+    'name': '',
+    'headline': '',
+    'disc_primary': '',
+    'key_insights': [],
+    'pain_points': [],
+    'communication_style': '',
+    'sales_approach': '',
+    'best_approach': '',
+    'ideal_pitch': '',
+    'communication_dos': [],
+    'communication_donts': [],
+}
+
+# rawProfileData key -> RawData field, for the free-text sections.
+RAW_DATA_TEXT_FIELDS = {
+    'headline': 'headline',
+    'location': 'location',
+    'about': 'about',
+    'experience': 'experience',
+    'education': 'education',
+    'skills': 'skills',
+    'connectionsCount': 'connections_count',
+    'currentCompany': 'current_company',
+    'topSkills': 'top_skills',
+    'activity': 'activity',
+}
+
+# Rows per INSERT / UPDATE statement in bulk saves.
+BULK_WRITE_BATCH_SIZE = 200
+
+RAW_DATA_UPDATE_FIELDS = [
+    'linkedin_profile', 'name', *RAW_DATA_TEXT_FIELDS.values(), 'posts', 'raw_data_blob', 'content_hash', 'updated_at',
+]
+
+
+def normalize_save_payload(data):
+    """
+    Copy camelCase keys onto their snake_case names (snake_case wins if both are sent).
+    """
+    for camel_key, snake_key in SAVE_FIELD_MAPPING.items():
+        if camel_key in data and snake_key not in data:
+            data[snake_key] = data[camel_key]
+    return data
+
+
+def fingerprint(values):
+    """
+    SHA-256 of the canonical JSON encoding of `values`.
+    """
+    canonical = json.dumps(values, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def get_linkedin_profile(validated_data):
+    """
+    Return (linkedin_profile, profile_id) for validated save data; either may be None.
+    """
+    linkedin_profile = validated_data.get('linkedin_profile', '')
+    if linkedin_profile and linkedin_profile.strip():
+        linkedin_profile = linkedin_profile.strip()
+    else:
+        linkedin_profile = None
+
+    profile_id = extract_linkedin_profile_id(linkedin_profile) if linkedin_profile else None
+    return linkedin_profile, profile_id
+
+
+def raw_data_defaults(raw_profile_data, validated_data, linkedin_profile, raw_data_hash):
+    """
+    RawData column values for a rawProfileData payload.
+    Blank and "Not available" sections are stored as NULL.
+    """
+    def get_value(key):
+        value = raw_profile_data.get(key, '')
+        if not value or not str(value).strip() or str(value).strip() == 'Not available':
+            return None
+        return str(value).strip()
+
+    defaults = {
+        'linkedin_profile': linkedin_profile,
+        'name': raw_profile_data.get('name', validated_data.get('name', '')),
+    }
+    for key, field in RAW_DATA_TEXT_FIELDS.items():
+        defaults[field] = get_value(key)
+    defaults['posts'] = raw_profile_data.get('posts', [])
+    defaults['raw_data_blob_id'] = raw_data_hash
+    return defaults
+
+
+class SaveItem:
+    """
+    One validated entry of a bulk save.
+    """
+    def __init__(self, index, payload, validated_data, linkedin_profile, profile_id):
+        self.index = index
+        self.payload = payload
+        self.validated_data = validated_data
+        self.linkedin_profile = linkedin_profile
+        self.profile_id = profile_id
+        self.raw_profile_data = validated_data.get('rawProfileData') or {}
+        self.content_hash = fingerprint(payload)
+        self.raw_values = None
+        raw_blob = None
+        if self.raw_profile_data:
+            raw_blob = blobs.PendingBlob(self.raw_profile_data)
+            self.raw_values = raw_data_defaults(self.raw_profile_data, validated_data, linkedin_profile, raw_blob.hash)
+            self.raw_values['content_hash'] = fingerprint(self.raw_values)
+
+        # The payload's rawProfileData is stored as its own blob (normally the
+        # RawData one), referenced from raw_profile_blob, and left out of the payload blob.
+        nested = payload.get('rawProfileData')
+        self.nested_blob = None
+        if raw_blob is not None and nested == self.raw_profile_data:
+            self.nested_blob = raw_blob
+        elif isinstance(nested, dict) and nested:
+            self.nested_blob = blobs.PendingBlob(nested)
+        if self.nested_blob is not None:
+            payload = {key: value for key, value in payload.items() if key != 'rawProfileData'}
+        self.payload_blob = blobs.PendingBlob(payload)
+        self.blobs = [blob for blob in (raw_blob, self.nested_blob, self.payload_blob) if blob is not None]
+
+    @property
+    def nested_hash(self):
+        return self.nested_blob.hash if self.nested_blob is not None else None
+
+    def profile_changes(self, raw_data_id):
+        """
+        Column values this save writes onto an existing AnalyzedProfile.
+        """
+        changes = {field: self.validated_data[field] for field in ANALYSIS_FIELDS if field in self.validated_data}
+        changes['raw_data_blob_id'] = self.payload_blob.hash
+        changes['raw_profile_blob_id'] = self.nested_hash
+        changes['content_hash'] = self.content_hash
+        if raw_data_id:
+            changes['raw_data_ref_id'] = raw_data_id
+        if self.validated_data.get('user_id'):
+            changes['user_id'] = self.validated_data['user_id']
+        return changes
+
+    def conflict_update_fields(self, raw_data_id):
+        """
+        Columns an insert of this save overwrites when the row already exists:
+        the fields it sent, never the create defaults of those it did not.
+        """
+        update_fields = ['raw_data_blob', 'raw_profile_blob', 'content_hash', 'updated_at']
+        update_fields += [field for field in ANALYSIS_FIELDS if field in self.validated_data]
+        update_fields += AnalyzedProfile.summary_fields_for(update_fields)
+        if raw_data_id:
+            update_fields.append('raw_data_ref')
+        if self.validated_data.get('user_id'):
+            update_fields.append('user_id')
+        return update_fields
+
+
+def prepare_save_item(index, payload):
+    """
+    Validate one bulk save payload. Returns (SaveItem, None) or (None, error_entry).
+    """
+    if not isinstance(payload, dict):
+        return None, {'index': index, 'status': 'error', 'error': 'Invalid data', 'details': 'Each profile must be a JSON object'}
+
+    data = normalize_save_payload(dict(payload))
+    serializer = AnalyzedProfileSaveSerializer(data=data)
+    if not serializer.is_valid():
+        return None, {'index': index, 'status': 'error', 'error': 'Invalid data', 'details': serializer.errors}
+
+    linkedin_profile, profile_id = get_linkedin_profile(serializer.validated_data)
+    if not profile_id:
+        return None, {'index': index, 'status': 'error', 'error': 'Invalid LinkedIn profile URL. Could not extract profile ID.'}
+
+    return SaveItem(index, payload, serializer.validated_data, linkedin_profile, profile_id), None
+
+
+def apply_changes(instance, values):
+    """
+    Set `values` on `instance` and return the names of the fields that actually changed.
+    """
+    dirty = []
+    for field, value in values.items():
+        if getattr(instance, field) != value:
+            setattr(instance, field, value)
+            dirty.append(field)
+    return dirty
+
+
+def bulk_save(payloads):
+    """
+    Save many analyzed profiles (with their rawProfileData) in one transaction.
+
+    Existing rows are resolved with one IN query per table. Rows whose
+    fingerprint is unchanged are left alone. New rows are inserted with
+    bulk_create(update_conflicts=True), so a concurrent insert of the same
+    profile_id turns into an update instead of a unique violation. Changed
+    rows are written with bulk_update.
+
+    Returns one result entry per payload, in input order. Status is one of:
+    'created', 'updated', 'unchanged', 'skipped' (a later entry has the same
+    profile_id) or 'error'.
+    """
+    results = [None] * len(payloads)
+    items = {}
+    for index, payload in enumerate(payloads):
+        item, error = prepare_save_item(index, payload)
+        if error:
+            results[index] = error
+            continue
+        previous = items.get(item.profile_id)
+        if previous is not None:
+            results[previous.index] = {
+                'index': previous.index, 'status': 'skipped', 'profile_id': item.profile_id,
+                'message': f'Superseded by item {index} with the same profile_id',
+            }
+        items[item.profile_id] = item
+
+    if items:
+        with transaction.atomic():
+            blobs.save_many([blob for item in items.values() for blob in item.blobs])
+            # Bulk writes send no model signals, so drop cached lookups explicitly.
+            profile_cache.invalidate_on_commit(list(items))
+            raw_data_ids, raw_changed = _bulk_save_raw_data([item for item in items.values() if item.raw_values])
+            statuses = _bulk_save_analyzed_profiles(items, raw_data_ids)
+
+        for profile_id, item in items.items():
+            item_status = statuses[profile_id]
+            if item_status == 'unchanged' and profile_id in raw_changed:
+                item_status = 'updated'
+            results[item.index] = {'index': item.index, 'status': item_status, 'profile_id': profile_id}
+    return results
+
+
+def _bulk_save_raw_data(items):
+    """
+    Upsert RawData for `items`, skipping rows whose fingerprint is unchanged.
+    Returns ({profile_id: raw_data_id}, set of profile_ids whose RawData was written).
+    """
+    if not items:
+        return {}, set()
+
+    existing = {
+        profile_id: (raw_data_id, content_hash)
+        for profile_id, raw_data_id, content_hash in RawData.objects
+        .filter(profile_id__in=[item.profile_id for item in items])
+        .values_list('profile_id', 'id', 'content_hash')
+    }
+    raw_data_ids = {profile_id: raw_data_id for profile_id, (raw_data_id, _) in existing.items()}
+    changed = [
+        item for item in items
+        if item.profile_id not in existing or existing[item.profile_id][1] != item.raw_values['content_hash']
+    ]
+    if not changed:
+        return raw_data_ids, set()
+
+    RawData.objects.bulk_create(
+        [RawData(profile_id=item.profile_id, **item.raw_values) for item in changed],
+        batch_size=BULK_WRITE_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['profile_id'],
+        update_fields=RAW_DATA_UPDATE_FIELDS,
+    )
+    new_profile_ids = [item.profile_id for item in changed if item.profile_id not in existing]
+    if new_profile_ids:
+        # Rows that hit a concurrent insert keep that row's id, so read the ids back.
+        raw_data_ids.update(
+            RawData.objects.filter(profile_id__in=new_profile_ids).values_list('profile_id', 'id')
+        )
+    return raw_data_ids, {item.profile_id for item in changed}
+
+
+def _bulk_save_analyzed_profiles(items, raw_data_ids):
+    """
+    Create or update AnalyzedProfile rows for `items` ({profile_id: SaveItem});
+    returns {profile_id: 'created' | 'updated' | 'unchanged'}.
+    """
+    existing = AnalyzedProfile.objects.in_bulk(list(items), field_name='profile_id')
+    now = timezone.now()
+
+    statuses = {}
+    to_update = []
+    update_fields = set()
+    # New rows grouped by the columns they overwrite if a concurrent save inserted the row first.
+    to_create = defaultdict(list)
+
+    for profile_id, item in items.items():
+        profile = existing.get(profile_id)
+        if profile is None:
+            raw_data_id = raw_data_ids.get(profile_id)
+            conflict_fields = tuple(item.conflict_update_fields(raw_data_id))
+            to_create[conflict_fields].append(_new_analyzed_profile(item, raw_data_id))
+            statuses[profile_id] = 'created'
+            continue
+
+        dirty = []
+        if profile.content_hash != item.content_hash or profile.raw_data_ref_id != raw_data_ids.get(profile_id, profile.raw_data_ref_id):
+            dirty = apply_changes(profile, item.profile_changes(raw_data_ids.get(profile_id)))
+            dirty += profile.update_summary_fields(dirty)
+        if dirty:
+            profile.updated_at = now
+            update_fields.update(dirty)
+            update_fields.add('updated_at')
+            to_update.append(profile)
+            statuses[profile_id] = 'updated'
+        else:
+            statuses[profile_id] = 'unchanged'
+
+    if to_update:
+        AnalyzedProfile.objects.bulk_update(to_update, sorted(update_fields), batch_size=BULK_WRITE_BATCH_SIZE)
+    for conflict_fields, profiles in to_create.items():
+        AnalyzedProfile.objects.bulk_create(
+            profiles,
+            batch_size=BULK_WRITE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['profile_id'],
+            update_fields=list(conflict_fields),
+        )
+    metrics.incr('profile_store.unchanged', sum(1 for value in statuses.values() if value == 'unchanged'))
+    return statuses
+
+
+def _new_analyzed_profile(item, raw_data_id):
+    """
+    Unsaved AnalyzedProfile for `item`, with create defaults for fields it did not send.
+    """
+    validated_data = item.validated_data
+    values = {field: validated_data.get(field, ANALYSIS_CREATE_DEFAULTS.get(field)) for field in ANALYSIS_FIELDS}
+    profile = AnalyzedProfile(
+        user_id=validated_data.get('user_id'),
+        profile_id=item.profile_id,
+        raw_data_ref_id=raw_data_id,
+        linkedin_profile=item.linkedin_profile,
+        raw_data_blob_id=item.payload_blob.hash,
+        raw_profile_blob_id=item.nested_hash,
+        content_hash=item.content_hash,
+        **values,
+    )
+    profile.update_summary_fields()
+    return profile
+
+
+def save_profile(item):
+    """
+    Create or update one analyzed profile (and its RawData, when sent).
+    Returns (profile, created, changed).
+
+    The fingerprint check and the writes share one transaction. A repeat of
+    the last save is a read-only no-op (one SELECT). Otherwise both rows are
+    written with INSERT ... ON CONFLICT (profile_id) DO UPDATE, the path
+    bulk_save takes for new rows, so a concurrent insert or delete of the
+    same profile_id cannot fail the save; on conflict only the analysis
+    fields the payload sent are overwritten.
+    """
+    with transaction.atomic():
+        profile = (
+            AnalyzedProfile.objects
+            .select_related('raw_data_ref')
+            .filter(profile_id=item.profile_id)
+            .first()
+        )
+        if profile is not None and profile.content_hash == item.content_hash and (
+            not item.raw_values
+            or (
+                profile.raw_data_ref is not None
+                and profile.raw_data_ref.profile_id == item.profile_id
+                and profile.raw_data_ref.content_hash == item.raw_values['content_hash']
+            )
+        ):
+            metrics.incr('profile_store.unchanged')
+            return profile, False, False
+
+        blobs.save_many(item.blobs)
+        profile_cache.invalidate_on_commit([item.profile_id])
+        raw_data_ids, _ = _bulk_save_raw_data([item] if item.raw_values else [])
+        raw_data_id = raw_data_ids.get(item.profile_id)
+
+        new_profile = _new_analyzed_profile(item, raw_data_id)
+        AnalyzedProfile.objects.bulk_create(
+            [new_profile],
+            update_conflicts=True,
+            unique_fields=['profile_id'],
+            update_fields=item.conflict_update_fields(raw_data_id),
+        )
+        # The id is not in update_fields, so the stored id tells insert from update.
+        profile = AnalyzedProfile.objects.select_related('raw_data_ref').get(profile_id=item.profile_id)
+    return profile, profile.id == new_profile.id, True
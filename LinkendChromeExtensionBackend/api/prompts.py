@@ -0,0 +1,440 @@
+"""
+Prompt assembly for the Gemini-backed endpoints.
+
+Both the DISC analysis prompt and the generate-message prompts embed the same
+profile block. Before rendering it, the profile is compacted to fit
+PROMPT_INPUT_TOKEN_BUDGET (an estimate of the whole prompt's input tokens):
+
+1. Always: skills are deduplicated (also against topSkills), only the
+   PROMPT_MAX_POSTS most-engaged posts are kept, and each post is cut to
+   PROMPT_MAX_POST_CHARS characters.
+2. While still over budget, sections are trimmed in priority order, least
+   useful first: skills, education, posts/activity, experience, about. No
+   section is cut below its floor, so a very large prompt can still end up
+   over budget (reported as overBudget).
+
+Every step that removes text is recorded in the compaction report, which is
+logged and counted in metrics.
+"""
+import logging
+import re
+from collections import namedtuple
+
+from django.conf import settings
+
+from . import gemini, metrics
+from .schemas import analysis_response_schema, message_response_schema
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the analysis prompt changes so cached analyses from the old prompt are ignored.
+ANALYSIS_PROMPT_VERSION = '3'
+
+# Rough characters-per-token ratio for English text with Gemini's tokenizer.
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = ' …'
+
+# Sections trimmed (in this order) when the profile is over budget, with the
+# number of characters each one keeps at minimum.
+TRIM_ORDER = [
+    ('skills', 300),
+    ('education', 300),
+    ('activity', 600),
+    ('experience', 800),
+    ('about', 600),
+]
+
+BuiltPrompt = namedtuple('BuiltPrompt', ['text', 'report', 'generation_config'])
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def estimate_tokens(text):
+    """
+    Cheap input-token estimate for `text` (about four characters per token).
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_text(text, max_chars, min_chars=0):
+    """
+    Cut `text` to at most `max_chars` characters, preferring a word boundary
+    unless that would leave fewer than `min_chars`.
+    """
+    if len(text) <= max_chars:
+        return text
+    limit = max(max_chars - len(TRUNCATION_MARKER), 0)
+    cut = text[:limit]
+    space = cut.rfind(' ')
+    if space > limit * 0.8 and space + len(TRUNCATION_MARKER) >= min_chars:
+        cut = cut[:space]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def dedupe_skills(skills, top_skills=''):
+    """
+    Return `skills` as a comma-separated list without duplicates or entries
+    already listed in `top_skills`, plus the number of entries removed.
+    """
+    separators = r'[,\n;|•·]+'
+    seen = {s.strip().lower() for s in re.split(separators, top_skills or '') if s.strip()}
+    kept = []
+    removed = 0
+    for skill in re.split(separators, skills):
+        skill = skill.strip()
+        if not skill:
+            continue
+        if skill.lower() in seen:
+            removed += 1
+            continue
+        seen.add(skill.lower())
+        kept.append(skill)
+    return ', '.join(kept), removed
+
+
+def _parse_count(value):
+    """
+    Parse LinkedIn engagement counts such as 42, "1,234" or "1.2K".
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.search(r'(\d[\d,]*(?:\.\d+)?)\s*([kKmM]?)', str(value or ''))
+    if not match:
+        return 0
+    number = float(match.group(1).replace(',', ''))
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(match.group(2).lower(), 1)
+    return int(number * multiplier)
+
+
+def post_engagement(post):
+    return _parse_count(post.get('reactions')) + _parse_count(post.get('comments'))
+
+
+def _text(profile_data, key):
+    value = profile_data.get(key)
+    if value is None:
+        return ''
+    return value if isinstance(value, str) else str(value)
+
+
+class ProfileCompactor:
+    """
+    Shrinks a profile's free-text sections to fit a token budget and records
+    what was removed.
+    """
+
+    def __init__(self, profile_data, budget_tokens, max_posts=None, max_post_chars=None):
+        self.budget_tokens = budget_tokens
+        self.max_posts = max_posts if max_posts is not None else _setting('PROMPT_MAX_POSTS', 5)
+        self.max_post_chars = max_post_chars if max_post_chars is not None else _setting('PROMPT_MAX_POST_CHARS', 1000)
+        self.dropped = []
+
+        self.sections = {
+            key: _text(profile_data, key)
+            for key in ('name', 'location', 'headline', 'currentCompany', 'connectionsCount',
+                        'about', 'experience', 'education', 'topSkills', 'skills')
+        }
+        # Free-form activity text from the extension replaces the structured posts.
+        self.activity = _text(profile_data, 'activity')
+        posts = profile_data.get('posts') if not self.activity else None
+        self.posts = [
+            {
+                'time': post.get('time') or 'Unknown',
+                'text': _text(post, 'text'),
+                'reactions': post.get('reactions') or '0',
+                'comments': post.get('comments') or '0',
+            }
+            for post in (posts if isinstance(posts, list) else [])
+            if isinstance(post, dict)
+        ]
+
+    def _record(self, section, action, removed_chars):
+        if removed_chars > 0:
+            self.dropped.append({'section': section, 'action': action, 'removedChars': removed_chars})
+
+    def _posts_chars(self):
+        return sum(len(post['text']) for post in self.posts)
+
+    def normalize(self):
+        """
+        Budget-independent trimming: dedupe skills, keep the top-K posts, cap each post.
+        """
+        skills = self.sections['skills']
+        if skills:
+            deduped, removed = dedupe_skills(skills, self.sections['topSkills'])
+            self.sections['skills'] = deduped
+            if removed:
+                self._record('skills', f'removed {removed} duplicate skills', len(skills) - len(deduped))
+
+        if len(self.posts) > self.max_posts:
+            ranked = sorted(range(len(self.posts)), key=lambda i: post_engagement(self.posts[i]), reverse=True)
+            keep = set(ranked[:self.max_posts])
+            before = self._posts_chars()
+            total = len(self.posts)
+            self.posts = [post for i, post in enumerate(self.posts) if i in keep]
+            self._record('posts', f'kept the {self.max_posts} most-engaged of {total} posts', before - self._posts_chars())
+
+        before = self._posts_chars()
+        for post in self.posts:
+            post['text'] = truncate_text(post['text'], self.max_post_chars)
+        self._record('posts', f'truncated posts to {self.max_post_chars} characters', before - self._posts_chars())
+
+    def _trim_posts(self, excess_chars, floor):
+        # Drop the least-engaged posts first, then shorten the rest evenly.
+        while len(self.posts) > 1 and excess_chars > 0:
+            weakest = min(range(len(self.posts)), key=lambda i: post_engagement(self.posts[i]))
+            removed = self.posts.pop(weakest)
+            excess_chars -= len(removed['text'])
+            self._record('posts', 'dropped the least-engaged post', len(removed['text']))
+        if excess_chars > 0 and self.posts:
+            post = self.posts[0]
+            before = len(post['text'])
+            post['text'] = truncate_text(post['text'], max(before - excess_chars, floor), floor)
+            self._record('posts', 'truncated the remaining post', before - len(post['text']))
+
+    def _trim_section(self, section, excess_chars, floor):
+        if section == 'activity' and not self.activity:
+            self._trim_posts(excess_chars, floor)
+            return
+        text = self.activity if section == 'activity' else self.sections[section]
+        if len(text) <= floor:
+            return
+        trimmed = truncate_text(text, max(len(text) - excess_chars, floor), floor)
+        if section == 'activity':
+            self.activity = trimmed
+        else:
+            self.sections[section] = trimmed
+        self._record(section, f'truncated to {len(trimmed)} characters', len(text) - len(trimmed))
+
+    def fit(self, render, reserved_tokens):
+        """
+        Trim sections until `reserved_tokens` plus the rendered block fits the budget.
+        """
+        for section, floor in TRIM_ORDER:
+            excess_tokens = reserved_tokens + estimate_tokens(render(self)) - self.budget_tokens
+            if excess_tokens <= 0:
+                return
+            self._trim_section(section, excess_tokens * CHARS_PER_TOKEN, floor)
+
+    def posts_text(self):
+        if self.activity:
+            return self.activity
+        if not self.posts:
+            return 'No recent posts available'
+        return '\n\n'.join(
+            f"Post {i+1} ({post['time']}): \"{post['text']}\" - {post['reactions']} reactions, {post['comments']} comments"
+            for i, post in enumerate(self.posts)
+        )
+
+
+def render_profile_block(compactor, heading):
+    s = compactor.sections
+    return f"""{heading}
+Name: {s['name'] or 'Not available'}
+Location: {s['location'] or 'Not available'}
+Headline (Full): {s['headline'] or 'Not available'}
+Current Company: {s['currentCompany'] or 'Not available'}
+Connections: {s['connectionsCount'] or 'Unknown'}
+
+About Section:
+{s['about'] or 'No about section available'}
+
+Experience:
+{s['experience'] or 'No experience data available'}
+
+Education:
+{s['education'] or 'No education data'}
+
+Top Skills:
+{s['topSkills'] or 'No top skills listed'}
+
+All Skills: {s['skills'] or 'No skills listed'}
+
+RECENT ACTIVITY & POSTS:
+{compactor.posts_text()}"""
+
+
+def build_prompt(template, profile_data, heading, response_schema=None, **fields):
+    """
+    Render `template` with a compacted `{profile_block}` and the other `fields`.
+    Returns BuiltPrompt(text, report, generation_config); the generation config
+    requests structured JSON output matching `response_schema`.
+    """
+    budget_tokens = _setting('PROMPT_INPUT_TOKEN_BUDGET', 6000)
+    reserved_tokens = estimate_tokens(template.format(profile_block='', **fields))
+
+    compactor = ProfileCompactor(profile_data, budget_tokens)
+    original_tokens = reserved_tokens + estimate_tokens(render_profile_block(compactor, heading))
+
+    compactor.normalize()
+    compactor.fit(lambda c: render_profile_block(c, heading), reserved_tokens)
+
+    text = template.format(profile_block=render_profile_block(compactor, heading), **fields)
+    report = {
+        'budgetTokens': budget_tokens,
+        'originalTokens': original_tokens,
+        'estimatedTokens': estimate_tokens(text),
+        'overBudget': estimate_tokens(text) > budget_tokens,
+        'dropped': compactor.dropped,
+    }
+
+    metrics.incr('prompt.built')
+    if compactor.dropped:
+        metrics.incr('prompt.compacted')
+        metrics.incr('prompt.tokens_removed', max(original_tokens - report['estimatedTokens'], 0))
+        logger.info(
+            'Compacted prompt from ~%d to ~%d tokens (budget %d): %s',
+            original_tokens, report['estimatedTokens'], budget_tokens,
+            '; '.join(f"{d['section']}: {d['action']}" for d in compactor.dropped)
+        )
+    if report['overBudget']:
+        metrics.incr('prompt.over_budget')
+    generation_config = gemini.structured_generation_config(response_schema) if response_schema else None
+    return BuiltPrompt(text, report, generation_config)
+
+
+def build_analysis_prompt(profile_data):
+    """
+    Build the DISC analysis prompt for validated profile data.
+    """
+    return build_prompt(
+        ANALYSIS_PROMPT_TEMPLATE, profile_data, 'PROFILE DATA:',
+        response_schema=analysis_response_schema(),
+    )
+
+
+def build_message_prompt(message_type, query, profile_data):
+    """
+    Build the email / LinkedIn / follow-up prompt for a user query and profile data.
+    """
+    template = MESSAGE_PROMPT_TEMPLATES.get(message_type, MESSAGE_PROMPT_TEMPLATES['followup'])
+    return build_prompt(
+        template, profile_data, 'PROFILE INFORMATION:',
+        response_schema=message_response_schema(message_type), query=query,
+    )
+
+
+ANALYSIS_PROMPT_TEMPLATE = """You are an expert sales psychologist and DISC personality analyst. Analyze this LinkedIn profile and provide ACTIONABLE sales insights.
+
+{profile_block}
+
+Based on this comprehensive profile, provide a DEEP personality analysis focusing on:
+1. DISC personality breakdown (must total 100%)
+2. Their values, motivations, and pain points
+3. What they care about (based on posts and career)
+4. How to approach them in sales
+5. What messaging will resonate
+6. Red flags or objections they might have
+7. Personalized email template (subject + body) tailored to their DISC type and interests
+8. LinkedIn message (under 300 characters) for connection or InMail
+9. Follow-up message for 3-5 days after initial contact
+
+Return ONLY this JSON (no markdown):
+{{
+  "dominance": 35,
+  "influence": 30,
+  "steadiness": 20,
+  "compliance": 15,
+  "primaryType": "Influence (I)",
+  "confidence": 78,
+  "description": "Engaging • Collaborative • People-focused",
+  "keyInsights": [
+    "Values innovation and cloud technology",
+    "Active on LinkedIn - posts about AWS and DevOps regularly",
+    "Career-focused on scalable solutions and architecture",
+    "Likely responds to data-driven pitches with ROI focus"
+  ],
+  "communicationStyle": "This person is technical but collaborative. They value expertise and practical solutions. Based on their posts, they're interested in AWS, cloud architecture, and DevOps practices.",
+  "salesApproach": "Lead with technical credibility. Share case studies of similar cloud implementations. Emphasize scalability and cost savings. They're active on LinkedIn, so social proof matters.",
+  "painPoints": [
+    "Managing cloud costs at scale",
+    "Finding reliable DevOps automation tools",
+    "Keeping up with rapid AWS updates"
+  ],
+  "idealPitch": "Brief, technical, backed by data. Show them how your solution saves time and money in cloud infrastructure. Mention specific AWS services they use.",
+  "communicationDos": [
+    "Be technical and knowledgeable about cloud tech",
+    "Share specific metrics and case studies",
+    "Respect their expertise - don't oversimplify",
+    "Reference their LinkedIn posts to show research"
+  ],
+  "communicationDonts": [
+    "Don't use generic sales pitches",
+    "Avoid non-technical fluff",
+    "Don't ignore their specific interests (AWS, DevOps)",
+    "Don't rush them - they'll evaluate thoroughly"
+  ],
+  "bestApproach": "Open with a specific insight about their work (reference a post or achievement). Position yourself as a peer, not a salesperson. Lead with a problem you've solved for similar AWS architects. Offer value first (whitepaper, demo, free audit) before asking for a meeting.",
+  "emailTemplate": {{
+    "subject": "Personalized subject line based on their profile",
+    "body": "Complete email body personalized to their DISC type, interests, and pain points. Include specific references to their profile, achievements, or posts. Make it warm, professional, and value-focused."
+  }},
+  "linkedinMessage": "Personalized LinkedIn connection message or InMail. Should be concise (under 300 characters), reference something specific from their profile, and include a clear value proposition. Match their communication style based on DISC type.",
+  "followUpMessage": "Follow-up message for after initial contact. Should acknowledge previous conversation, provide additional value, and include a soft call-to-action. Should be sent 3-5 days after initial contact."
+}}
+
+Make this analysis SPECIFIC to this person based on their actual content, not generic templates!"""
+
+MESSAGE_PROMPT_TEMPLATES = {
+    'email': """You are an expert email copywriter. Based on the following LinkedIn profile information and the user's specific request, create a professional, personalized email.
+
+{profile_block}
+
+USER REQUEST: {query}
+
+Generate a professional email that:
+1. Is personalized to this specific person based on their profile
+2. Addresses the user's request: "{query}"
+3. Is warm, professional, and engaging
+4. Includes a clear subject line
+5. Has a compelling body that references specific details from their profile
+6. Is appropriate for their DISC personality type (if discernible from profile)
+7. Is concise but complete (2-3 paragraphs max)
+
+Return ONLY this JSON (no markdown):
+{{
+  "subject": "Email subject line here",
+  "body": "Complete email body here with proper formatting"
+}}""",
+    'linkedin': """You are an expert LinkedIn message writer. Based on the following LinkedIn profile information and the user's specific request, create a personalized LinkedIn connection message or InMail.
+
+{profile_block}
+
+USER REQUEST: {query}
+
+Generate a LinkedIn message that:
+1. Is personalized to this specific person based on their profile
+2. Addresses the user's request: "{query}"
+3. Is warm, professional, and engaging
+4. Is concise (under 300 characters for connection requests, can be longer for InMail)
+5. References specific details from their profile to show you've done research
+6. Has a clear value proposition or reason for connecting
+7. Is appropriate for their communication style
+
+Return ONLY this JSON (no markdown):
+{{
+  "message": "Complete LinkedIn message here"
+}}""",
+    'followup': """You are an expert follow-up message writer. Based on the following LinkedIn profile information and the user's specific request, create a personalized follow-up message.
+
+{profile_block}
+
+USER REQUEST: {query}
+
+Generate a follow-up message that:
+1. Is personalized to this specific person based on their profile
+2. Addresses the user's request: "{query}"
+3. Acknowledges any previous conversation or interaction
+4. Provides additional value or information
+5. Is warm, professional, and not pushy
+6. Includes a soft call-to-action
+7. Is appropriate for follow-up timing (3-5 days after initial contact)
+
+Return ONLY this JSON (no markdown):
+{{
+  "message": "Complete follow-up message here"
+}}""",
+}
@@ -0,0 +1,146 @@
+"""
+EXPLAIN-based check that the admin changelist queries can use an index.
+
+Each list filter choice is checked twice: on its own, and inside a
+date_hierarchy month. For each case the changelist's first-page query is
+explained, and the check fails when the plan reads a table without a key
+bound: a full scan, or (for a filtered query) a walk of a whole index that
+tests the filter row by row. Filter choice queries, such as the DISTINCT
+behind a field filter, are checked as well.
+
+On Postgres the plan is taken with enable_seqscan off. That way the check
+asks whether an index *can* serve the query, rather than which plan a
+nearly empty development table happens to prefer.
+"""
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib import admin
+from django.contrib.admin import SimpleListFilter
+from django.db import connections, models, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+# Value used for plain (non-date) field filters such as disc_primary.
+FIELD_FILTER_SAMPLES = {
+    'disc_primary': 'D',
+}
+
+PlanCheck = namedtuple('PlanCheck', ['label', 'full_scans', 'indexes', 'sorted', 'plan'])
+
+_PATTERNS = {
+    'sqlite': {
+        # "SCAN t", "SCAN t USING [COVERING] INDEX i": no key bound on the index.
+        'full_scan': re.compile(r'\bSCAN (\w+)$', re.MULTILINE),
+        'index_scan': re.compile(r'\bSCAN (\w+) USING (?:COVERING )?INDEX \w+$', re.MULTILINE),
+        'index': re.compile(r'USING (?:COVERING )?INDEX (\w+)'),
+        'sort': re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|DISTINCT)'),
+    },
+    'postgresql': {
+        'full_scan': re.compile(r'Seq Scan on (\w+)'),
+        'index': re.compile(r'(?:Index(?: Only)? Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)'),
+        'sort': re.compile(r'\bSort\b'),
+    },
+}
+
+
+def supports(vendor):
+    return vendor in _PATTERNS
+
+
+def explain(queryset):
+    """
+    EXPLAIN output for `queryset`, taken with sequential scans disabled on Postgres.
+    """
+    connection = connections[queryset.db]
+    with transaction.atomic(using=queryset.db):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def check(label, queryset):
+    """
+    PlanCheck for `queryset`. A table read without a key bound counts as a
+    full scan. Walking an index without one is accepted only when the query
+    has no filter: an unfiltered page read in index order, or the DISTINCT
+    over one column's index behind a filter's choices.
+    """
+    plan = explain(queryset)
+    patterns = _PATTERNS[connections[queryset.db].vendor]
+    full_scans = set(patterns['full_scan'].findall(plan))
+    if 'index_scan' in patterns and queryset.query.where:
+        full_scans.update(patterns['index_scan'].findall(plan))
+    return PlanCheck(
+        label=label,
+        full_scans=sorted(full_scans),
+        indexes=sorted(set(patterns['index'].findall(plan))),
+        sorted=bool(patterns['sort'].search(plan)),
+        plan=plan,
+    )
+
+
+def _month_range(field):
+    start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return {f'{field}__gte': start, f'{field}__lt': end}
+
+
+def _is_date_field(model, name):
+    return isinstance(model._meta.get_field(name), (models.DateField, models.DateTimeField))
+
+
+def changelist_queries(model, using=None):
+    """
+    Yield (label, queryset) for the changelist queries of `model`'s registered admin.
+    """
+    model_admin = admin.site._registry[model]
+    request = RequestFactory().get('/')
+
+    base = model._default_manager.db_manager(using).all()
+    if model_admin.list_select_related is True:
+        base = base.select_related()
+    elif model_admin.list_select_related:
+        base = base.select_related(*model_admin.list_select_related)
+    # ChangeList appends -pk when the ordering is not already total.
+    ordering = list(model_admin.ordering or model._meta.ordering) + ['-pk']
+
+    filters = [('unfiltered', lambda queryset: queryset)]
+    for list_filter in model_admin.list_filter:
+        if isinstance(list_filter, type) and issubclass(list_filter, SimpleListFilter):
+            for value, _ in list_filter(request, {}, model, model_admin).lookup_choices:
+                instance = list_filter(request, {list_filter.parameter_name: [value]}, model, model_admin)
+                filters.append((
+                    f'{list_filter.parameter_name}={value}',
+                    lambda queryset, instance=instance: instance.queryset(request, queryset),
+                ))
+        elif isinstance(list_filter, str):
+            if _is_date_field(model, list_filter):
+                lookups = _month_range(list_filter)
+            else:
+                lookups = {list_filter: FIELD_FILTER_SAMPLES.get(list_filter, '')}
+                yield f'{list_filter} choices', base.distinct().order_by(list_filter).values_list(list_filter, flat=True)
+            filters.append((
+                f'{list_filter} filter',
+                lambda queryset, lookups=lookups: queryset.filter(**lookups),
+            ))
+
+    date_hierarchy = model_admin.date_hierarchy
+    for label, apply in filters:
+        page = apply(base).order_by(*ordering)
+        yield label, page[:model_admin.list_per_page]
+        if date_hierarchy and date_hierarchy not in label:
+            yield f'{label} in a {date_hierarchy} month', page.filter(**_month_range(date_hierarchy))[:model_admin.list_per_page]
+
+
+def check_changelists(model_classes, using=None):
+    """
+    PlanCheck results for the changelist queries of every model in `model_classes`.
+    """
+    return [
+        check(f'{model._meta.label}: {label}', queryset)
+        for model in model_classes
+        for label, queryset in changelist_queries(model, using)
+    ]
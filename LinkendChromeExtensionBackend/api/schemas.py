@@ -0,0 +1,76 @@
+"""
+Gemini responseSchema definitions generated from the DRF serializers.
+
+Gemini's structured-output mode accepts a subset of the OpenAPI schema
+object. Deriving it from the serializers keeps the schema the model is held
+to identical to the one its output is validated against.
+"""
+from functools import lru_cache
+
+from rest_framework import serializers
+
+from .serializers import AnalysisResponseSerializer, EmailTemplateSerializer, MessageResponseSerializer
+
+MESSAGE_RESPONSE_SERIALIZERS = {
+    'email': EmailTemplateSerializer,
+    'linkedin': MessageResponseSerializer,
+    'followup': MessageResponseSerializer,
+}
+
+
+def field_schema(field):
+    """
+    OpenAPI schema (Gemini subset) for one serializer field.
+    """
+    if isinstance(field, serializers.ListSerializer):
+        return {'type': 'ARRAY', 'items': field_schema(field.child)}
+    if isinstance(field, serializers.Serializer):
+        return serializer_schema(field)
+    if isinstance(field, serializers.ListField):
+        return {'type': 'ARRAY', 'items': field_schema(field.child)}
+    if isinstance(field, serializers.BooleanField):
+        schema = {'type': 'BOOLEAN'}
+    elif isinstance(field, serializers.IntegerField):
+        schema = {'type': 'INTEGER'}
+        if field.min_value is not None:
+            schema['minimum'] = field.min_value
+        if field.max_value is not None:
+            schema['maximum'] = field.max_value
+    elif isinstance(field, (serializers.FloatField, serializers.DecimalField)):
+        schema = {'type': 'NUMBER'}
+    elif isinstance(field, serializers.ChoiceField):
+        schema = {'type': 'STRING', 'enum': [str(choice) for choice in field.choices]}
+    else:
+        schema = {'type': 'STRING'}
+    if getattr(field, 'allow_null', False):
+        schema['nullable'] = True
+    return schema
+
+
+def serializer_schema(serializer, require_all=False):
+    """
+    OBJECT schema for a serializer instance; required fields (all of them with
+    `require_all`) are marked required and propertyOrdering keeps the model's
+    output in declaration order.
+    """
+    fields = serializer.fields
+    return {
+        'type': 'OBJECT',
+        'properties': {name: field_schema(field) for name, field in fields.items()},
+        'required': [name for name, field in fields.items() if require_all or field.required],
+        'propertyOrdering': list(fields),
+    }
+
+
+@lru_cache(maxsize=None)
+def analysis_response_schema():
+    # The prompt asks for every field, and under responseSchema Gemini tends to
+    # skip optional properties. The serializer keeps the message fields optional
+    # so free-form (GEMINI_STRUCTURED_OUTPUT off) answers still validate.
+    return serializer_schema(AnalysisResponseSerializer(), require_all=True)
+
+
+@lru_cache(maxsize=None)
+def message_response_schema(message_type):
+    serializer_class = MESSAGE_RESPONSE_SERIALIZERS.get(message_type, MessageResponseSerializer)
+    return serializer_schema(serializer_class())
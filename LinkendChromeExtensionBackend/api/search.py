@@ -0,0 +1,242 @@
+"""
+Full-text search over the RawData and AnalyzedProfile text columns.
+
+Postgres: each table has a `search_vector` tsvector column that the database
+generates from the weighted text columns, with a GIN index. Because the
+database computes the column itself, every write path keeps it current,
+bulk writes included.
+
+SQLite: each table has an FTS5 external-content table (`<table>_fts`). It is
+kept in sync by triggers, and its bm25 weights mirror the Postgres A-D
+weights. FTS5 can only key on an integer and the primary keys are UUIDs, so
+the index is keyed on the explicit `search_id` column (content_rowid), never
+on the implicit rowid that VACUUM and Django's table rebuilds renumber. The
+insert trigger assigns search_id, and a further trigger puts it back when a
+model save() writes the NULL of an instance that never loaded it. On
+Postgres the column stays NULL.
+
+Django implements some schema changes by rebuilding the table, which drops
+the triggers; rows written until they are back are missing from the index.
+`manage.py rebuild_search_index` recreates the triggers, keys those rows and
+rebuilds the index. It also runs automatically after `migrate` whenever a
+trigger is missing, and `manage.py check --database default` reports
+missing triggers.
+
+Postgres refuses to alter or drop a column that the generated column
+reads, so schema changes to the indexed columns must take it into account.
+
+Migration 0013 creates both; 0018 re-keys the FTS5 tables on search_id. On other databases, or on a SQLite build
+without FTS5, nothing is created; the functions here return None and callers
+fall back to icontains.
+
+User input is reduced to word tokens, and every token must match as a word
+prefix. That way search-as-you-type works, and no query syntax reaches
+either engine.
+"""
+import re
+
+from django.core.checks import Tags, Warning, register
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+TEXT_SEARCH_CONFIG = 'english'
+MAX_TERMS = 16
+
+# Columns of each FTS5 table, in index order (the same as migrations 0013 and 0018).
+FTS5_COLUMNS = {
+    'raw_data': [
+        'name', 'headline', 'current_company', 'top_skills', 'skills', 'about', 'experience', 'education', 'location',
+    ],
+    'analyzed_profiles': [
+        'name', 'headline', 'disc_primary', 'communication_style', 'sales_approach', 'best_approach', 'ideal_pitch',
+    ],
+}
+TRIGGERS = ('insert', 'delete', 'update', 'key')
+
+_TERM = re.compile(r'[^\W_]+')
+_fts5_tables = {}
+
+
+def terms(query):
+    return _TERM.findall(query or '')[:MAX_TERMS]
+
+
+def backend(model, using):
+    """
+    'postgresql', 'fts5', or None when `model` has no full-text index on `using`.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        table = f'{model._meta.db_table}_fts'
+        key = (using, table)
+        if key not in _fts5_tables:
+            _fts5_tables[key] = table in connection.introspection.table_names()
+        return 'fts5' if _fts5_tables[key] else None
+    return None
+
+
+def _match(model, using, query):
+    """
+    (backend, WHERE clause selecting the matching rows of the model's table, params).
+    """
+    engine = backend(model, using)
+    table = model._meta.db_table
+    words = terms(query)
+    if engine == 'postgresql':
+        return engine, f'{table}.search_vector @@ to_tsquery(%s::regconfig, %s)', [
+            TEXT_SEARCH_CONFIG, ' & '.join(f'{word}:*' for word in words),
+        ]
+    if engine == 'fts5':
+        return engine, f'{table}.search_id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s)', [
+            ' '.join(f'"{word}"*' for word in words),
+        ]
+    return None, None, None
+
+
+def matching(queryset, query):
+    """
+    `queryset` restricted to the rows matching `query`, or None without a full-text index.
+    """
+    engine, where, params = _match(queryset.model, queryset.db, query)
+    if engine is None:
+        return None
+    if not terms(query):
+        return queryset.none()
+    table = queryset.model._meta.db_table
+    pk = queryset.model._meta.pk.column
+    return queryset.filter(pk__in=RawSQL(f'SELECT {table}.{pk} FROM {table} WHERE {where}', params))
+
+
+def ranked(model, query, limit, using='default'):
+    """
+    [(pk, rank), ...] for the best `limit` matches of `query`, best first,
+    or None without a full-text index. Higher ranks are better on both backends.
+    """
+    engine, where, params = _match(model, using, query)
+    if engine is None:
+        return None
+    if not terms(query):
+        return []
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    if engine == 'postgresql':
+        sql = (
+            f'SELECT {table}.{pk}, ts_rank_cd({table}.search_vector, to_tsquery(%s::regconfig, %s)) AS rank '
+            f'FROM {table} WHERE {where} ORDER BY rank DESC LIMIT %s'
+        )
+        params = params + params + [limit]
+    else:
+        # The FTS5 rank column is bm25 with the weights set by the migration; lower is better.
+        sql = (
+            f'SELECT {table}.{pk}, -{table}_fts.rank FROM {table}_fts '
+            f'JOIN {table} ON {table}.search_id = {table}_fts.rowid '
+            f'WHERE {table}_fts MATCH %s ORDER BY {table}_fts.rank LIMIT %s'
+        )
+        params = params + [limit]
+    to_python = model._meta.pk.to_python
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(to_python(row_pk), rank) for row_pk, rank in cursor.fetchall()]
+
+
+def missing_triggers(model, using='default'):
+    """
+    Names of the FTS5 sync triggers of `model` that do not exist on `using`.
+    """
+    if backend(model, using) != 'fts5':
+        return []
+    table = model._meta.db_table
+    names = [f'{table}_fts_{trigger}' for trigger in TRIGGERS]
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join(['%s'] * len(names))})",
+            names,
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+    return [name for name in names if name not in existing]
+
+
+def _create_triggers(cursor, table):
+    columns = FTS5_COLUMNS[table]
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+    for trigger in TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{trigger}')
+    cursor.execute(
+        f'CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN '
+        f'UPDATE {table} SET search_id = (SELECT coalesce(max(search_id), 0) + 1 FROM {table}) '
+        f'WHERE rowid = new.rowid AND search_id IS NULL; '
+        f'INSERT INTO {table}_fts(rowid, {names}) SELECT search_id, {names} FROM {table} WHERE rowid = new.rowid; END'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} WHEN old.search_id IS NOT NULL BEGIN '
+        f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.search_id, {old_values}); END"
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {names} ON {table} '
+        f'WHEN coalesce(new.search_id, old.search_id) IS NOT NULL BEGIN '
+        f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) "
+        f"SELECT 'delete', old.search_id, {old_values} WHERE old.search_id IS NOT NULL; "
+        f'INSERT INTO {table}_fts(rowid, {names}) VALUES (coalesce(new.search_id, old.search_id), {new_values}); END'
+    )
+    # A save() of an instance that never loaded search_id writes NULL over it.
+    cursor.execute(
+        f'CREATE TRIGGER {table}_fts_key AFTER UPDATE OF search_id ON {table} '
+        f'WHEN new.search_id IS NULL AND old.search_id IS NOT NULL BEGIN '
+        f'UPDATE {table} SET search_id = old.search_id WHERE rowid = new.rowid; END'
+    )
+
+
+def rebuild(model, using='default'):
+    """
+    Recreate the FTS5 sync triggers of `model`, key the rows written while they
+    were missing, and rebuild its FTS5 table from the content table. Returns
+    False when there is nothing to rebuild (Postgres generates search_vector itself).
+    """
+    if backend(model, using) != 'fts5':
+        return False
+    table = model._meta.db_table
+    with connections[using].cursor() as cursor:
+        _create_triggers(cursor, table)
+        cursor.execute(f'SELECT coalesce(max(search_id), 0) FROM {table}')
+        last_key = cursor.fetchone()[0]
+        cursor.execute(f'UPDATE {table} SET search_id = %s + rowid WHERE search_id IS NULL', [last_key])
+        cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES('rebuild')")
+    return True
+
+
+def repair_after_migrate(sender, using='default', apps=None, **kwargs):
+    """
+    post_migrate handler: rebuild the index of every table whose triggers a
+    migration dropped (SQLite table rebuilds do). Tables migrated back to before
+    0018 keep the rowid-keyed index they had then.
+    """
+    from .models import AnalyzedProfile, RawData
+
+    _fts5_tables.clear()
+    for model in (RawData, AnalyzedProfile):
+        if not missing_triggers(model, using):
+            continue
+        if apps is not None and 'search_id' not in {field.name for field in apps.get_model(model._meta.label)._meta.fields}:
+            continue
+        rebuild(model, using)
+
+
+@register(Tags.database)
+def check_triggers(app_configs, databases=None, **kwargs):
+    from .models import AnalyzedProfile, RawData
+
+    errors = []
+    for using in databases or []:
+        for model in (RawData, AnalyzedProfile):
+            missing = missing_triggers(model, using)
+            if missing:
+                errors.append(Warning(
+                    f'Full-text search triggers missing on {model._meta.db_table}: {", ".join(missing)}.',
+                    hint='Run `manage.py rebuild_search_index`; until then writes do not reach the search index.',
+                    id='api.W002',
+                ))
+    return errors
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import AnalyzedProfile, RawData
+from .models import AnalyzedProfile, RawData, AnalysisJob
 
 
 class PostSerializer(serializers.Serializer):
@@ -51,6 +51,11 @@ class AnalysisResponseSerializer(serializers.Serializer):
     followUpMessage = serializers.CharField(required=False)
 
 
+class MessageResponseSerializer(serializers.Serializer):
+    """Generated LinkedIn / follow-up message (emails use EmailTemplateSerializer)"""
+    message = serializers.CharField()
+
+
 class AnalyzedProfileSaveSerializer(serializers.Serializer):
     """Serializer for saving analyzed profile data"""
     name = serializers.CharField(required=True)
@@ -78,9 +83,51 @@ class AnalyzedProfileSaveSerializer(serializers.Serializer):
     user_id = serializers.UUIDField(required=False, allow_null=True)
 
 
-class AnalyzedProfileModelSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    ModelSerializer mixin for sparse fieldsets: pass `fields` and/or `exclude`
+    (iterables of field names) to serialize only part of Meta.fields.
+
+    `model_columns()` maps serializer fields to the model fields that back
+    them, for .only()/.defer() on the queryset. Meta.column_map lists the
+    serializer fields whose model field has another name (or a tuple of
+    names, for fields computed from several columns).
+    """
+
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = self.selected_fields(self.fields, fields, exclude)
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+    @staticmethod
+    def selected_fields(names, fields=None, exclude=None):
+        return [
+            name for name in names
+            if (fields is None or name in fields) and (exclude is None or name not in exclude)
+        ]
+
+    @classmethod
+    def trim(cls, data, fields=None, exclude=None):
+        """
+        Apply a sparse fieldset to already serialized (full) `data`.
+        """
+        return {name: data[name] for name in cls.selected_fields(data, fields, exclude)}
+
+    @classmethod
+    def model_columns(cls, field_names):
+        column_map = getattr(cls.Meta, 'column_map', {})
+        columns = []
+        for name in field_names:
+            column = column_map.get(name, name)
+            columns.extend(column if isinstance(column, tuple) else [column])
+        return columns
+
+
+class AnalyzedProfileModelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for AnalyzedProfile model"""
-    raw_data_ref_id = serializers.UUIDField(source='raw_data_ref.id', read_only=True)
+    raw_data_ref_id = serializers.UUIDField(read_only=True)
     
     class Meta:
         model = AnalyzedProfile
@@ -92,9 +139,10 @@ class AnalyzedProfileModelSerializer(serializers.ModelSerializer):
             'communication_dos', 'communication_donts', 'raw_data', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'raw_data_ref_id']
+        column_map = {'raw_data_ref_id': 'raw_data_ref', 'raw_data': ('raw_data_blob', 'raw_profile_blob')}
 
 
-class RawDataSerializer(serializers.ModelSerializer):
+class RawDataSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for RawData model"""
     class Meta:
         model = RawData
@@ -106,3 +154,15 @@ class RawDataSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        column_map = {'raw_data': 'raw_data_blob'}
+
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    """Serializer for AnalysisJob model (status polling)"""
+    class Meta:
+        model = AnalysisJob
+        fields = [
+            'id', 'status', 'profile_id', 'result', 'error', 'cache_status',
+            'attempts', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,370 @@
+"""
+Request coalescing ("single flight") for identical Gemini calls.
+
+Concurrent callers with the same key share one execution. Only calls that
+are in flight at the same time are merged; a caller that arrives after the
+shared call finished runs its own.
+
+- Within a worker process, followers block on the leader's in-flight call
+  and receive its result (or its exception).
+- Across worker processes, the leader holds a lock on the key: a Postgres
+  advisory lock, or an fcntl file lock on other databases. A worker that had
+  to wait for that lock looks for the finished result before calling Gemini
+  itself. There are two places it can look:
+  - `lookup()`, for results that are persisted anyway (the analysis cache);
+  - with `handoff=True`, a short-lived row in `singleflight_results`. Only
+    callers that were already waiting when the call finished read that row.
+
+`ado()` is the same for the async views. Sync and async callers of a key
+share one in-process call, and the async side waits without blocking its
+event loop.
+
+Session-level advisory locks need a session-pooled or direct database
+connection; set SINGLEFLIGHT_CROSS_PROCESS = False behind a transaction pooler.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from . import metrics
+from .models import SingleFlightResult
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # (loop, future) of the async followers; guarded by _calls_lock.
+        self.async_waiters = []
+
+    async def wait_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with _calls_lock:
+            finished = self.done.is_set()
+            if not finished:
+                self.async_waiters.append((loop, future))
+        if not finished:
+            await future
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def _join(key):
+    """
+    (call, is_leader) for `key`: the call in flight, or a new one led by the caller.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        if call is None:
+            call = _calls[key] = _Call()
+            return call, True
+        return call, False
+
+
+def _finish(key, call):
+    with _calls_lock:
+        _calls.pop(key, None)
+        call.done.set()
+        waiters, call.async_waiters = call.async_waiters, []
+    for loop, future in waiters:
+        try:
+            loop.call_soon_threadsafe(_wake, future)
+        except RuntimeError:  # the follower's loop is closed
+            pass
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _follower_result(call):
+    if call.error is not None:
+        raise call.error
+    return call.result, True
+
+
+def do(key, fn, lookup=None, handoff=False):
+    """
+    Run `fn()` once for all concurrent callers of `key`.
+    `lookup` and the `handoff` row are only consulted after waiting on another
+    worker's lock. Returns (result, shared) where `shared` is True when the
+    result came from another caller's execution.
+    """
+    call, is_leader = _join(key)
+    if not is_leader:
+        metrics.incr('singleflight.coalesced_local')
+        call.done.wait()
+        return _follower_result(call)
+
+    try:
+        with cross_process_lock(key) as lock:
+            if lock.waited:
+                result = lookup() if lookup is not None else None
+                if result is None and handoff:
+                    result = read_handoff(key, since=lock.started)
+                if result is not None:
+                    metrics.incr('singleflight.coalesced_remote')
+                    call.result = result
+                    return result, True
+
+            metrics.incr('singleflight.executions')
+            result = fn()
+            if handoff:
+                publish_handoff(key, result)
+            call.result = result
+            return result, False
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        _finish(key, call)
+
+
+async def ado(key, afn, lookup=None, handoff=False):
+    """
+    Async version of do(): `afn` and `lookup` are coroutine functions.
+    """
+    call, is_leader = _join(key)
+    if not is_leader:
+        metrics.incr('singleflight.coalesced_local')
+        await call.wait_async()
+        return _follower_result(call)
+
+    try:
+        async with across_process_lock(key) as lock:
+            if lock.waited:
+                result = await lookup() if lookup is not None else None
+                if result is None and handoff:
+                    result = await sync_to_async(read_handoff)(key, since=lock.started)
+                if result is not None:
+                    metrics.incr('singleflight.coalesced_remote')
+                    call.result = result
+                    return result, True
+
+            metrics.incr('singleflight.executions')
+            result = await afn()
+            if handoff:
+                await sync_to_async(publish_handoff)(key, result)
+            call.result = result
+            return result, False
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        _finish(key, call)
+
+
+def _key_hash(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def publish_handoff(key, result):
+    """
+    Leave `result` for the workers waiting on `key`'s lock. Must run while the lock is held.
+    """
+    if not _setting('SINGLEFLIGHT_CROSS_PROCESS', True):
+        return
+    now = timezone.now()
+    try:
+        SingleFlightResult.objects.update_or_create(
+            key=_key_hash(key), defaults={'result': result, 'finished_at': now}
+        )
+        expired = now - timedelta(seconds=_setting('SINGLEFLIGHT_RESULT_TTL', 30))
+        SingleFlightResult.objects.filter(finished_at__lt=expired).delete()
+    except DatabaseError as e:
+        logger.warning('Single-flight handoff store failed: %s', e)
+
+
+def read_handoff(key, since):
+    """
+    Result of a call on `key` that finished after `since` (when this caller started waiting), or None.
+    """
+    try:
+        return (
+            SingleFlightResult.objects
+            .filter(key=_key_hash(key), finished_at__gte=since)
+            .values_list('result', flat=True)
+            .first()
+        )
+    except DatabaseError as e:
+        logger.warning('Single-flight handoff lookup failed: %s', e)
+        return None
+
+
+class LockState:
+    """
+    What happened while taking a cross-process lock: when the attempt started,
+    whether another worker held the lock, and whether it was acquired at all.
+    """
+    def __init__(self):
+        self.started = timezone.now()
+        self.waited = False
+        self.acquired = False
+
+
+def _lock_number(key):
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+class _AdvisoryLock:
+    """
+    Session-level Postgres advisory lock on the current database connection.
+    """
+    def __init__(self, key):
+        self.lock_number = _lock_number(key)
+
+    def try_acquire(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [self.lock_number])
+                return cursor.fetchone()[0]
+        except DatabaseError as e:
+            logger.warning('Single-flight advisory lock failed: %s', e)
+            return None
+
+    def release(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [self.lock_number])
+        except DatabaseError as e:
+            logger.warning('Single-flight advisory unlock failed: %s', e)
+
+    def close(self):
+        pass
+
+
+class _FileLock:
+    """
+    fcntl lock on a per-key file in SINGLEFLIGHT_LOCK_DIR (or the temp directory).
+    """
+    def __init__(self, key):
+        lock_dir = _setting('SINGLEFLIGHT_LOCK_DIR', '') or os.path.join(tempfile.gettempdir(), 'linkedin-disc-singleflight')
+        os.makedirs(lock_dir, exist_ok=True)
+        self.fd = os.open(os.path.join(lock_dir, _key_hash(key)[:32] + '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+
+    def try_acquire(self):
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def release(self):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _make_lock(key):
+    """
+    The cross-process lock for `key`, or None when there is none to take.
+    """
+    if not _setting('SINGLEFLIGHT_CROSS_PROCESS', True):
+        return None
+    if connection.vendor == 'postgresql':
+        return _AdvisoryLock(key)
+    if fcntl is not None:
+        return _FileLock(key)
+    return None
+
+
+def _backoff():
+    """
+    Poll delays for a contended lock, ending (None) after SINGLEFLIGHT_LOCK_TIMEOUT seconds.
+    """
+    deadline = time.monotonic() + _setting('SINGLEFLIGHT_LOCK_TIMEOUT', 90)
+    delay = 0.05
+    while time.monotonic() < deadline:
+        yield delay
+        delay = min(delay * 2, 0.5)
+    metrics.incr('singleflight.lock_timeouts')
+
+
+@contextmanager
+def cross_process_lock(key):
+    """
+    Hold an exclusive cross-process lock on `key`; yields a LockState.
+    Gives up after SINGLEFLIGHT_LOCK_TIMEOUT seconds and proceeds unlocked,
+    so a stuck worker can cost a duplicate call but never a hung request.
+    A database error while locking also proceeds unlocked.
+    """
+    state = LockState()
+    lock = _make_lock(key)
+    if lock is None:
+        yield state
+        return
+
+    try:
+        acquired = lock.try_acquire()
+        if acquired is False:
+            state.waited = True
+            for delay in _backoff():
+                time.sleep(delay)
+                acquired = lock.try_acquire()
+                if acquired is not False:
+                    break
+        state.acquired = bool(acquired)
+        yield state
+    finally:
+        if state.acquired:
+            lock.release()
+        lock.close()
+
+
+@asynccontextmanager
+async def across_process_lock(key):
+    """
+    Async version of cross_process_lock(); waits without blocking the event loop.
+    """
+    state = LockState()
+    lock = _make_lock(key)
+    if lock is None:
+        yield state
+        return
+
+    # The advisory lock lives on the database session, so it is taken and
+    # released through the same (thread-sensitive) connection as the async ORM.
+    try_acquire = sync_to_async(lock.try_acquire)
+    try:
+        acquired = await try_acquire()
+        if acquired is False:
+            state.waited = True
+            for delay in _backoff():
+                await asyncio.sleep(delay)
+                acquired = await try_acquire()
+                if acquired is not False:
+                    break
+        state.acquired = bool(acquired)
+        yield state
+    finally:
+        if state.acquired:
+            await sync_to_async(lock.release)()
+        await sync_to_async(lock.close)()
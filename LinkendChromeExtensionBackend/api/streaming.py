@@ -0,0 +1,155 @@
+"""
+Streaming helpers: Server-Sent Events for generate-message output and
+newline-delimited JSON for batch results.
+
+The SSE stream carries three event types:
+
+    event: chunk   data: {"text": "..."}          raw model text as it arrives
+    event: result  data: {"subject": ..., "body": ...} or {"message": ...}
+    event: error   data: {"error": "...", "message": "..."}
+
+NDJSON streams carry one JSON object per line, in completion order.
+"""
+import json
+import logging
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from . import gemini
+
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM_CONTENT_TYPE = 'text/event-stream'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def format_sse(event, data):
+    """
+    Encode one SSE event with a JSON payload.
+    """
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def wants_stream(request, data):
+    """
+    True when the caller asked for SSE via ?stream=true, a "stream" body flag,
+    or an Accept: text/event-stream header.
+    """
+    flag = request.GET.get('stream', data.get('stream', False))
+    if isinstance(flag, str):
+        flag = flag.lower() in ('1', 'true', 'yes')
+    return bool(flag) or EVENT_STREAM_CONTENT_TYPE in request.headers.get('Accept', '')
+
+
+def format_ndjson(data):
+    """
+    Encode one NDJSON line.
+    """
+    return json.dumps(data) + '\n'
+
+
+def wants_ndjson(request):
+    """
+    True when the caller asked for NDJSON via ?stream=ndjson or an Accept: application/x-ndjson header.
+    """
+    return (
+        request.GET.get('stream', '').lower() == 'ndjson'
+        or NDJSON_CONTENT_TYPE in request.headers.get('Accept', '')
+    )
+
+
+def ndjson_response(lines):
+    """
+    Wrap a (sync or async) iterator of NDJSON lines in an unbuffered streaming response.
+    """
+    response = StreamingHttpResponse(lines, content_type=NDJSON_CONTENT_TYPE)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def event_stream_response(events):
+    """
+    Wrap a (sync or async) iterator of SSE strings in an unbuffered streaming response.
+    """
+    response = StreamingHttpResponse(events, content_type=EVENT_STREAM_CONTENT_TYPE)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _result_event(text_parts, finish_reason):
+    try:
+        result = gemini.parse_json_text(''.join(text_parts), finish_reason)
+    except Exception as e:
+        return format_sse('error', {'error': 'Message generation failed', 'message': str(e)})
+    return format_sse('result', result)
+
+
+def message_events(prompt, generation_config=None):
+    """
+    Stream `prompt` through Gemini and yield SSE chunk events, then a final result event.
+    """
+    text_parts = []
+    finish_reason = ''
+    try:
+        for chunk in gemini.stream_generate_content(prompt, generation_config):
+            text = gemini.chunk_text(chunk)
+            finish_reason = gemini.chunk_finish_reason(chunk) or finish_reason
+            if text:
+                text_parts.append(text)
+                yield format_sse('chunk', {'text': text})
+    except Exception as e:
+        logger.warning('Gemini stream failed: %s', e)
+        yield format_sse('error', {'error': 'Message generation failed', 'message': str(e)})
+        return
+
+    yield _result_event(text_parts, finish_reason)
+
+
+async def amessage_events(prompt, generation_config=None):
+    """
+    Async version of message_events().
+    """
+    text_parts = []
+    finish_reason = ''
+    try:
+        async for chunk in gemini.astream_generate_content(prompt, generation_config):
+            text = gemini.chunk_text(chunk)
+            finish_reason = gemini.chunk_finish_reason(chunk) or finish_reason
+            if text:
+                text_parts.append(text)
+                yield format_sse('chunk', {'text': text})
+    except Exception as e:
+        logger.warning('Gemini stream failed: %s', e)
+        yield format_sse('error', {'error': 'Message generation failed', 'message': str(e)})
+        return
+
+    yield _result_event(text_parts, finish_reason)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets DRF content negotiation accept `Accept: text/event-stream`.
+    Non-streamed responses (validation errors) are rendered as a single error event.
+    """
+    media_type = EVENT_STREAM_CONTENT_TYPE
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_sse('error', data).encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets DRF content negotiation accept `Accept: application/x-ndjson`.
+    Non-streamed responses are rendered as a single JSON line.
+    """
+    media_type = NDJSON_CONTENT_TYPE
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_ndjson(data).encode(self.charset)
@@ -1,3 +1,1522 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import serializers
+
+from . import analysis_cache, blobs, date_buckets, gemini, jobs, pagination, profile_cache, profile_store, prompts, query_plans, schemas, search, singleflight
+from .analysis import InvalidAnalysisResponse
+from .llm_json import PARTIAL_KEY, IncompleteJSON, PartialJSON, extract_json_object, finalize
+from .models import AnalysisCacheEntry, AnalysisJob, AnalyzedProfile, JSONBlob, RawData, SingleFlightResult
+from .serializers import AnalysisResponseSerializer, AnalyzedProfileModelSerializer
+
+
+@override_settings(ANALYSIS_CACHE_ENABLED=True, ANALYSIS_CACHE_TTL=3600, ANALYSIS_CACHE_DB_MAX_ENTRIES=2)
+class AnalysisCacheTests(TestCase):
+
+    def setUp(self):
+        analysis_cache.clear()
+        self.addCleanup(analysis_cache.clear)
+
+    def test_memory_lru_drops_the_least_recently_used_entry(self):
+        lru = analysis_cache.MemoryLRU(max_entries=2, ttl=60)
+        lru.set('a', {'v': 1})
+        lru.set('b', {'v': 2})
+        lru.get('a')
+        lru.set('c', {'v': 3})
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), {'v': 1})
+
+        # Callers get a private copy.
+        lru.get('a')['v'] = 99
+        self.assertEqual(lru.get('a'), {'v': 1})
+
+    def test_memory_entries_expire(self):
+        lru = analysis_cache.MemoryLRU(max_entries=2, ttl=60)
+        with mock.patch.object(analysis_cache.time, 'monotonic', return_value=1000):
+            lru.set('a', {'v': 1})
+        with mock.patch.object(analysis_cache.time, 'monotonic', return_value=1061):
+            self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 0)
+
+    def test_database_tier_is_shared_and_promoted(self):
+        analysis_cache.store('key', {'primaryType': 'C'}, 'v1')
+        analysis_cache._get_memory().clear()  # as seen from another worker
+
+        self.assertEqual(analysis_cache.get('key'), ({'primaryType': 'C'}, analysis_cache.SOURCE_DATABASE))
+        with self.assertNumQueries(0):
+            self.assertEqual(analysis_cache.get('key'), ({'primaryType': 'C'}, analysis_cache.SOURCE_MEMORY))
+
+    def test_expired_rows_are_ignored(self):
+        analysis_cache.store('key', {'primaryType': 'C'}, 'v1')
+        analysis_cache._get_memory().clear()
+        AnalysisCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(analysis_cache.get('key'), (None, analysis_cache.SOURCE_MISS))
+
+    def test_eviction_drops_expired_then_least_recently_used_rows(self):
+        with mock.patch.object(analysis_cache, '_eviction_due', return_value=False):
+            for key in ('old', 'hot', 'new', 'expired'):
+                analysis_cache.store(key, {'key': key}, 'v1')
+        long_ago = timezone.now() - timedelta(hours=1)
+        AnalysisCacheEntry.objects.filter(key__in=['old', 'hot']).update(last_accessed=long_ago)
+        AnalysisCacheEntry.objects.filter(key='expired').update(expires_at=long_ago)
+
+        analysis_cache._get_memory().clear()
+        analysis_cache.get('hot')  # a database hit refreshes last_accessed
+        self.assertEqual(analysis_cache.evict(), 2)
+        self.assertCountEqual(AnalysisCacheEntry.objects.values_list('key', flat=True), ['hot', 'new'])
+
+    @override_settings(ANALYSIS_CACHE_EVICT_INTERVAL=300)
+    def test_store_evicts_at_most_once_per_interval(self):
+        analysis_cache._last_eviction = None
+        with mock.patch.object(analysis_cache, 'evict', return_value=0) as evict:
+            analysis_cache.store('a', {}, 'v1')
+            analysis_cache.store('b', {}, 'v1')
+        self.assertEqual(evict.call_count, 1)
+
+
+class MetricsEndpointTests(TestCase):
+
+    def test_metrics_are_staff_only(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('pid', response.json())
+        self.assertNotIn('vendor', response.json()['database'])
+
+
+class FullTextSearchTests(TestCase):
+
+    def setUp(self):
+        for model in (RawData, AnalyzedProfile):
+            if search.backend(model, 'default') is None:
+                self.skipTest('No full-text index on this database')
+
+    def test_sync_triggers_exist(self):
+        # A migration that rebuilds a SQLite table drops them; post_migrate must put them back.
+        for model in (RawData, AnalyzedProfile):
+            self.assertEqual(search.missing_triggers(model), [], model._meta.db_table)
+
+    def test_writes_reach_the_index(self):
+        profile = AnalyzedProfile.objects.create(name='Ada Lovelace', profile_id='ada', disc_primary='C')
+        self.assertEqual(list(search.matching(AnalyzedProfile.objects.all(), 'lovel')), [profile])
+
+        profile.name = 'Grace Hopper'
+        profile.save()
+        self.assertFalse(search.matching(AnalyzedProfile.objects.all(), 'lovelace').exists())
+        self.assertEqual([pk for pk, _ in search.ranked(AnalyzedProfile, 'hopper', 10)], [profile.pk])
+
+        profile.delete()
+        self.assertFalse(search.matching(AnalyzedProfile.objects.all(), 'hopper').exists())
+
+    def test_rebuild_recreates_missing_triggers(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Triggers are SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER raw_data_fts_insert')
+        self.assertEqual(search.missing_triggers(RawData), ['raw_data_fts_insert'])
+
+        missed = RawData.objects.create(name='Grace Hopper', profile_id='grace')
+        self.assertFalse(search.matching(RawData.objects.all(), 'hopper').exists())
+
+        self.assertTrue(search.rebuild(RawData))
+        self.assertEqual(search.missing_triggers(RawData), [])
+        self.assertEqual(list(search.matching(RawData.objects.all(), 'hopper')), [missed])
+        RawData.objects.create(name='Alan Turing', profile_id='alan')
+        self.assertTrue(search.matching(RawData.objects.all(), 'turing').exists())
+
+    def test_save_keeps_the_search_key(self):
+        # The instance never loaded the key the insert trigger assigned; save() writes NULL over it.
+        profile = AnalyzedProfile.objects.create(name='Ada Lovelace', profile_id='ada')
+        self.assertIsNone(profile.search_id)
+        profile.headline = 'Analyst'
+        profile.save()
+        profile.refresh_from_db()
+        self.assertIsNotNone(profile.search_id)
+        self.assertEqual(list(search.matching(AnalyzedProfile.objects.all(), 'analyst lovelace')), [profile])
+
+    def test_index_does_not_follow_the_rowid(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('rowid is SQLite only')
+        ada = RawData.objects.create(name='Ada Lovelace', profile_id='ada')
+        alan = RawData.objects.create(name='Alan Turing', profile_id='alan')
+        # What VACUUM or a table rebuild may do: renumber the rows.
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE raw_data SET rowid = -rowid')
+        self.assertEqual(list(search.matching(RawData.objects.all(), 'lovelace')), [ada])
+        self.assertEqual([pk for pk, _ in search.ranked(RawData, 'turing', 10)], [alan.pk])
+
+
+class SearchEndpointTests(TestCase):
+
+    def setUp(self):
+        for model in (RawData, AnalyzedProfile):
+            if search.backend(model, 'default') is None:
+                self.skipTest('No full-text index on this database')
+
+    def test_results_are_ranked_by_field_weight(self):
+        AnalyzedProfile.objects.create(name='Grace Hopper', profile_id='grace', ideal_pitch='Mention Lovelace')
+        AnalyzedProfile.objects.create(name='Ada Lovelace', profile_id='ada', headline='Analyst', disc_primary='C')
+        response = self.client.get('/api/profiles/search/', {'q': 'lovel'})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['query'], body['type']), ('lovel', 'analyzed'))
+        self.assertEqual([result['profile_id'] for result in body['results']], ['ada', 'grace'])
+        self.assertEqual(body['results'][0]['headline'], 'Analyst')
+        self.assertGreater(body['results'][0]['rank'], body['results'][1]['rank'])
+
+        response = self.client.get('/api/profiles/search/', {'q': 'lovelace', 'limit': 1})
+        self.assertEqual([result['profile_id'] for result in response.json()['results']], ['ada'])
+
+    def test_raw_data_search(self):
+        RawData.objects.create(name='Alan Turing', profile_id='alan', current_company='Bletchley Park')
+        response = self.client.get('/api/profiles/search/', {'q': 'bletchley', 'type': 'raw'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result['profile_id'], result['current_company']) for result in response.json()['results']],
+            [('alan', 'Bletchley Park')],
+        )
+        self.assertEqual(self.client.get('/api/profiles/search/', {'q': 'nobody'}).json()['results'], [])
+
+    def test_rejects_bad_parameters(self):
+        for params in ({}, {'q': 'ada', 'type': 'other'}, {'q': 'ada', 'limit': 0}, {'q': 'ada', 'limit': 'ten'}):
+            self.assertEqual(self.client.get('/api/profiles/search/', params).status_code, 400, params)
+
+
+def gemini_response(status_code, body=None, headers=None):
+    response = mock.Mock(status_code=status_code, headers=headers or {}, text='error')
+    response.json.return_value = body
+    return response
+
+
+class GeminiClientRetryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.client = gemini.GeminiClient('key', 'https://gemini.test/model:generateContent',
+                                          read_timeout=60, max_retries=3, backoff_base=0.5, backoff_max=20,
+                                          total_timeout=90)
+        self.post = mock.patch.object(self.client.session, 'post').start()
+        self.sleep = mock.patch.object(gemini.time, 'sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_backoff_is_full_jitter_under_the_cap(self):
+        for attempt in range(8):
+            cap = min(20, 0.5 * 2 ** attempt)
+            for _ in range(50):
+                self.assertTrue(0 <= gemini.compute_backoff(attempt, 0.5, 20) <= cap)
+        with mock.patch.object(gemini.random, 'uniform', side_effect=lambda low, high: high):
+            self.assertEqual([gemini.compute_backoff(a, 0.5, 20) for a in range(7)], [0.5, 1, 2, 4, 8, 16, 20])
+
+    def test_transient_statuses_are_retried_with_backoff(self):
+        self.post.side_effect = [gemini_response(503), gemini_response(500), gemini_response(200, {'ok': True})]
+        with mock.patch.object(gemini.random, 'uniform', side_effect=lambda low, high: high):
+            self.assertEqual(self.client.generate_content('prompt'), {'ok': True})
+        self.assertEqual([c.args[0] for c in self.sleep.call_args_list], [0.5, 1.0])
+
+    def test_retry_after_is_honoured(self):
+        self.post.side_effect = [gemini_response(429, headers={'Retry-After': '3'}), gemini_response(200, {'ok': True})]
+        self.client.generate_content('prompt')
+        self.sleep.assert_called_once_with(3.0)
+
+        retry_at = timezone.now() + timedelta(seconds=10)
+        self.assertAlmostEqual(gemini.parse_retry_after(http_date(retry_at.timestamp())), 10, delta=1.5)
+        self.assertIsNone(gemini.parse_retry_after('soon'))
+
+    def test_long_retry_after_and_client_errors_are_final(self):
+        self.post.side_effect = [gemini_response(429, headers={'Retry-After': '60'})]
+        with self.assertRaises(gemini.GeminiError) as raised:
+            self.client.generate_content('prompt')
+        self.assertEqual(raised.exception.status_code, 429)
+
+        self.post.side_effect = [gemini_response(400)]
+        with self.assertRaises(gemini.GeminiError):
+            self.client.generate_content('prompt')
+        self.sleep.assert_not_called()
+
+    def test_connection_errors_are_retried_up_to_max_retries(self):
+        self.post.side_effect = requests.ConnectionError('refused')
+        with self.assertRaises(gemini.GeminiError):
+            self.client.generate_content('prompt')
+        self.assertEqual(self.post.call_count, 4)
+
+    def test_read_timeouts_are_not_retried(self):
+        self.post.side_effect = requests.ReadTimeout('slow')
+        with self.assertRaisesMessage(gemini.GeminiError, 'timed out'):
+            self.client.generate_content('prompt')
+        self.assertEqual(self.post.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_attempts_share_one_deadline(self):
+        self.client.total_timeout = 5
+        self.post.side_effect = [gemini_response(503, headers={'Retry-After': '6'})]
+        with self.assertRaises(gemini.GeminiError):
+            self.client.generate_content('prompt')
+        self.sleep.assert_not_called()
+
+        self.post.side_effect = [gemini_response(200, {'ok': True})]
+        self.client.generate_content('prompt')
+        connect_timeout, read_timeout = self.post.call_args.kwargs['timeout']
+        self.assertLessEqual(read_timeout, 5)
+
+    def test_async_client_does_not_retry_read_timeouts(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(503)
+            raise httpx.ReadTimeout('slow', request=request)
+
+        async def call():
+            client = gemini.AsyncGeminiClient('key', 'https://gemini.test/model:generateContent', backoff_base=0)
+            client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            try:
+                await client.generate_content('prompt')
+            finally:
+                await client.aclose()
+
+        with self.assertRaisesMessage(gemini.GeminiError, 'timed out'):
+            asyncio.run(call())
+        self.assertEqual(len(calls), 2)
+
+
+ANALYSIS = {
+    'dominance': 20, 'influence': 15, 'steadiness': 25, 'compliance': 40, 'primaryType': 'C', 'confidence': 80,
+    'description': 'Careful and exact.', 'keyInsights': ['precise'], 'communicationStyle': 'Written',
+    'salesApproach': 'Bring data.', 'painPoints': ['vague claims'], 'idealPitch': 'A benchmark.',
+    'communicationDos': ['cite sources'], 'communicationDonts': ['rush'], 'bestApproach': 'Email first.',
+    'emailTemplate': {'subject': 'Benchmarks', 'body': 'Hi Ada'}, 'linkedinMessage': 'Hi Ada',
+    'followUpMessage': 'Following up',
+}
+
+
+def gemini_body(text, finish_reason='STOP'):
+    if not isinstance(text, str):
+        text = json.dumps(text)
+    return {'candidates': [{'content': {'parts': [{'text': text}]}, 'finishReason': finish_reason}]}
+
+
+@override_settings(ANALYSIS_CACHE_ENABLED=True, SINGLEFLIGHT_CROSS_PROCESS=False)
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        analysis_cache.clear()
+        self.addCleanup(analysis_cache.clear)
+
+    def test_analyze_profile_async_caches_the_analysis(self):
+        with mock.patch.object(gemini, 'agenerate_content', mock.AsyncMock(return_value=gemini_body(ANALYSIS))) as call:
+            first = self.client.post('/api/async/analyze-profile/', {'name': 'Ada'}, content_type='application/json')
+            second = self.client.post('/api/async/analyze-profile/', {'name': 'Ada'}, content_type='application/json')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['primaryType'], 'C')
+        self.assertEqual((first['X-Analysis-Cache'], second['X-Analysis-Cache']), ('miss', 'memory'))
+        self.assertEqual(call.await_count, 1)
+
+    def test_analyze_profile_async_rejects_bad_bodies(self):
+        self.assertEqual(self.client.post('/api/async/analyze-profile/', '[1]', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post('/api/async/analyze-profile/', {'headline': 'x'}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get('/api/async/analyze-profile/').status_code, 405)
+
+    def test_generate_message_async(self):
+        body = {'messageType': 'linkedin', 'query': 'Say hi', 'profileData': {'name': 'Ada'}}
+        with mock.patch.object(gemini, 'agenerate_content', mock.AsyncMock(return_value=gemini_body({'message': 'Hi Ada'}))):
+            response = self.client.post('/api/async/generate-message/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'message': 'Hi Ada'})
+        self.assertEqual(response['X-Request-Coalesced'], 'false')
+
+        body['messageType'] = 'fax'
+        self.assertEqual(self.client.post('/api/async/generate-message/', body, content_type='application/json').status_code, 400)
+
+
+@override_settings(SINGLEFLIGHT_CROSS_PROCESS=False)
+class AsyncSingleFlightTests(SimpleTestCase):
+
+    def test_async_calls_share_one_execution(self):
+        calls = []
+
+        async def afn():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 'result'
+
+        async def callers():
+            return await asyncio.gather(*(singleflight.ado('async-key', afn) for _ in range(3)))
+
+        results = asyncio.run(callers())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True])
+
+    def test_async_callers_join_a_sync_call(self):
+        calls = []
+
+        def fn():
+            calls.append('sync')
+            time.sleep(0.3)
+            return 'result'
+
+        async def afn():
+            calls.append('async')
+            return 'other'
+
+        leader = threading.Thread(target=singleflight.do, args=('mixed', fn))
+        leader.start()
+        time.sleep(0.05)
+
+        async def followers():
+            return await asyncio.gather(*(singleflight.ado('mixed', afn) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(followers()), [('result', True)] * 3)
+        leader.join()
+        self.assertEqual(calls, ['sync'])
+
+    def test_async_errors_reach_every_caller(self):
+        async def afn():
+            await asyncio.sleep(0.1)
+            raise ValueError('boom')
+
+        async def callers():
+            return await asyncio.gather(*(singleflight.ado('failing', afn) for _ in range(3)), return_exceptions=True)
+
+        self.assertEqual([str(error) for error in asyncio.run(callers())], ['boom'] * 3)
+
+
+def sse_events(body):
+    """
+    Decode an event stream into [(event, data), ...].
+    """
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@override_settings(SINGLEFLIGHT_CROSS_PROCESS=False)
+class MessageStreamTests(TestCase):
+    body = {'messageType': 'linkedin', 'query': 'Say hi', 'profileData': {'name': 'Ada'}}
+
+    def post_stream(self, **extra):
+        response = self.client.post('/api/generate-message/?stream=true', self.body, content_type='application/json', **extra)
+        return response, sse_events(b''.join(response.streaming_content).decode())
+
+    def test_chunks_then_the_parsed_result(self):
+        chunks = [gemini_body('{"message": "Hi'), gemini_body(' Ada"}', 'STOP')]
+        with mock.patch.object(gemini, 'stream_generate_content', return_value=iter(chunks)):
+            response, events = self.post_stream()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        self.assertEqual(events, [
+            ('chunk', {'text': '{"message": "Hi'}),
+            ('chunk', {'text': ' Ada"}'}),
+            ('result', {'message': 'Hi Ada'}),
+        ])
+
+    def test_a_failed_stream_ends_with_an_error_event(self):
+        def failing(prompt, generation_config=None):
+            yield gemini_body('{"mess')
+            raise gemini.GeminiError('Gemini API error: 503')
+
+        with mock.patch.object(gemini, 'stream_generate_content', failing), self.assertLogs('api.streaming', 'WARNING'):
+            _, events = self.post_stream()
+        self.assertEqual([event for event, _ in events], ['chunk', 'error'])
+        self.assertEqual(events[1][1]['message'], 'Gemini API error: 503')
+
+    def test_validation_errors_are_a_single_error_event(self):
+        response = self.client.post('/api/generate-message/', {'messageType': 'fax'}, content_type='application/json',
+                                    HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sse_events(response.content.decode())[0][0], 'error')
+
+    async def test_async_view_streams_the_same_events(self):
+        async def chunks(prompt, generation_config=None):
+            yield gemini_body('{"message": "Hi Ada"}', 'STOP')
+
+        with mock.patch.object(gemini, 'astream_generate_content', chunks):
+            response = await self.async_client.post(
+                '/api/async/generate-message/', {**self.body, 'stream': True}, content_type='application/json'
+            )
+            body = ''.join([part.decode() async for part in response.streaming_content])
+        self.assertEqual(sse_events(body), [('chunk', {'text': '{"message": "Hi Ada"}'}), ('result', {'message': 'Hi Ada'})])
+
+
+def fake_gemini(prompt, generation_config=None):
+    # Profiles named "Broken" get an analysis that fails validation.
+    return gemini_body({'primaryType': 'C'} if 'Broken' in prompt else ANALYSIS)
+
+
+async def afake_gemini(prompt, generation_config=None):
+    return fake_gemini(prompt, generation_config)
+
+
+@override_settings(ANALYSIS_CACHE_ENABLED=False, SINGLEFLIGHT_CROSS_PROCESS=False, ANALYZE_BATCH_CONCURRENCY=3)
+class BatchAnalyzeTests(TestCase):
+    profiles = [{'name': 'Ada'}, {'headline': 'no name'}, {'name': 'Broken'}, {'name': 'Grace'}]
+
+    def post(self, url, body):
+        return self.client.post(url, body, content_type='application/json')
+
+    def assert_batch_results(self, results):
+        self.assertEqual([(entry['index'], entry['status']) for entry in results],
+                         [(0, 'ok'), (1, 'error'), (2, 'error'), (3, 'ok')])
+        self.assertEqual(results[0]['result']['primaryType'], 'C')
+        self.assertEqual(results[0]['cache'], 'miss')
+        self.assertEqual(results[1]['error'], 'Invalid profile data')
+        self.assertEqual(results[2]['error'], 'Invalid analysis response from AI')
+
+    def test_results_come_back_in_input_order(self):
+        with mock.patch.object(gemini, 'generate_content', side_effect=fake_gemini) as call:
+            response = self.post('/api/analyze-profiles/batch/', {'profiles': self.profiles, 'concurrency': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assert_batch_results(response.json()['results'])
+        self.assertEqual(response.json()['summary'], {'total': 4, 'succeeded': 2, 'failed': 2, 'concurrency': 3})
+        self.assertEqual(call.call_count, 3)
+
+    def test_ndjson_streams_one_line_per_item(self):
+        with mock.patch.object(gemini, 'generate_content', side_effect=fake_gemini):
+            response = self.post('/api/analyze-profiles/batch/?stream=ndjson', self.profiles)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        results = [json.loads(line) for line in lines]
+        self.assertEqual(results[0]['index'], 1)  # invalid items are reported before any analysis
+        self.assert_batch_results(sorted(results, key=lambda entry: entry['index']))
+
+    @override_settings(ANALYZE_BATCH_MAX_ITEMS=3)
+    def test_batch_limits(self):
+        self.assertEqual(self.post('/api/analyze-profiles/batch/', {'profiles': self.profiles}).status_code, 400)
+        self.assertEqual(self.post('/api/analyze-profiles/batch/', {'profiles': []}).status_code, 400)
+
+    def test_async_batch(self):
+        with mock.patch.object(gemini, 'agenerate_content', side_effect=afake_gemini):
+            response = self.post('/api/async/analyze-profiles/batch/', {'profiles': self.profiles, 'concurrency': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assert_batch_results(response.json()['results'])
+        self.assertEqual(response.json()['summary']['concurrency'], 2)
+
+
+@override_settings(ANALYSIS_JOB_MODE='external', ANALYSIS_JOB_STALE_AFTER=600, ANALYSIS_JOB_MAX_ATTEMPTS=3)
+class AnalysisJobTests(TestCase):
+
+    def create_job(self, age=0, **fields):
+        job = AnalysisJob.objects.create(profile_data={'name': 'Ada'}, **fields)
+        if age:
+            AnalysisJob.objects.filter(id=job.id).update(created_at=timezone.now() - timedelta(seconds=age))
+        return job
+
+    def running_job(self, heartbeat_age, attempts=1):
+        return self.create_job(
+            status=AnalysisJob.STATUS_RUNNING, attempts=attempts,
+            started_at=timezone.now() - timedelta(hours=2),
+            heartbeat_at=timezone.now() - timedelta(seconds=heartbeat_age),
+        )
+
+    def test_a_job_is_claimed_once(self):
+        job = self.create_job()
+        self.assertTrue(jobs.claim(job.id))
+        self.assertFalse(jobs.claim(job.id))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_RUNNING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.heartbeat_at, job.started_at)
+
+    def test_claim_next_takes_the_oldest_pending_jobs(self):
+        newest = self.create_job()
+        oldest = self.create_job(age=300)
+        middle = self.create_job(age=200)
+        self.create_job(age=400, status=AnalysisJob.STATUS_SUCCEEDED)
+
+        self.assertEqual(jobs.claim_next(limit=2), [oldest.id, middle.id])
+        self.assertEqual(jobs.claim_next(limit=2, created_before=timezone.now() - timedelta(seconds=60)), [])
+        self.assertEqual(jobs.claim_next(limit=2), [newest.id])
+
+    def test_requeue_stale_goes_by_heartbeat(self):
+        retry = self.running_job(heartbeat_age=3600, attempts=1)
+        give_up = self.running_job(heartbeat_age=3600, attempts=3)
+        # Started two hours ago, but its worker is still beating: a long Gemini call, not a dead worker.
+        alive = self.running_job(heartbeat_age=30)
+
+        self.assertEqual(jobs.requeue_stale(), (1, 1))
+        statuses = dict(AnalysisJob.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[retry.id], AnalysisJob.STATUS_PENDING)
+        self.assertEqual(statuses[give_up.id], AnalysisJob.STATUS_FAILED)
+        self.assertEqual(statuses[alive.id], AnalysisJob.STATUS_RUNNING)
+
+    def test_beat_refreshes_running_jobs_only(self):
+        running = self.running_job(heartbeat_age=3600)
+        self.assertTrue(jobs.beat(running.id))
+        running.refresh_from_db()
+        self.assertGreater(running.heartbeat_at, timezone.now() - timedelta(seconds=60))
+        self.assertFalse(jobs.beat(self.create_job(status=AnalysisJob.STATUS_SUCCEEDED).id))
+
+    @override_settings(ANALYSIS_JOB_HEARTBEAT_INTERVAL=0.02)
+    def test_heartbeat_runs_while_the_job_does(self):
+        with mock.patch.object(jobs, 'beat', return_value=True) as beat, \
+                mock.patch.object(jobs.connections, 'close_all'):
+            with jobs._heartbeat('job'):
+                time.sleep(0.2)
+            calls = beat.call_count
+            time.sleep(0.1)
+        self.assertGreater(calls, 1)
+        self.assertEqual(beat.call_count, calls)
+
+    @override_settings(ANALYSIS_JOB_RECOVERY_INTERVAL=60, ANALYSIS_JOB_WORKERS=4)
+    def test_recover_runs_orphaned_jobs(self):
+        orphaned = self.create_job(age=3600)
+        stale = self.running_job(heartbeat_age=3600)
+        AnalysisJob.objects.filter(id=stale.id).update(created_at=timezone.now() - timedelta(hours=2))
+        fresh = self.create_job()
+
+        ran = []
+        with mock.patch.object(jobs, 'run_job', lambda job_id, already_claimed=False: ran.append((job_id, already_claimed))):
+            for future in jobs.recover():
+                future.result()
+        self.assertCountEqual(ran, [(orphaned.id, True), (stale.id, True)])
+        self.assertEqual(AnalysisJob.objects.get(id=fresh.id).status, AnalysisJob.STATUS_PENDING)
+
+        with mock.patch.object(jobs, 'run_job') as run_job:
+            self.assertEqual(jobs.recover(in_flight=range(4)), [])
+        run_job.assert_not_called()
+
+    def test_submit_with_a_cached_result_succeeds_immediately(self):
+        job = jobs.submit({'linkedin_url': 'https://www.linkedin.com/in/ada-lovelace'},
+                          cached_result={'primaryType': 'C'}, cache_status='memory')
+        self.assertEqual(job.status, AnalysisJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.profile_id, 'ada-lovelace')
+
+    def test_run_job_stores_the_result_or_the_error(self):
+        done, failed = self.create_job(), self.create_job()
+        with mock.patch.object(jobs.connections, 'close_all'), mock.patch.object(jobs, '_heartbeat'):
+            with mock.patch.object(jobs, 'get_profile_analysis', return_value=({'primaryType': 'C'}, 'miss')):
+                jobs.run_job(done.id)
+            with mock.patch.object(jobs, 'get_profile_analysis', side_effect=InvalidAnalysisResponse({'x': ['bad']})):
+                jobs.run_job(failed.id)
+
+        done.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual((done.status, done.result, done.cache_status), (AnalysisJob.STATUS_SUCCEEDED, {'primaryType': 'C'}, 'miss'))
+        self.assertEqual(failed.status, AnalysisJob.STATUS_FAILED)
+        self.assertEqual(failed.error['details'], {'x': ['bad']})
+
+
+def run_concurrently(count, target):
+    """
+    Call `target` from `count` threads released together; returns the results in thread order.
+    """
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@override_settings(SINGLEFLIGHT_CROSS_PROCESS=False)
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'value': 1}
+
+        results = run_concurrently(5, lambda: singleflight.do('same-key', fn))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], [{'value': 1}] * 5)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+
+    def test_finished_calls_are_not_reused(self):
+        self.assertEqual(singleflight.do('key', lambda: 1), (1, False))
+        self.assertEqual(singleflight.do('key', lambda: 2), (2, False))
+
+    def test_errors_reach_every_caller(self):
+        def fn():
+            time.sleep(0.2)
+            raise ValueError('boom')
+
+        def call():
+            try:
+                singleflight.do('failing', fn)
+            except ValueError as e:
+                return str(e)
+
+        self.assertEqual(run_concurrently(3, call), ['boom'] * 3)
+
+
+class SingleFlightHandoffTests(TransactionTestCase):
+
+    def setUp(self):
+        # File locks (SQLite) in a private directory.
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        settings_override = override_settings(SINGLEFLIGHT_LOCK_DIR=lock_dir, SINGLEFLIGHT_LOCK_TIMEOUT=5)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def hold_lock(self, key, result, delay=0.3):
+        """
+        Act as another worker: hold `key`'s lock for `delay` seconds, then hand off `result`.
+        """
+        def worker():
+            try:
+                with singleflight.cross_process_lock(key):
+                    time.sleep(delay)
+                    singleflight.publish_handoff(key, result)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.05)
+        return thread
+
+    def test_waiter_gets_the_handed_off_result(self):
+        calls = []
+        holder = self.hold_lock('message', {'text': 'from the other worker'})
+        result = singleflight.do('message', lambda: calls.append(1) or {'text': 'mine'}, handoff=True)
+        holder.join()
+        self.assertEqual(result, ({'text': 'from the other worker'}, True))
+        self.assertEqual(calls, [])
+
+        # A request after the shared call finished ("regenerate") runs its own.
+        result = singleflight.do('message', lambda: {'text': 'regenerated'}, handoff=True)
+        self.assertEqual(result, ({'text': 'regenerated'}, False))
+
+    def test_async_waiter_gets_the_handed_off_result(self):
+        holder = self.hold_lock('async-message', {'text': 'from the other worker'})
+
+        async def afn():
+            return {'text': 'mine'}
+
+        result = asyncio.run(singleflight.ado('async-message', afn, handoff=True))
+        holder.join()
+        self.assertEqual(result, ({'text': 'from the other worker'}, True))
+
+    def test_waiter_checks_lookup_first(self):
+        holder = self.hold_lock('analysis', {'ignored': True})
+        result = singleflight.do('analysis', lambda: {'fresh': True}, lookup=lambda: {'cached': True})
+        holder.join()
+        self.assertEqual(result, ({'cached': True}, True))
+
+    def test_handoff_rows_expire(self):
+        with override_settings(SINGLEFLIGHT_RESULT_TTL=30):
+            singleflight.publish_handoff('old', {'v': 1})
+            SingleFlightResult.objects.update(finished_at=timezone.now() - timedelta(minutes=5))
+            singleflight.publish_handoff('new', {'v': 2})
+        self.assertEqual(SingleFlightResult.objects.count(), 1)
+        self.assertIsNone(singleflight.read_handoff('new', since=timezone.now() + timedelta(seconds=1)))
+
+
+class ProfileCompactorTests(SimpleTestCase):
+    profile = {
+        'name': 'Ada',
+        'topSkills': 'Math',
+        'skills': 'Python, python, Math, ' + ', '.join(f'skill{i}' for i in range(400)),
+        'about': 'word ' * 2000,
+        'experience': 'role ' * 1000,
+        'education': 'school ' * 300,
+        'posts': [
+            {'text': f'post{i} ' + 'x' * 1500, 'time': '1d', 'reactions': str(i), 'comments': '0'}
+            for i in range(8)
+        ],
+    }
+
+    def build(self, budget):
+        with override_settings(PROMPT_INPUT_TOKEN_BUDGET=budget, PROMPT_MAX_POSTS=5, PROMPT_MAX_POST_CHARS=1000):
+            return prompts.build_analysis_prompt(self.profile)
+
+    def test_helpers(self):
+        self.assertEqual(prompts.truncate_text('alpha beta gamma delta', 20), 'alpha beta gamma …')
+        self.assertEqual(prompts.truncate_text('alpha beta gamma delta', 20, min_chars=19), 'alpha beta gamma d …')
+        self.assertEqual(prompts.truncate_text('short', 12), 'short')
+        self.assertEqual(prompts.dedupe_skills('Python; python | SQL, Math', 'math'), ('Python, SQL', 2))
+        self.assertEqual(prompts.post_engagement({'reactions': '1.2K', 'comments': '1,005'}), 2205)
+
+    def test_normalize_keeps_the_most_engaged_posts(self):
+        compactor = prompts.ProfileCompactor(self.profile, budget_tokens=10 ** 6, max_posts=3, max_post_chars=100)
+        compactor.normalize()
+        self.assertEqual([post['text'].split()[0] for post in compactor.posts], ['post5', 'post6', 'post7'])
+        self.assertTrue(all(len(post['text']) <= 100 for post in compactor.posts))
+        self.assertEqual([entry['action'] for entry in compactor.dropped], [
+            'removed 2 duplicate skills', 'kept the 3 most-engaged of 8 posts', 'truncated posts to 100 characters',
+        ])
+
+    def test_sections_are_trimmed_least_useful_first(self):
+        report = self.build(6500).report
+        self.assertLessEqual(report['estimatedTokens'], 6500)
+        self.assertFalse(report['overBudget'])
+        # The budget is met before posts, experience or about are touched.
+        trimmed = [entry['section'] for entry in report['dropped'][3:]]
+        self.assertEqual(trimmed, ['skills', 'education'])
+
+    def test_sections_stop_at_their_floors(self):
+        prompt = self.build(500)
+        self.assertTrue(prompt.report['overBudget'])
+        self.assertEqual(
+            list(dict.fromkeys(entry['section'] for entry in prompt.report['dropped'][3:])),
+            ['skills', 'education', 'posts', 'experience', 'about'],
+        )
+        self.assertIn('post7', prompt.text)
+        self.assertNotIn('post6', prompt.text)
+        floors = dict(prompts.TRIM_ORDER)
+        for entry in prompt.report['dropped']:
+            if entry['action'].startswith('truncated to '):
+                self.assertGreaterEqual(int(entry['action'].split()[2]), floors[entry['section']])
+
+    def test_small_profiles_are_left_alone(self):
+        with override_settings(PROMPT_INPUT_TOKEN_BUDGET=6000):
+            prompt = prompts.build_analysis_prompt({'name': 'Ada', 'about': 'Mathematician'})
+        self.assertEqual(prompt.report['dropped'], [])
+        self.assertIn('Mathematician', prompt.text)
+
+
+class ResponseSchemaTests(SimpleTestCase):
+
+    def assert_schema_matches(self, schema, serializer):
+        fields = serializer.fields
+        self.assertEqual(schema['type'], 'OBJECT')
+        self.assertEqual(list(schema['properties']), list(fields))
+        self.assertEqual(schema['propertyOrdering'], list(fields))
+        for name, field in fields.items():
+            prop = schema['properties'][name]
+            if isinstance(field, serializers.Serializer):
+                self.assert_schema_matches(prop, field)
+            elif isinstance(field, serializers.ListField):
+                self.assertEqual(prop, {'type': 'ARRAY', 'items': {'type': 'STRING'}})
+            elif isinstance(field, serializers.IntegerField):
+                self.assertEqual(prop['type'], 'INTEGER')
+            else:
+                self.assertEqual(prop['type'], 'STRING')
+
+    def test_analysis_schema_requires_every_field(self):
+        schema = schemas.analysis_response_schema()
+        self.assert_schema_matches(schema, AnalysisResponseSerializer())
+        self.assertEqual(schema['required'], list(AnalysisResponseSerializer().fields))
+        self.assertIn('emailTemplate', schema['required'])
+        self.assertEqual(schema['properties']['emailTemplate']['required'], ['subject', 'body'])
+
+        # Output shaped by the schema validates against the serializer.
+        self.assertEqual(set(ANALYSIS), set(schema['required']))
+        self.assertTrue(AnalysisResponseSerializer(data=ANALYSIS).is_valid())
+
+    def test_message_schemas(self):
+        for message_type, serializer_class in schemas.MESSAGE_RESPONSE_SERIALIZERS.items():
+            schema = schemas.message_response_schema(message_type)
+            self.assert_schema_matches(schema, serializer_class())
+            self.assertEqual(schema['required'], [name for name, field in serializer_class().fields.items() if field.required])
+
+    def test_prompts_request_the_schema(self):
+        config = prompts.build_message_prompt('email', 'Say hi', {'name': 'Ada'}).generation_config
+        self.assertEqual(config['responseMimeType'], 'application/json')
+        self.assertEqual(config['responseSchema'], schemas.message_response_schema('email'))
+        with override_settings(GEMINI_STRUCTURED_OUTPUT=False):
+            self.assertIsNone(prompts.build_analysis_prompt({'name': 'Ada'}).generation_config)
+
+
+class LLMJSONTests(SimpleTestCase):
+
+    def test_object_is_found_in_prose_and_code_fences(self):
+        text = 'Sure!\n```json\n{"name": "Ada", "note": "braces } inside"}\n```\nAnything else?'
+        self.assertEqual(extract_json_object(text), {'name': 'Ada', 'note': 'braces } inside'})
+        self.assertEqual(extract_json_object('see {not json} then {"ok": true}'), {'ok': True})
+
+    def test_cut_string_is_closed_and_reported(self):
+        result = extract_json_object('{"name": "Ada", "insights": ["one", "tw')
+        self.assertIsInstance(result, PartialJSON)
+        self.assertEqual(result, {'name': 'Ada', 'insights': ['one', 'tw']})
+        self.assertEqual(result.truncated_fields, ['insights[1]'])
+        self.assertEqual(result.lost_fields, [])
+
+    def test_incomplete_values_are_dropped_and_reported(self):
+        result = extract_json_object('{"name": "Ada", "confidence": 7')
+        self.assertEqual(result, {'name': 'Ada'})
+        self.assertEqual(result.lost_fields, ['confidence'])
+
+        result = extract_json_object('{"text": "ab\\u00')
+        self.assertEqual(result, {'text': 'ab'})
+        self.assertEqual(result.truncated_fields, ['text'])
+
+    def test_nothing_to_salvage(self):
+        with self.assertRaises(ValueError):
+            extract_json_object('no object here')
+        with self.assertRaises(ValueError):
+            extract_json_object('{"nested": {"value": 1')
+
+    def test_finalize_stores_the_report_in_the_payload(self):
+        self.assertIs(finalize(ANALYSIS, AnalysisResponseSerializer), ANALYSIS)
+
+        result = finalize(extract_json_object(json.dumps(ANALYSIS)[:-5]), AnalysisResponseSerializer)
+        self.assertIs(type(result), dict)
+        self.assertEqual(result[PARTIAL_KEY], {'truncated': ['followUpMessage'], 'lost': []})
+
+        with self.assertRaises(IncompleteJSON) as raised:
+            finalize(PartialJSON({'dominance': 20}, lost_fields=['influence']), AnalysisResponseSerializer)
+        self.assertEqual(raised.exception.report['lost'][:3], ['influence', 'steadiness', 'compliance'])
+
+
+def truncated_analysis(before_field):
+    # Gemini output cut off in the middle of `before_field`'s key.
+    text = json.dumps(ANALYSIS)
+    return gemini_body(text[:text.index(f'"{before_field}"') + 3], 'MAX_TOKENS')
+
+
+@override_settings(ANALYSIS_CACHE_ENABLED=True, SINGLEFLIGHT_CROSS_PROCESS=False, SINGLEFLIGHT_RESULT_TTL=30)
+class PartialAnalysisTests(TestCase):
+
+    def setUp(self):
+        analysis_cache.clear()
+        self.addCleanup(analysis_cache.clear)
+
+    def analyze(self, body, url='/api/analyze-profile/'):
+        patch = mock.patch.object(gemini, 'generate_content', return_value=body)
+        if url.startswith('/api/async/'):
+            patch = mock.patch.object(gemini, 'agenerate_content', mock.AsyncMock(return_value=body))
+        with patch, self.assertLogs('api.gemini', 'WARNING'):
+            return self.client.post(url, {'name': 'Ada'}, content_type='application/json')
+
+    def test_a_salvaged_analysis_is_served_degraded_and_cached_briefly(self):
+        with mock.patch.object(analysis_cache, 'store', wraps=analysis_cache.store) as store:
+            response = self.analyze(truncated_analysis('linkedinMessage'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[PARTIAL_KEY], {'truncated': [], 'lost': ['linkedinMessage', 'followUpMessage']})
+        self.assertEqual(response['X-Lost-Fields'], 'linkedinMessage, followUpMessage')
+        self.assertEqual(store.call_args.kwargs['ttl'], 30)
+
+        with mock.patch.object(gemini, 'generate_content') as call:
+            cached = self.client.post('/api/analyze-profile/', {'name': 'Ada'}, content_type='application/json')
+        call.assert_not_called()
+        self.assertEqual(cached['X-Analysis-Cache'], 'memory')
+        self.assertEqual(cached.json()[PARTIAL_KEY], response.json()[PARTIAL_KEY])
+        self.assertEqual(cached['X-Lost-Fields'], response['X-Lost-Fields'])
+
+    def test_lost_required_fields_are_a_client_error(self):
+        for url in ('/api/analyze-profile/', '/api/async/analyze-profile/'):
+            response = self.analyze(truncated_analysis('description'), url)
+            self.assertEqual(response.status_code, 422)
+            self.assertEqual(response.json()['error'], 'Analysis response from AI was truncated')
+            self.assertIn('description', response.json()['lostFields'])
+        self.assertFalse(AnalysisCacheEntry.objects.exists())
+
+
+ADA_URL = 'https://www.linkedin.com/in/ada-lovelace'
+
+
+def save_payload(**extra):
+    payload = {
+        'name': 'Ada Lovelace',
+        'linkedin_url': ADA_URL,
+        'headline': 'Analyst',
+        'primaryType': 'C',
+        'keyInsights': ['precise', 'curious'],
+        'communicationStyle': 'Written',
+    }
+    payload.update(extra)
+    return payload
+
+
+def save_item(payload):
+    item, error = profile_store.prepare_save_item(None, payload)
+    assert error is None, error
+    return item
+
+
+class SaveProfileTests(TestCase):
+
+    def test_save_profile_creates_then_skips_unchanged_saves(self):
+        profile, created, changed = profile_store.save_profile(save_item(save_payload()))
+        self.assertTrue(created)
+        self.assertTrue(changed)
+        self.assertEqual(profile.profile_id, 'ada-lovelace')
+        self.assertEqual(profile.key_insights_count, 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            profile, created, changed = profile_store.save_profile(save_item(save_payload()))
+        self.assertFalse(created)
+        self.assertFalse(changed)
+        self.assertEqual([query['sql'].split()[0] for query in queries if 'SAVEPOINT' not in query['sql']], ['SELECT'])
+
+    def test_save_profile_only_changes_sent_fields(self):
+        profile_store.save_profile(save_item(save_payload(rawProfileData={'about': 'Mathematician'})))
+        profile, created, changed = profile_store.save_profile(
+            save_item({'name': 'Ada King', 'linkedin_url': ADA_URL, 'keyInsights': ['precise']})
+        )
+        self.assertFalse(created)
+        self.assertTrue(changed)
+
+        profile = AnalyzedProfile.objects.get(profile_id='ada-lovelace')
+        self.assertEqual(profile.name, 'Ada King')
+        self.assertEqual(profile.key_insights_count, 1)
+        self.assertEqual(profile.headline, 'Analyst')
+        self.assertEqual(profile.communication_style, 'Written')
+        self.assertEqual(profile.raw_data_ref.about, 'Mathematician')
+
+    def test_a_concurrent_delete_does_not_fail_the_save(self):
+        profile_store.save_profile(save_item(save_payload()))
+        save_many = profile_store.blobs.save_many
+
+        def delete_then_save(pending):
+            AnalyzedProfile.objects.filter(profile_id='ada-lovelace').delete()
+            return save_many(pending)
+
+        with mock.patch.object(profile_store.blobs, 'save_many', side_effect=delete_then_save):
+            profile, created, changed = profile_store.save_profile(save_item(save_payload(headline='Countess')))
+        self.assertTrue(created)
+        self.assertEqual(AnalyzedProfile.objects.get().headline, 'Countess')
+
+    def test_save_endpoint_reports_created_and_unchanged(self):
+        first = self.client.post('/api/save-analyzed-data/', save_payload(), content_type='application/json')
+        second = self.client.post('/api/save-analyzed-data/', save_payload(), content_type='application/json')
+        self.assertEqual((first.status_code, second.status_code), (201, 200))
+        self.assertEqual(second.json()['message'], 'Profile unchanged')
+
+
+class BulkSaveTests(TestCase):
+
+    def test_bulk_save_reports_each_item(self):
+        results = profile_store.bulk_save([
+            save_payload(),
+            {'linkedin_url': ADA_URL},
+            {'name': 'Nobody', 'linkedin_url': 'not a profile url'},
+            save_payload(name='Ada King'),
+        ])
+        self.assertEqual(
+            [(entry['index'], entry['status']) for entry in results],
+            [(0, 'skipped'), (1, 'error'), (2, 'error'), (3, 'created')],
+        )
+        self.assertEqual(AnalyzedProfile.objects.get().name, 'Ada King')
+
+        results = profile_store.bulk_save([save_payload(name='Ada King'), save_payload(name='Ada', headline='Countess')])
+        self.assertEqual([entry['status'] for entry in results], ['skipped', 'updated'])
+        self.assertEqual(AnalyzedProfile.objects.get().headline, 'Countess')
+        results = profile_store.bulk_save([save_payload(name='Ada', headline='Countess')])
+        self.assertEqual(results[0]['status'], 'unchanged')
+
+    def test_changed_raw_profile_data_counts_as_an_update(self):
+        profile_store.bulk_save([save_payload(rawProfileData={'about': 'Mathematician'})])
+        results = profile_store.bulk_save([save_payload(rawProfileData={'about': 'Countess'})])
+        self.assertEqual(results[0]['status'], 'updated')
+        self.assertEqual(RawData.objects.get(profile_id='ada-lovelace').about, 'Countess')
+
+    def test_bulk_insert_conflict_keeps_fields_not_sent(self):
+        profile_store.bulk_save([save_payload()])
+        # As if a concurrent save inserted the row after this batch looked for it.
+        with mock.patch.object(AnalyzedProfile.objects, 'in_bulk', return_value={}):
+            profile_store.bulk_save([{'name': 'Ada King', 'linkedin_url': ADA_URL}])
+
+        profile = AnalyzedProfile.objects.get()
+        self.assertEqual(profile.name, 'Ada King')
+        self.assertEqual(profile.headline, 'Analyst')
+        self.assertEqual(profile.key_insights, ['precise', 'curious'])
+        self.assertEqual(profile.key_insights_count, 2)
+
+    def test_batch_endpoint_summarises_statuses(self):
+        response = self.client.post(
+            '/api/save-analyzed-data/batch/',
+            {'profiles': [save_payload(), {'name': 'No URL'}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary'],
+                         {'total': 2, 'created': 1, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'failed': 1})
+        self.assertEqual(self.client.post('/api/save-analyzed-data/batch/', {'profiles': []},
+                                          content_type='application/json').status_code, 400)
+
+
+class BlobTests(TestCase):
+
+    def setUp(self):
+        # Start from a cold decoded-payload cache, so loads hit the database.
+        blobs._cache = blobs._DecodedCache(512)
+
+    def test_delete_unreferenced_keeps_referenced_and_recent_blobs(self):
+        profile_store.save_profile(save_item(save_payload(rawProfileData={'about': 'Mathematician'})))
+        orphan = blobs.PendingBlob({'orphan': True})
+        blobs.save_many([orphan])
+
+        self.assertEqual(blobs.delete_unreferenced(), 0)
+        JSONBlob.objects.update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(blobs.delete_unreferenced(), 1)
+        self.assertFalse(JSONBlob.objects.filter(hash=orphan.hash).exists())
+        self.assertEqual(AnalyzedProfile.objects.get().raw_data['rawProfileData'], {'about': 'Mathematician'})
+
+    def test_reusing_a_blob_refreshes_its_age(self):
+        blobs.save_many([blobs.PendingBlob({'shared': True})])
+        JSONBlob.objects.update(created_at=timezone.now() - timedelta(days=1))
+        blobs.save_many([blobs.PendingBlob({'shared': True})])
+
+        self.assertEqual(blobs.delete_unreferenced(), 0)
+
+    def test_raw_profile_data_is_stored_once_and_round_trips(self):
+        raw_profile_data = {'about': 'Mathematician', 'skills': 'Analysis', 'extra': {'$blob': 'not a reference'}}
+        payload = save_payload(rawProfileData=raw_profile_data)
+        profile, _, _ = profile_store.save_profile(save_item(payload))
+
+        raw = RawData.objects.get(profile_id='ada-lovelace')
+        self.assertEqual(raw.about, 'Mathematician')
+        self.assertEqual(raw.raw_data, raw_profile_data)
+        self.assertEqual(profile.raw_profile_blob_id, raw.raw_data_blob_id)
+        self.assertNotIn('rawProfileData', blobs.load(profile.raw_data_blob_id))
+        self.assertEqual(AnalyzedProfile.objects.get().raw_data, payload)
+
+    def test_with_blobs_decodes_joined_rows(self):
+        for name in ('ada-lovelace', 'grace-hopper'):
+            profile_store.save_profile(save_item(save_payload(
+                linkedin_url=f'https://www.linkedin.com/in/{name}', rawProfileData={'about': name},
+            )))
+        blobs._cache = blobs._DecodedCache(512)
+
+        with self.assertNumQueries(1):
+            payloads = [profile.raw_data for profile in AnalyzedProfile.objects.with_blobs().order_by('profile_id')]
+        self.assertEqual([payload['rawProfileData'] for payload in payloads], [{'about': 'ada-lovelace'}, {'about': 'grace-hopper'}])
+
+    def test_admin_edits_raw_data_through_the_blob_store(self):
+        profile_store.save_profile(save_item(save_payload(rawProfileData={'about': 'Mathematician'})))
+        raw = RawData.objects.get()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        page = self.client.get(f'/admin/api/analyzedprofile/{AnalyzedProfile.objects.get().pk}/change/')
+        self.assertContains(page, 'Mathematician')
+
+        response = self.client.post(f'/admin/api/rawdata/{raw.pk}/change/', {
+            'profile_id': raw.profile_id, 'name': raw.name, 'posts': '[]',
+            'raw_data': json.dumps({'about': 'Countess'}),
+        })
+        self.assertEqual(response.status_code, 302)
+        raw.refresh_from_db()
+        self.assertEqual(raw.raw_data, {'about': 'Countess'})
+        self.assertIsNone(raw.content_hash)
+        self.assertTrue(JSONBlob.objects.filter(hash=raw.raw_data_blob_id).exists())
+
+
+class DataMigrationTests(TransactionTestCase):
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('api', target)])
+        return executor.loader.project_state([('api', target)]).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('api')[0][1])
+        blobs._cache = blobs._DecodedCache(512)
+        super().tearDown()
+
+    def test_raw_data_moves_to_shared_blobs(self):
+        apps = self.migrate('0008_analyzedprofile_content_hash_rawdata_content_hash')
+        raw_profile_data = {'about': 'Mathematician', 'skills': 'Analysis'}
+        payload = {'name': 'Ada Lovelace', 'rawProfileData': raw_profile_data}
+        apps.get_model('api', 'RawData').objects.create(name='Ada Lovelace', profile_id='ada', raw_data=raw_profile_data)
+        apps.get_model('api', 'AnalyzedProfile').objects.create(name='Ada Lovelace', profile_id='ada', raw_data=payload)
+        apps.get_model('api', 'AnalyzedProfile').objects.create(name='No Raw Data', profile_id='none', raw_data={})
+
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('api')[0][1])
+
+        raw = RawData.objects.get(profile_id='ada')
+        profile = AnalyzedProfile.objects.get(profile_id='ada')
+        self.assertEqual(raw.raw_data, raw_profile_data)
+        self.assertEqual(profile.raw_data, payload)
+        self.assertEqual(profile.raw_profile_blob_id, raw.raw_data_blob_id)
+        self.assertEqual(AnalyzedProfile.objects.get(profile_id='none').raw_data, {})
+
+    def test_search_index_is_keyed_on_search_id(self):
+        if search.backend(RawData, 'default') != 'fts5':
+            self.skipTest('No FTS5 index on this database')
+        apps = self.migrate('0017_analysisjob_heartbeat_at')
+        apps.get_model('api', 'RawData').objects.create(name='Ada Lovelace', profile_id='ada')
+
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('api')[0][1])
+
+        ada = RawData.objects.get()
+        self.assertIsNotNone(ada.search_id)
+        self.assertEqual(list(search.matching(RawData.objects.all(), 'lovelace')), [ada])
+        alan = RawData.objects.create(name='Alan Turing', profile_id='alan')
+        self.assertEqual(list(search.matching(RawData.objects.all(), 'turing')), [alan])
+
+    def test_summary_fields_are_backfilled(self):
+        apps = self.migrate('0010_analyzedprofile_analyzed_profile_lookup_idx')
+        apps.get_model('api', 'AnalyzedProfile').objects.create(
+            name='Ada Lovelace', profile_id='ada', key_insights=['a', 'b', 'c'], pain_points=[],
+            communication_dos=['x'], communication_donts={'not': 'a list'}, communication_style='Written', sales_approach='',
+        )
+
+        apps = self.migrate('0011_analyzedprofile_communication_donts_count_and_more')
+
+        values = apps.get_model('api', 'AnalyzedProfile').objects.values(
+            'key_insights_count', 'pain_points_count', 'communication_dos_count', 'communication_donts_count',
+            'has_communication_style', 'has_sales_approach',
+        ).get()
+        self.assertEqual(values, {
+            'key_insights_count': 3, 'pain_points_count': 0, 'communication_dos_count': 1,
+            'communication_donts_count': 0, 'has_communication_style': True, 'has_sales_approach': False,
+        })
+
+
+class SparseFieldsTests(TestCase):
+
+    def setUp(self):
+        profile_store.save_profile(save_item(save_payload(rawProfileData={'about': 'Mathematician', 'posts': [{'text': 'hi'}]})))
+
+    def test_fields_limit_the_response_and_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/get-analyzed-data/ada-lovelace/?fields=name,disc_primary')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {'name': 'Ada Lovelace', 'disc_primary': 'C'})
+        profile_query = queries[-1]['sql']
+        self.assertIn('"disc_primary"', profile_query)
+        self.assertNotIn('"communication_style"', profile_query)
+        self.assertNotIn('json_blobs', profile_query)
+
+    def test_exclude_drops_heavy_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/get-raw-data/ada-lovelace/?exclude=raw_data,posts')
+        data = response.json()['data']
+        self.assertEqual(data['about'], 'Mathematician')
+        self.assertNotIn('raw_data', data)
+        self.assertNotIn('posts', data)
+        self.assertNotIn('"posts"', queries[-1]['sql'])
+
+    def test_raw_data_can_be_selected(self):
+        response = self.client.get('/api/get-analyzed-data/ada-lovelace/?fields=name,raw_data')
+        self.assertEqual(response.json()['data']['raw_data']['rawProfileData']['about'], 'Mathematician')
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/get-analyzed-data/ada-lovelace/?fields=name,shoe_size')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('shoe_size', response.json()['message'])
+
+    def test_trim_applies_a_fieldset_to_cached_data(self):
+        data = {'name': 'Ada', 'headline': 'Analyst', 'raw_data': {}}
+        self.assertEqual(AnalyzedProfileModelSerializer.trim(data, ['name', 'raw_data'], ['raw_data']), {'name': 'Ada'})
+        self.assertEqual(AnalyzedProfileModelSerializer.model_columns(['raw_data']), ['raw_data_blob', 'raw_profile_blob'])
+
+
+class ConditionalLookupTests(TestCase):
+    url = '/api/get-analyzed-data/ada-lovelace/'
+
+    def setUp(self):
+        profile_store.save_profile(save_item(save_payload(rawProfileData={'about': 'Mathematician'})))
+
+    def test_responses_carry_validators(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(response['Last-Modified'], http_date(AnalyzedProfile.objects.get().updated_at.timestamp()))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_matching_validators_get_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        future = http_date(time.time() + 3600)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=future).status_code, 304)
+        self.assertEqual(self.client.get('/api/profile/ada-lovelace/', HTTP_IF_MODIFIED_SINCE=future).status_code, 304)
+
+    def test_changes_and_fieldsets_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertNotEqual(self.client.get(self.url + '?fields=name')['ETag'], etag)
+
+        profile_store.save_profile(save_item(save_payload(headline='Countess', rawProfileData={'about': 'Mathematician'})))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['headline'], 'Countess')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(PROFILE_CACHE_ENABLED=True)
+class ProfileCacheTests(TestCase):
+
+    def setUp(self):
+        caches[profile_cache.CACHE_ALIAS].clear()
+        self.addCleanup(caches[profile_cache.CACHE_ALIAS].clear)
+
+    def get_profile(self, **headers):
+        return self.client.get('/api/get-analyzed-data/ada-lovelace/', **headers)
+
+    def test_lookups_are_cached_and_invalidated_by_saves(self):
+        self.assertEqual(self.get_profile().status_code, 404)
+        self.assertEqual(profile_cache.get(profile_cache.RESOURCE_ANALYZED, 'ada-lovelace'), profile_cache.MISSING)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/save-analyzed-data/', save_payload(), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(profile_cache.get(profile_cache.RESOURCE_ANALYZED, 'ada-lovelace'))
+
+        self.assertEqual(self.get_profile().json()['data']['name'], 'Ada Lovelace')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_profile().json()['data']['name'], 'Ada Lovelace')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/save-analyzed-data/', save_payload(name='Ada King'), content_type='application/json')
+        self.assertEqual(self.get_profile().json()['data']['name'], 'Ada King')
+
+    def test_bulk_saves_and_model_saves_invalidate(self):
+        profile_store.bulk_save([save_payload()])
+        self.get_profile()
+        self.assertIsNotNone(profile_cache.get(profile_cache.RESOURCE_ANALYZED, 'ada-lovelace'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile_store.bulk_save([save_payload(name='Ada King')])
+        self.assertIsNone(profile_cache.get(profile_cache.RESOURCE_ANALYZED, 'ada-lovelace'))
+        self.assertEqual(self.get_profile().json()['data']['name'], 'Ada King')
+
+        profile = AnalyzedProfile.objects.get()
+        profile.name = 'Countess of Lovelace'
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertEqual(self.get_profile().json()['data']['name'], 'Countess of Lovelace')
+
+    def test_a_miss_answers_304_without_loading_the_row(self):
+        profile_store.save_profile(save_item(save_payload()))
+        etag = self.get_profile()['ETag']
+        caches[profile_cache.CACHE_ALIAS].clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_profile(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"name"', queries[0]['sql'])
+        self.assertIsNone(profile_cache.get(profile_cache.RESOURCE_ANALYZED, 'ada-lovelace'))
+
+    @override_settings(PROFILE_CACHE_ENABLED=False)
+    def test_disabled_cache_is_bypassed(self):
+        profile_store.bulk_save([save_payload()])
+        self.get_profile()
+        self.assertIsNone(profile_cache.get(profile_cache.RESOURCE_ANALYZED, 'ada-lovelace'))
+
+
+class ProfileBundleTests(TestCase):
+    url = '/api/profile/ada-lovelace/'
+
+    def setUp(self):
+        profile_store.save_profile(save_item(save_payload(rawProfileData={'about': 'Mathematician'})))
+        # Cold decoded-payload cache: every blob has to come from the database.
+        blobs._cache = blobs._DecodedCache(512)
+        self.addCleanup(setattr, blobs, '_cache', blobs._DecodedCache(512))
+
+    def test_bundle_is_one_query_with_the_blobs(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        data = response.json()['data']
+        self.assertEqual(data['analyzed']['raw_data']['rawProfileData'], {'about': 'Mathematician'})
+        self.assertEqual(data['raw']['raw_data'], {'about': 'Mathematician'})
+
+    def test_sparse_bundle_joins_blobs_only_when_raw_data_is_requested(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url + '?fields=name,raw_data')
+        self.assertEqual(response.json()['data']['raw'], {'name': 'Ada Lovelace', 'raw_data': {'about': 'Mathematician'}})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + '?exclude=raw_data,posts')
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('json_blobs', queries[0]['sql'])
+        self.assertNotIn('raw_data', response.json()['data']['analyzed'])
+
+    def test_raw_data_without_an_analysis(self):
+        AnalyzedProfile.objects.filter(profile_id='ada-lovelace').delete()
+        response = self.client.get(self.url)
+        self.assertIsNone(response.json()['data']['analyzed'])
+        self.assertEqual(response.json()['data']['raw']['about'], 'Mathematician')
+        self.assertEqual(self.client.get('/api/profile/nobody/').status_code, 404)
+
+
+class BulkLookupTests(TestCase):
+    url = '/api/profiles/lookup/'
+
+    def post(self, body):
+        return self.client.post(self.url, body, content_type='application/json')
+
+    def test_lookup_normalizes_and_reports_each_reference(self):
+        profile_store.bulk_save([save_payload(dominance=20)])
+        with self.assertNumQueries(1):
+            response = self.post({'profiles': [ADA_URL + '/', 'ada-lovelace', 'grace-hopper', 'not a profile', 7]})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(list(body['profiles']), ['ada-lovelace'])
+        self.assertEqual(body['profiles']['ada-lovelace']['disc_primary'], 'C')
+        self.assertEqual(body['profiles']['ada-lovelace']['dominance'], 20)
+        self.assertNotIn('name', body['profiles']['ada-lovelace'])
+        self.assertEqual(body['not_found'], ['grace-hopper'])
+        self.assertEqual(body['invalid'], ['not a profile', 7])
+
+    def test_lookup_probes_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Checks a SQLite query plan')
+        with CaptureQueriesContext(connection) as queries:
+            self.post(['ada-lovelace', 'grace-hopper'])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertRegex(plan, r'SEARCH analyzed_profiles USING (COVERING )?INDEX \w+ \(profile_id=\?')
+
+    @override_settings(PROFILE_LOOKUP_MAX_ITEMS=2)
+    def test_lookup_limits(self):
+        self.assertEqual(self.post({'profiles': ['a', 'b', 'c']}).status_code, 400)
+        self.assertEqual(self.post({'profiles': []}).status_code, 400)
+        self.assertEqual(self.post({'profiles': 'ada-lovelace'}).status_code, 400)
+
+
+@override_settings(ESTIMATED_COUNT_THRESHOLD=1000)
+class EstimatedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        profile_store.bulk_save([save_payload(), save_payload(linkedin_url='https://www.linkedin.com/in/grace-hopper')])
+
+    def test_exact_count_below_the_threshold_or_without_an_estimate(self):
+        self.assertIsNone(pagination.estimate_count(AnalyzedProfile.objects.all()))
+        for estimate in (None, 999):
+            with mock.patch.object(pagination, 'estimate_count', return_value=estimate):
+                self.assertEqual(pagination.EstimatedCountPaginator(AnalyzedProfile.objects.all(), 50).count, 2)
+
+    def test_large_estimates_replace_count(self):
+        with mock.patch.object(pagination, 'estimate_count', return_value=250000), self.assertNumQueries(0):
+            paginator = pagination.EstimatedCountPaginator(AnalyzedProfile.objects.all(), 50)
+            self.assertEqual(paginator.count, 250000)
+            self.assertEqual(paginator.num_pages, 5000)
+
+    def test_changelist_skips_the_heavy_columns_and_the_full_count(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/api/analyzedprofile/?disc_primary=C')
+        self.assertContains(response, 'Ada Lovelace')
+        counts = [query['sql'] for query in queries if 'COUNT(' in query['sql'] and 'analyzed_profiles' in query['sql']]
+        self.assertEqual(len(counts), 1)  # the paginator's; show_full_result_count is off
+        page_query = next(query['sql'] for query in queries if query['sql'].startswith('SELECT "analyzed_profiles"."id"'))
+        self.assertNotIn('"key_insights"', page_query)
+        self.assertNotIn('"raw_data"."about"', page_query)
+
+        with mock.patch.object(pagination, 'estimate_count', return_value=250000):
+            response = self.client.get('/admin/api/analyzedprofile/')
+        self.assertContains(response, '250000')
+
+
+class SummaryFieldTests(TestCase):
+
+    def test_counts_follow_the_saved_lists(self):
+        profile, _, _ = profile_store.save_profile(save_item(save_payload(
+            painPoints=[], communicationDos=['cite sources', 'be brief'], salesApproach='',
+        )))
+        self.assertEqual(
+            (profile.key_insights_count, profile.pain_points_count, profile.communication_dos_count,
+             profile.communication_donts_count, profile.has_communication_style, profile.has_sales_approach),
+            (2, 0, 2, 0, True, False),
+        )
+
+        profile_store.bulk_save([save_payload(keyInsights=['precise'], salesApproach='Bring data.')])
+        profile = AnalyzedProfile.objects.get()
+        self.assertEqual((profile.key_insights_count, profile.has_sales_approach), (1, True))
+
+    def test_model_saves_recompute_them(self):
+        profile = AnalyzedProfile.objects.create(name='Ada', pain_points=['vague claims'], communication_style='Written')
+        self.assertEqual((profile.pain_points_count, profile.has_communication_style), (1, True))
+
+        profile.pain_points = 'not a list'
+        profile.communication_style = None
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual((profile.pain_points_count, profile.has_communication_style), (0, False))
+        self.assertEqual(AnalyzedProfile.summary_fields_for(['pain_points', 'name']), ['pain_points_count'])
+
+
+class QueryPlanTests(TestCase):
+
+    def setUp(self):
+        if not query_plans.supports(connection.vendor):
+            self.skipTest(f'Query plan checks are not supported on {connection.vendor}')
+
+    def test_changelist_queries_use_an_index(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('queries use an index', out.getvalue())
+
+    def test_filtered_index_walk_is_a_full_scan(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan shape is specific to SQLite')
+        ordered = AnalyzedProfile.objects.order_by('-created_at')[:100]
+        self.assertEqual(query_plans.check('unfiltered', ordered).full_scans, [])
+
+        filtered = AnalyzedProfile.objects.filter(confidence__gte=80).order_by('-created_at')[:100]
+        result = query_plans.check('one-sided range', filtered)
+        self.assertIn('USING INDEX', result.plan)
+        self.assertEqual(result.full_scans, ['analyzed_profiles'])
+
+
+class DateBucketTests(TestCase):
+
+    CREATED = [
+        datetime(2024, 12, 31, 23, 30, tzinfo=dt_timezone.utc),
+        datetime(2025, 3, 1, 4, 0, tzinfo=dt_timezone.utc),
+        datetime(2025, 3, 20, 12, 0, tzinfo=dt_timezone.utc),
+        datetime(2026, 1, 15, 9, 0, tzinfo=dt_timezone.utc),
+    ]
+
+    def setUp(self):
+        for i, created_at in enumerate(self.CREATED):
+            profile = AnalyzedProfile.objects.create(name=f'Profile {i}', profile_id=f'p{i}', disc_primary='DC'[i % 2])
+            AnalyzedProfile.objects.filter(pk=profile.pk).update(created_at=created_at)
+
+    def assertSameBuckets(self, queryset, *args, **kwargs):
+        self.assertEqual(date_buckets.bucketed(queryset).datetimes(*args, **kwargs), list(queryset.datetimes(*args, **kwargs)))
+
+    def test_matches_queryset_datetimes(self):
+        profiles = AnalyzedProfile.objects.all()
+        for kind in date_buckets.BUCKET_KINDS:
+            for order in ('ASC', 'DESC'):
+                self.assertSameBuckets(profiles, 'created_at', kind, order)
+            self.assertSameBuckets(profiles.filter(disc_primary='C'), 'created_at', kind)
+            self.assertSameBuckets(profiles.filter(created_at__year=2025), 'created_at', kind)
+        self.assertEqual(date_buckets.bucketed(profiles.filter(disc_primary='I')).datetimes('created_at', 'month'), [])
+
+    def test_buckets_follow_the_time_zone(self):
+        # 2025-03-01 04:00 UTC is still February in New York, 2024-12-31 23:30 UTC is 2025 in Tokyo.
+        for name in ('America/New_York', 'Asia/Tokyo'):
+            with timezone.override(name):
+                for kind in ('year', 'month'):
+                    self.assertSameBuckets(AnalyzedProfile.objects.all(), 'created_at', kind)
+
+    def test_probes_run_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(3):  # first, last, and one query of EXISTS probes
+            buckets = date_buckets.bucketed(AnalyzedProfile.objects.all()).datetimes('created_at', 'month')
+        self.assertEqual([(bucket.year, bucket.month) for bucket in buckets], [(2024, 12), (2025, 3), (2026, 1)])
+
+    def test_falls_back_beyond_max_buckets(self):
+        with mock.patch.object(date_buckets, 'MAX_BUCKETS', 2):
+            self.assertSameBuckets(AnalyzedProfile.objects.all(), 'created_at', 'month')
+        # The model manager keeps the regular, chainable datetimes().
+        self.assertNotIsInstance(AnalyzedProfile.objects.datetimes('created_at', 'year'), list)
+
+    def test_changelist_date_hierarchy_uses_the_probes(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/api/analyzedprofile/', {'created_at__year': 2025})
+        self.assertEqual(re.findall(r'\?created_at__month=(\d+)', response.content.decode()), ['3'])
+        self.assertFalse([query['sql'] for query in queries if 'django_datetime_trunc' in query['sql']])
@@ -1,11 +1,22 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('analyze-profile/', views.analyze_profile, name='analyze-profile'),
+    path('analyze-profiles/batch/', views.analyze_profiles_batch, name='analyze-profiles-batch'),
+    path('analysis-jobs/', views.submit_analysis_job, name='submit-analysis-job'),
+    path('analysis-jobs/<uuid:job_id>/', views.get_analysis_job, name='get-analysis-job'),
     path('save-analyzed-data/', views.save_analyzed_data, name='save-analyzed-data'),
+    path('save-analyzed-data/batch/', views.save_analyzed_data_batch, name='save-analyzed-data-batch'),
     path('generate-message/', views.generate_message, name='generate-message'),
     path('get-raw-data/<str:profile_id>/', views.get_raw_data_by_profile_id, name='get-raw-data'),
     path('get-analyzed-data/<str:profile_id>/', views.get_analyzed_data_by_profile_id, name='get-analyzed-data'),
+    path('profile/<str:profile_id>/', views.get_profile_bundle, name='get-profile-bundle'),
+    path('profiles/lookup/', views.lookup_profiles, name='lookup-profiles'),
+    path('profiles/search/', views.search_profiles, name='search-profiles'),
+    path('metrics/', views.get_metrics, name='metrics'),
+    path('async/analyze-profile/', async_views.analyze_profile_async, name='analyze-profile-async'),
+    path('async/analyze-profiles/batch/', async_views.analyze_profiles_batch_async, name='analyze-profiles-batch-async'),
+    path('async/generate-message/', async_views.generate_message_async, name='generate-message-async'),
 ]
 
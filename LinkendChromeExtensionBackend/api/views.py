@@ -1,17 +1,51 @@
 import os
 import json
+import hashlib
 import re
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import api_view
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import ProfileDataSerializer, AnalysisResponseSerializer, AnalyzedProfileSaveSerializer, AnalyzedProfileModelSerializer, RawDataSerializer
-from .models import AnalyzedProfile, RawData, extract_linkedin_profile_id
+from rest_framework.settings import api_settings
+from .serializers import ProfileDataSerializer, AnalysisResponseSerializer, AnalyzedProfileSaveSerializer, AnalyzedProfileModelSerializer, RawDataSerializer, AnalysisJobSerializer
+from .models import AnalyzedProfile, RawData, AnalysisJob, extract_linkedin_profile_id
+from . import analysis_cache, db_pool, gemini, jobs, metrics, profile_cache, search, singleflight
+from .analysis import failure_details, get_profile_analysis
+from .llm_json import IncompleteJSON, finalize, partial_report
+from .profile_store import SaveItem, bulk_save, get_linkedin_profile, normalize_save_payload, save_profile
+from .prompts import ANALYSIS_PROMPT_VERSION, build_message_prompt
+from .schemas import MESSAGE_RESPONSE_SERIALIZERS
+from .streaming import (
+    EventStreamRenderer, NDJSONRenderer, event_stream_response, format_ndjson,
+    message_events, ndjson_response, wants_ndjson, wants_stream,
+)
 
 import pdb
 
+# Version folded into the single-flight key of generate-message requests.
+MESSAGE_RESULT_VERSION = 'message-2'
+
+
+def set_salvage_headers(response, result):
+    """
+    Flag a salvaged result with X-Truncated-Fields / X-Lost-Fields headers.
+    The body carries the same report under "_partial".
+    """
+    report = partial_report(result)
+    if report:
+        response['X-Truncated-Fields'] = ', '.join(report['truncated'])
+        response['X-Lost-Fields'] = ', '.join(report['lost'])
+    return response
+
+
 @csrf_exempt
 @api_view(['POST'])
 def analyze_profile(request):
@@ -48,173 +82,223 @@ def analyze_profile(request):
     profile_data = serializer.validated_data
     
     try:
-        analysis_result = analyze_with_gemini(profile_data)
+        analysis_result, cache_status = get_profile_analysis(profile_data)
         
-        response_serializer = AnalysisResponseSerializer(data=analysis_result)
-        if not response_serializer.is_valid():
-            return Response(
-                {'error': 'Invalid analysis response from AI', 'details': response_serializer.errors},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-        
-        return Response(analysis_result, status=status.HTTP_200_OK)
+        response = Response(analysis_result, status=status.HTTP_200_OK)
+        response['X-Analysis-Cache'] = cache_status
+        return set_salvage_headers(response, analysis_result)
         
+    except IncompleteJSON as e:
+        # Gemini's output was cut off before fields the analysis requires.
+        return Response(failure_details(e), status=status.HTTP_422_UNPROCESSABLE_ENTITY)
     except Exception as e:
-        return Response(
-            {'error': 'Analysis failed', 'message': str(e)},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+        return Response(failure_details(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def parse_batch_profiles(data):
+    """
+    Split a batch analyze body into (items, error).
+    Accepts {"profiles": [...]} or a bare list. Each item is (index, validated_data, errors).
+    """
+    profiles = data.get('profiles') if isinstance(data, dict) else data
+    if not isinstance(profiles, list) or not profiles:
+        return None, 'Request body must contain a non-empty "profiles" list'
+
+    max_items = getattr(settings, 'ANALYZE_BATCH_MAX_ITEMS', 50)
+    if len(profiles) > max_items:
+        return None, f'A batch can contain at most {max_items} profiles'
+
+    items = []
+    for index, profile in enumerate(profiles):
+        serializer = ProfileDataSerializer(data=profile)
+        if serializer.is_valid():
+            items.append((index, serializer.validated_data, None))
+        else:
+            items.append((index, None, serializer.errors))
+    return items, None
+
+
+def get_batch_concurrency(data, item_count):
+    """
+    Concurrency for a batch: the caller's "concurrency" value, capped at ANALYZE_BATCH_CONCURRENCY.
+    """
+    limit = getattr(settings, 'ANALYZE_BATCH_CONCURRENCY', 25)
+    requested = data.get('concurrency') if isinstance(data, dict) else None
+    try:
+        requested = int(requested) if requested is not None else limit
+    except (TypeError, ValueError):
+        requested = limit
+    return max(1, min(requested, limit, item_count))
+
+
+def batch_result_entry(index, analysis_result, cache_status):
+    """
+    Successful batch entry; salvaged analyses carry a "salvaged" report.
+    """
+    entry = {'index': index, 'status': 'ok', 'cache': cache_status, 'result': analysis_result}
+    report = partial_report(analysis_result)
+    if report:
+        entry['salvaged'] = report
+    return entry
+
+
+def analyze_batch_item(index, profile_data):
+    """
+    Analyze one batch item and return its result entry; never raises.
+    """
+    try:
+        analysis_result, cache_status = get_profile_analysis(profile_data)
+        return batch_result_entry(index, analysis_result, cache_status)
+    except Exception as e:
+        return {'index': index, 'status': 'error', **failure_details(e)}
+    finally:
+        # Worker threads get their own DB connections from the cache tier; don't leak them.
+        connections.close_all()
 
 
-def analyze_with_gemini(profile_data):
-    """
-    Analyze profile data using Google Gemini API.
-    """
-    posts_text = 'No recent posts available'
-    if profile_data.get('posts') and len(profile_data['posts']) > 0:
-        posts_text = '\n\n'.join([
-            f"Post {i+1} ({post.get('time', 'Unknown')}): \"{post.get('text', '')}\" - {post.get('reactions', '0')} reactions, {post.get('comments', '0')} comments"
-            for i, post in enumerate(profile_data['posts'])
-        ])
-
-    prompt = f"""You are an expert sales psychologist and DISC personality analyst. Analyze this LinkedIn profile and provide ACTIONABLE sales insights.
-
-PROFILE DATA:
-Name: {profile_data.get('name', 'Not available')}
-Location: {profile_data.get('location', 'Not available')}
-Headline (Full): {profile_data.get('headline', 'Not available')}
-Current Company: {profile_data.get('currentCompany', 'Not available')}
-Connections: {profile_data.get('connectionsCount', 'Unknown')}
-
-About Section:
-{profile_data.get('about', 'No about section available')}
-
-Experience:
-{profile_data.get('experience', 'No experience data available')}
-
-Education:
-{profile_data.get('education', 'No education data')}
-
-Top Skills:
-{profile_data.get('topSkills', 'No top skills listed')}
-
-All Skills: {profile_data.get('skills', 'No skills listed')}
-
-RECENT ACTIVITY & POSTS:
-{profile_data.get('activity', posts_text)}
-
-Based on this comprehensive profile, provide a DEEP personality analysis focusing on:
-1. DISC personality breakdown (must total 100%)
-2. Their values, motivations, and pain points
-3. What they care about (based on posts and career)
-4. How to approach them in sales
-5. What messaging will resonate
-6. Red flags or objections they might have
-7. Personalized email template (subject + body) tailored to their DISC type and interests
-8. LinkedIn message (under 300 characters) for connection or InMail
-9. Follow-up message for 3-5 days after initial contact
-
-Return ONLY this JSON (no markdown):
-{{
-  "dominance": 35,
-  "influence": 30,
-  "steadiness": 20,
-  "compliance": 15,
-  "primaryType": "Influence (I)",
-  "confidence": 78,
-  "description": "Engaging • Collaborative • People-focused",
-  "keyInsights": [
-    "Values innovation and cloud technology",
-    "Active on LinkedIn - posts about AWS and DevOps regularly",
-    "Career-focused on scalable solutions and architecture",
-    "Likely responds to data-driven pitches with ROI focus"
-  ],
-  "communicationStyle": "This person is technical but collaborative. They value expertise and practical solutions. Based on their posts, they're interested in AWS, cloud architecture, and DevOps practices.",
-  "salesApproach": "Lead with technical credibility. Share case studies of similar cloud implementations. Emphasize scalability and cost savings. They're active on LinkedIn, so social proof matters.",
-  "painPoints": [
-    "Managing cloud costs at scale",
-    "Finding reliable DevOps automation tools",
-    "Keeping up with rapid AWS updates"
-  ],
-  "idealPitch": "Brief, technical, backed by data. Show them how your solution saves time and money in cloud infrastructure. Mention specific AWS services they use.",
-  "communicationDos": [
-    "Be technical and knowledgeable about cloud tech",
-    "Share specific metrics and case studies",
-    "Respect their expertise - don't oversimplify",
-    "Reference their LinkedIn posts to show research"
-  ],
-  "communicationDonts": [
-    "Don't use generic sales pitches",
-    "Avoid non-technical fluff",
-    "Don't ignore their specific interests (AWS, DevOps)",
-    "Don't rush them - they'll evaluate thoroughly"
-  ],
-  "bestApproach": "Open with a specific insight about their work (reference a post or achievement). Position yourself as a peer, not a salesperson. Lead with a problem you've solved for similar AWS architects. Offer value first (whitepaper, demo, free audit) before asking for a meeting.",
-  "emailTemplate": {{
-    "subject": "Personalized subject line based on their profile",
-    "body": "Complete email body personalized to their DISC type, interests, and pain points. Include specific references to their profile, achievements, or posts. Make it warm, professional, and value-focused."
-  }},
-  "linkedinMessage": "Personalized LinkedIn connection message or InMail. Should be concise (under 300 characters), reference something specific from their profile, and include a clear value proposition. Match their communication style based on DISC type.",
-  "followUpMessage": "Follow-up message for after initial contact. Should acknowledge previous conversation, provide additional value, and include a soft call-to-action. Should be sent 3-5 days after initial contact."
-}}
-
-Make this analysis SPECIFIC to this person based on their actual content, not generic templates!"""
-
-    gemini_api_key = settings.GEMINI_API_KEY
-    if not gemini_api_key:
-        raise ValueError('GEMINI_API_KEY is not configured in environment variables')
-
-    api_url = settings.GEMINI_API_URL
+def iter_batch_results(items, concurrency):
+    """
+    Yield one result entry per batch item in completion order.
+    Invalid items are reported first; valid ones are analyzed `concurrency` at a time.
+    """
+    pending = []
+    for index, profile_data, errors in items:
+        if errors is not None:
+            yield {'index': index, 'status': 'error', 'error': 'Invalid profile data', 'details': errors}
+        else:
+            pending.append((index, profile_data))
+
+    if not pending:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='analyze-batch')
+    try:
+        futures = [executor.submit(analyze_batch_item, index, profile_data) for index, profile_data in pending]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@csrf_exempt
+@api_view(['POST'])
+@renderer_classes(list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer])
+def analyze_profiles_batch(request):
+    """
+    Analyze many LinkedIn profiles in one request, calling Gemini concurrently.
     
-    response = requests.post(
-        api_url,
-        headers={
-            'Content-Type': 'application/json',
-            'x-goog-api-key': gemini_api_key
-        },
-        json={
-            'contents': [{
-                'parts': [{
-                    'text': prompt
-                }]
-            }],
-            'generationConfig': {
-                'temperature': 0.8
+    Expected request body:
+    {
+        "profiles": [ { ...same shape as analyze-profile... }, ... ],
+        "concurrency": 10  // Optional, capped at ANALYZE_BATCH_CONCURRENCY
+    }
+    
+    Returns {"results": [...], "summary": {...}} with one entry per profile in input order.
+    With ?stream=ndjson (or Accept: application/x-ndjson) each entry is streamed as one
+    JSON line as soon as it completes. Entries look like:
+    {"index": 0, "status": "ok", "cache": "miss", "result": {...}}
+    {"index": 1, "status": "error", "error": "...", "message": "..."}
+    An analysis salvaged from a truncated Gemini response also carries
+    "salvaged": {"truncated": [...], "lost": [...]}.
+    """
+    items, error = parse_batch_profiles(request.data)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    concurrency = get_batch_concurrency(request.data, len(items))
+
+    if wants_ndjson(request):
+        return ndjson_response(format_ndjson(entry) for entry in iter_batch_results(items, concurrency))
+
+    results = sorted(iter_batch_results(items, concurrency), key=lambda entry: entry['index'])
+    succeeded = sum(1 for entry in results if entry['status'] == 'ok')
+    return Response(
+        {
+            'results': results,
+            'summary': {
+                'total': len(results),
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded,
+                'concurrency': concurrency,
             }
-        }
+        },
+        status=status.HTTP_200_OK
     )
+
+
+@csrf_exempt
+@api_view(['POST'])
+def submit_analysis_job(request):
+    """
+    Queue a profile analysis and return a job id immediately.
+    Poll the returned status_url until status is "succeeded" or "failed".
     
-    if response.status_code != 200:
-        raise Exception(f'Gemini API error: {response.status_code} - {response.text}')
-    
-    data = response.json()
-    
-    finish_reason = data.get('candidates', [{}])[0].get('finishReason', '')
-    if finish_reason == 'MAX_TOKENS':
-        print('WARNING: Gemini response was truncated due to MAX_TOKENS limit')
-    
-    text_response = data['candidates'][0]['content']['parts'][0]['text']
-    
-    json_text = text_response.strip()
-    json_text = json_text.replace('```json\n', '')
-    json_text = json_text.replace('```\n', '')
-    json_text = json_text.replace('```', '')
-    
-    json_match = re.search(r'\{[\s\S]*\}', json_text)
-    if not json_match:
-        raise Exception('Could not parse AI response as JSON')
+    Expected request body: same as analyze-profile.
     
+    Example response (202):
+    {
+        "message": "Analysis job queued",
+        "job": {"id": "...", "status": "pending", ...},
+        "status_url": "/api/analysis-jobs/<job_id>/"
+    }
+    """
+    serializer = ProfileDataSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(
+            {'error': 'Invalid profile data', 'details': serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    profile_data = serializer.validated_data
+
     try:
-        analysis = json.loads(json_match.group(0))
-    except json.JSONDecodeError as e:
-        print(f'JSON parsing error: {e}')
-        print(f'Attempted to parse: {json_match.group(0)[:500]}...')
-        if finish_reason == 'MAX_TOKENS':
-            raise Exception('Response was truncated by token limit. Please increase maxOutputTokens or reduce prompt size.')
-        else:
-            raise Exception(f'Failed to parse JSON response: {str(e)}')
+        cache_key = analysis_cache.make_key(profile_data, ANALYSIS_PROMPT_VERSION)
+        cached_result, cache_status = analysis_cache.get(cache_key)
+        job = jobs.submit(profile_data, cached_result=cached_result, cache_status=cache_status)
+    except Exception as e:
+        return Response(
+            {'error': 'Failed to queue analysis job', 'message': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return Response(
+        {
+            'message': 'Analysis job queued' if job.status == AnalysisJob.STATUS_PENDING else 'Analysis already available',
+            'job': AnalysisJobSerializer(job).data,
+            'status_url': reverse('get-analysis-job', kwargs={'job_id': job.id}),
+        },
+        status=status.HTTP_202_ACCEPTED if job.status == AnalysisJob.STATUS_PENDING else status.HTTP_200_OK
+    )
+
+
+@csrf_exempt
+@api_view(['GET'])
+def get_analysis_job(request, job_id):
+    """
+    Get the status, and once finished the result or error, of an analysis job.
     
-    return analysis
+    Example: GET /api/analysis-jobs/2b0c9f5e-.../
+    """
+    try:
+        job = AnalysisJob.objects.get(id=job_id)
+        serializer = AnalysisJobSerializer(job)
+        return Response(
+            {
+                'message': 'Analysis job retrieved successfully',
+                'data': serializer.data
+            },
+            status=status.HTTP_200_OK
+        )
+    except AnalysisJob.DoesNotExist:
+        return Response(
+            {'error': 'Analysis job not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except Exception as e:
+        return Response(
+            {'error': 'Failed to retrieve analysis job', 'message': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
 
 
 @csrf_exempt
@@ -246,29 +330,7 @@ def save_analyzed_data(request):
         "user_id": "optional-uuid"  // Optional
     }
     """
-    data = request.data.copy()
-    
-    field_mapping = {
-        'linkedin_url': 'linkedin_profile',
-        'primaryType': 'disc_primary',
-        'keyInsights': 'key_insights',
-        'painPoints': 'pain_points',
-        'communicationStyle': 'communication_style',
-        'salesApproach': 'sales_approach',
-        'bestApproach': 'best_approach',
-        'idealPitch': 'ideal_pitch',
-        'communicationDos': 'communication_dos',
-        'communicationDonts': 'communication_donts',
-    }
-    
-    for camel_key, snake_key in field_mapping.items():
-        if camel_key in data and snake_key not in data:
-            data[snake_key] = data[camel_key]
-        elif camel_key in data and snake_key in data:
-            pass
-    
-    if 'linkedin_url' in data and 'linkedin_profile' not in data:
-        data['linkedin_profile'] = data['linkedin_url']
+    data = normalize_save_payload(request.data.copy())
     
     serializer = AnalyzedProfileSaveSerializer(data=data)
     if not serializer.is_valid():
@@ -278,20 +340,9 @@ def save_analyzed_data(request):
         )
     
     validated_data = serializer.validated_data
-    user_id = validated_data.get('user_id')
-    
-    raw_profile_data = data.get('rawProfileData', {})
     
     try:
-        linkedin_profile = validated_data.get('linkedin_profile', '')
-        if linkedin_profile and linkedin_profile.strip():
-            linkedin_profile = linkedin_profile.strip()
-        else:
-            linkedin_profile = None
-
-        profile_id = None
-        if linkedin_profile:
-            profile_id = extract_linkedin_profile_id(linkedin_profile)
+        linkedin_profile, profile_id = get_linkedin_profile(validated_data)
         
         if not profile_id:
             return Response(
@@ -299,106 +350,27 @@ def save_analyzed_data(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        raw_data_obj = None
-        if raw_profile_data:
-            def get_value(camel_key, fallback_key=None):
-                value = raw_profile_data.get(camel_key, raw_profile_data.get(fallback_key, '') if fallback_key else '')
-                if not value or not str(value).strip() or str(value).strip() == 'Not available':
-                    return None
-                return str(value).strip()
-            
-            raw_data_obj, created = RawData.objects.update_or_create(
-                profile_id=profile_id,
-                defaults={
-                    'linkedin_profile': linkedin_profile,
-                    'name': raw_profile_data.get('name', validated_data.get('name', '')),
-                    'headline': get_value('headline'),
-                    'location': get_value('location'),
-                    'about': get_value('about'),
-                    'experience': get_value('experience'),
-                    'education': get_value('education'),
-                    'skills': get_value('skills'),
-                    'connections_count': get_value('connectionsCount'),
-                    'current_company': get_value('currentCompany'),
-                    'top_skills': get_value('topSkills'),
-                    'activity': get_value('activity'),
-                    'posts': raw_profile_data.get('posts', []),
-                    'raw_data': raw_profile_data,
-                }
-            )
-        
-        existing_profile = None
-        try:
-            existing_profile = AnalyzedProfile.objects.get(profile_id=profile_id)
-        except AnalyzedProfile.DoesNotExist:
-            pass
+        analyzed_profile, created, changed = save_profile(
+            SaveItem(None, request.data, validated_data, linkedin_profile, profile_id)
+        )
         
-        if existing_profile:
-            existing_profile.name = validated_data.get('name', existing_profile.name)
-            existing_profile.headline = validated_data.get('headline', existing_profile.headline)
-            existing_profile.confidence = validated_data.get('confidence', existing_profile.confidence)
-            existing_profile.dominance = validated_data.get('dominance', existing_profile.dominance)
-            existing_profile.influence = validated_data.get('influence', existing_profile.influence)
-            existing_profile.steadiness = validated_data.get('steadiness', existing_profile.steadiness)
-            existing_profile.compliance = validated_data.get('compliance', existing_profile.compliance)
-            existing_profile.disc_primary = validated_data.get('disc_primary', existing_profile.disc_primary)
-            existing_profile.key_insights = validated_data.get('key_insights', existing_profile.key_insights)
-            existing_profile.pain_points = validated_data.get('pain_points', existing_profile.pain_points)
-            existing_profile.communication_style = validated_data.get('communication_style', existing_profile.communication_style)
-            existing_profile.sales_approach = validated_data.get('sales_approach', existing_profile.sales_approach)
-            existing_profile.best_approach = validated_data.get('best_approach', existing_profile.best_approach)
-            existing_profile.ideal_pitch = validated_data.get('ideal_pitch', existing_profile.ideal_pitch)
-            existing_profile.communication_dos = validated_data.get('communication_dos', existing_profile.communication_dos)
-            existing_profile.communication_donts = validated_data.get('communication_donts', existing_profile.communication_donts)
-            existing_profile.raw_data = request.data
-            
-            if raw_data_obj:
-                existing_profile.raw_data_ref = raw_data_obj
-            
-            if user_id:
-                existing_profile.user_id = user_id
-            
-            existing_profile.save()
-            
-            response_serializer = AnalyzedProfileModelSerializer(existing_profile)
+        response_serializer = AnalyzedProfileModelSerializer(analyzed_profile)
+        if not created:
             return Response(
                 {
-                    'message': 'Profile updated successfully',
+                    'message': 'Profile updated successfully' if changed else 'Profile unchanged',
                     'updated': True,
+                    'changed': changed,
                     'profile': response_serializer.data
                 },
                 status=status.HTTP_200_OK
             )
         
-        analyzed_profile = AnalyzedProfile.objects.create(
-            user_id=user_id,
-            profile_id=profile_id,
-            raw_data_ref=raw_data_obj,
-            name=validated_data.get('name', ''),
-            headline=validated_data.get('headline', ''),
-            linkedin_profile=linkedin_profile,
-            confidence=validated_data.get('confidence'),
-            dominance=validated_data.get('dominance'),
-            influence=validated_data.get('influence'),
-            steadiness=validated_data.get('steadiness'),
-            compliance=validated_data.get('compliance'),
-            disc_primary=validated_data.get('disc_primary', ''),
-            key_insights=validated_data.get('key_insights', []),
-            pain_points=validated_data.get('pain_points', []),
-            communication_style=validated_data.get('communication_style', ''),
-            sales_approach=validated_data.get('sales_approach', ''),
-            best_approach=validated_data.get('best_approach', ''),
-            ideal_pitch=validated_data.get('ideal_pitch', ''),
-            communication_dos=validated_data.get('communication_dos', []),
-            communication_donts=validated_data.get('communication_donts', []),
-            raw_data=request.data,
-        )
-        
-        response_serializer = AnalyzedProfileModelSerializer(analyzed_profile)
         return Response(
             {
                 'message': 'Analyzed data saved successfully',
                 'updated': False,
+                'changed': True,
                 'profile': response_serializer.data
             },
             status=status.HTTP_201_CREATED
@@ -411,24 +383,196 @@ def save_analyzed_data(request):
         )
 
 
+@csrf_exempt
+@api_view(['POST'])
+def save_analyzed_data_batch(request):
+    """
+    Save many analyzed profiles in one request and one transaction.
+    
+    Expected request body:
+    {
+        "profiles": [ { ...same shape as save-analyzed-data, incl. rawProfileData... }, ... ]
+    }
+    
+    Returns {"results": [...], "summary": {...}} with one entry per profile in input order:
+    {"index": 0, "status": "created", "profile_id": "..."}
+    {"index": 1, "status": "updated", "profile_id": "..."}  // or "unchanged" when nothing differed
+    {"index": 2, "status": "skipped", "profile_id": "...", "message": "..."}  // same profile_id later in the batch
+    {"index": 3, "status": "error", "error": "...", "details": {...}}
+    Invalid items are reported without failing the rest of the batch.
+    """
+    profiles = request.data.get('profiles') if isinstance(request.data, dict) else request.data
+    if not isinstance(profiles, list) or not profiles:
+        return Response(
+            {'error': 'Request body must contain a non-empty "profiles" list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    max_items = getattr(settings, 'SAVE_BATCH_MAX_ITEMS', 500)
+    if len(profiles) > max_items:
+        return Response(
+            {'error': f'A batch can contain at most {max_items} profiles'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        results = bulk_save(profiles)
+    except Exception as e:
+        return Response(
+            {'error': 'Failed to save analyzed data', 'message': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    summary = {'total': len(results), 'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+    for entry in results:
+        summary['failed' if entry['status'] == 'error' else entry['status']] += 1
+    return Response({'results': results, 'summary': summary}, status=status.HTTP_200_OK)
+
+
+def _field_list(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    return names or None
+
+
+def parse_sparse_fields(request, *serializer_classes):
+    """
+    Read the ?fields= / ?exclude= query parameters (comma-separated field names).
+    Returns (fields, exclude), each a list or None.
+    Raises ValueError for field names none of the serializers have.
+    """
+    fields = _field_list(request, 'fields')
+    exclude = _field_list(request, 'exclude')
+    available = list(dict.fromkeys(name for serializer_class in serializer_classes for name in serializer_class.Meta.fields))
+    unknown = [name for name in (fields or []) + (exclude or []) if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available fields: {', '.join(available)}")
+    return fields, exclude
+
+
+def sparse_queryset(queryset, serializer_class, fields, exclude, extra_columns=()):
+    """
+    Load only the columns behind the requested fields: .only() for ?fields=,
+    .defer() for ?exclude=. `extra_columns` are loaded either way.
+    """
+    if fields is not None:
+        selected = [name for name in fields if name not in (exclude or [])]
+        return queryset.only(*serializer_class.model_columns(selected or ['id']), *extra_columns)
+    if exclude is not None:
+        return queryset.defer(*[column for column in serializer_class.model_columns(exclude) if column not in extra_columns])
+    return queryset
+
+
+def profile_validators(updated_at, content_hash, fields, exclude):
+    """
+    ETag and Last-Modified for a profile row. The ETag also covers the
+    requested fieldset, since that changes the representation.
+    Returns {'etag': ..., 'last_modified': ...}.
+    """
+    version = f"{updated_at.isoformat()}|{content_hash or ''}|{fields}|{exclude}"
+    return {
+        'etag': quote_etag(hashlib.sha256(version.encode('utf-8')).hexdigest()[:32]),
+        'last_modified': int(updated_at.timestamp()),
+    }
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Add ETag / Last-Modified and ask clients to revalidate before reusing the response.
+    """
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def invalid_fields_response(error):
+    return Response(
+        {'error': 'Invalid fields', 'message': str(error)},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def lookup_profile_data(request, profile_id, model, serializer_class, resource, fields, exclude):
+    """
+    Serialized `model` row for `profile_id` through the profile cache.
+    Returns (data, validators, not_modified); not_modified is the 304
+    response when the client's copy is still current (data is then None).
+    Raises model.DoesNotExist.
+
+    A cache hit answers without touching the database. On a miss the
+    validators are checked with a values('updated_at', 'content_hash') query
+    first, so a 304 never loads the row; otherwise full lookups load the row
+    and cache it, and sparse lookups load only the requested columns.
+    """
+    entry = profile_cache.get(resource, profile_id)
+    if entry == profile_cache.MISSING:
+        raise model.DoesNotExist
+
+    if entry is not None:
+        validators = profile_validators(entry['updated_at'], entry['content_hash'], fields, exclude)
+        not_modified = get_conditional_response(request, **validators)
+        if not_modified is not None:
+            return None, validators, not_modified
+        return serializer_class.trim(entry['data'], fields, exclude), validators, None
+
+    row = model.objects.filter(profile_id=profile_id).values('updated_at', 'content_hash').first()
+    if row is None:
+        profile_cache.store_missing(resource, profile_id)
+        raise model.DoesNotExist
+    validators = profile_validators(row['updated_at'], row['content_hash'], fields, exclude)
+    not_modified = get_conditional_response(request, **validators)
+    if not_modified is not None:
+        return None, validators, not_modified
+
+    if fields is None and exclude is None:
+        instance = model.objects.with_blobs().get(profile_id=profile_id)
+        data = serializer_class(instance).data
+        profile_cache.store(resource, profile_id, dict(data), instance.updated_at, instance.content_hash)
+        return data, profile_validators(instance.updated_at, instance.content_hash, fields, exclude), None
+
+    queryset = model.objects.all()
+    if 'raw_data' in serializer_class.selected_fields(serializer_class.Meta.fields, fields, exclude):
+        queryset = queryset.with_blobs()
+    instance = sparse_queryset(queryset, serializer_class, fields, exclude).get(profile_id=profile_id)
+    return serializer_class(instance, fields=fields, exclude=exclude).data, validators, None
+
+
+def profile_lookup_response(data, validators, not_modified, message):
+    if not_modified is not None:
+        metrics.incr('profile_lookup.not_modified')
+        return set_validators(not_modified, **validators)
+    response = Response({'message': message, 'data': data}, status=status.HTTP_200_OK)
+    return set_validators(response, **validators)
+
+
 @csrf_exempt
 @api_view(['GET'])
 def get_raw_data_by_profile_id(request, profile_id):
     """
     Get raw scraped data by LinkedIn profile ID.
+
+    Optional ?fields=a,b or ?exclude=a,b return (and load) only part of the
+    fields, e.g. ?exclude=raw_data,posts.
+
+    Responses carry ETag and Last-Modified; a request with a matching
+    If-None-Match or If-Modified-Since gets 304 Not Modified. Lookups go
+    through the profile cache (see profile_cache.py).
     
     Example: GET /api/get-raw-data/sumit-patil-1b31a9271/
     """
     try:
-        raw_data = RawData.objects.get(profile_id=profile_id)
-        serializer = RawDataSerializer(raw_data)
-        return Response(
-            {
-                'message': 'Raw data retrieved successfully',
-                'data': serializer.data
-            },
-            status=status.HTTP_200_OK
+        fields, exclude = parse_sparse_fields(request, RawDataSerializer)
+    except ValueError as e:
+        return invalid_fields_response(e)
+
+    try:
+        data, validators, not_modified = lookup_profile_data(
+            request, profile_id, RawData, RawDataSerializer, profile_cache.RESOURCE_RAW, fields, exclude
         )
+        return profile_lookup_response(data, validators, not_modified, 'Raw data retrieved successfully')
     except RawData.DoesNotExist:
         return Response(
             {'error': 'Raw data not found for this profile ID'},
@@ -446,19 +590,27 @@ def get_raw_data_by_profile_id(request, profile_id):
 def get_analyzed_data_by_profile_id(request, profile_id):
     """
     Get analyzed data by LinkedIn profile ID.
+
+    Optional ?fields=a,b or ?exclude=a,b return (and load) only part of the
+    fields, e.g. ?fields=name,disc_primary,dominance,influence,steadiness,compliance.
+
+    Responses carry ETag and Last-Modified; a request with a matching
+    If-None-Match or If-Modified-Since gets 304 Not Modified. Lookups go
+    through the profile cache (see profile_cache.py).
     
     Example: GET /api/get-analyzed-data/sumit-patil-1b31a9271/
     """
     try:
-        analyzed_profile = AnalyzedProfile.objects.get(profile_id=profile_id)
-        serializer = AnalyzedProfileModelSerializer(analyzed_profile)
-        return Response(
-            {
-                'message': 'Analyzed data retrieved successfully',
-                'data': serializer.data
-            },
-            status=status.HTTP_200_OK
+        fields, exclude = parse_sparse_fields(request, AnalyzedProfileModelSerializer)
+    except ValueError as e:
+        return invalid_fields_response(e)
+
+    try:
+        data, validators, not_modified = lookup_profile_data(
+            request, profile_id, AnalyzedProfile, AnalyzedProfileModelSerializer,
+            profile_cache.RESOURCE_ANALYZED, fields, exclude
         )
+        return profile_lookup_response(data, validators, not_modified, 'Analyzed data retrieved successfully')
     except AnalyzedProfile.DoesNotExist:
         return Response(
             {'error': 'Analyzed data not found for this profile ID'},
@@ -471,8 +623,320 @@ def get_analyzed_data_by_profile_id(request, profile_id):
         )
 
 
+# Parts of the profile bundle: (response key, profile cache resource, serializer).
+BUNDLE_PARTS = (
+    ('analyzed', profile_cache.RESOURCE_ANALYZED, AnalyzedProfileModelSerializer),
+    ('raw', profile_cache.RESOURCE_RAW, RawDataSerializer),
+)
+
+
+def bundle_queryset(fields, exclude):
+    """
+    AnalyzedProfile joined to its RawData, loading only the columns behind the
+    requested fields of either part (plus what the ETag and the join need).
+    The blobs behind raw_data are joined too when it is requested.
+    """
+    analyzed_fields = AnalyzedProfileModelSerializer.selected_fields(AnalyzedProfileModelSerializer.Meta.fields, fields, exclude)
+    raw_fields = RawDataSerializer.selected_fields(RawDataSerializer.Meta.fields, fields, exclude)
+    related = ['raw_data_ref']
+    if 'raw_data' in analyzed_fields:
+        related += AnalyzedProfile.BLOB_FIELDS
+    if 'raw_data' in raw_fields:
+        related += [f'raw_data_ref__{field}' for field in RawData.BLOB_FIELDS]
+    queryset = AnalyzedProfile.objects.select_related(*related)
+    if fields is None and exclude is None:
+        return queryset
+    validator_columns = ['updated_at', 'content_hash']
+    columns = AnalyzedProfileModelSerializer.model_columns(analyzed_fields) + validator_columns + ['raw_data_ref']
+    columns += [f'raw_data_ref__{column}' for column in RawDataSerializer.model_columns(raw_fields) + validator_columns]
+    return queryset.only(*columns)
+
+
+def bundle_validators(versions, fields, exclude):
+    """
+    ETag / Last-Modified covering both parts of the bundle, from
+    {key: (updated_at, content_hash) or None}.
+    """
+    updated_at = max(version[0] for version in versions.values() if version is not None)
+    content_hash = '|'.join(
+        version[1] or '' if version is not None else '-'
+        for version in versions.values()
+    )
+    return profile_validators(updated_at, content_hash, fields, exclude)
+
+
+def load_profile_bundle(profile_id, fields, exclude):
+    """
+    Return ({key: instance or None}, {key: data or None}) for the bundle,
+    reading AnalyzedProfile and its RawData in one joined query. Full lookups
+    also refresh both profile cache entries.
+    """
+    analyzed = bundle_queryset(fields, exclude).filter(profile_id=profile_id).first()
+    raw = analyzed.raw_data_ref if analyzed is not None else None
+    if raw is None:
+        # Raw data saved without an analysis, or not linked to it.
+        queryset = RawData.objects.all()
+        if 'raw_data' in RawDataSerializer.selected_fields(RawDataSerializer.Meta.fields, fields, exclude):
+            queryset = queryset.with_blobs()
+        queryset = sparse_queryset(queryset, RawDataSerializer, fields, exclude, ['updated_at', 'content_hash'])
+        raw = queryset.filter(profile_id=profile_id).first()
+    instances = {'analyzed': analyzed, 'raw': raw}
+
+    data = {}
+    for key, resource, serializer_class in BUNDLE_PARTS:
+        instance = instances[key]
+        if instance is None:
+            data[key] = None
+            if fields is None and exclude is None:
+                profile_cache.store_missing(resource, profile_id)
+            continue
+        data[key] = serializer_class(instance, fields=fields, exclude=exclude).data
+        if fields is None and exclude is None:
+            profile_cache.store(resource, profile_id, dict(data[key]), instance.updated_at, instance.content_hash)
+    return instances, data
+
+
+@csrf_exempt
+@api_view(['GET'])
+def get_profile_bundle(request, profile_id):
+    """
+    Get analyzed data and raw scraped data for a LinkedIn profile ID in one response.
+    Either part is null when it does not exist; 404 when neither does.
+
+    ?fields=a,b / ?exclude=a,b apply to both parts (names of either serializer),
+    e.g. ?exclude=raw_data,posts drops the heavy JSON columns from the query.
+    Both parts, with the blobs behind raw_data, are read with one query joining
+    AnalyzedProfile to raw_data_ref, or straight from the profile cache when
+    both are cached.
+
+    Example: GET /api/profile/sumit-patil-1b31a9271/
+    """
+    try:
+        fields, exclude = parse_sparse_fields(request, AnalyzedProfileModelSerializer, RawDataSerializer)
+    except ValueError as e:
+        return invalid_fields_response(e)
+
+    try:
+        entries = {key: profile_cache.get(resource, profile_id) for key, resource, _ in BUNDLE_PARTS}
+        if all(entry is not None for entry in entries.values()):
+            present = {key: entry for key, entry in entries.items() if entry != profile_cache.MISSING}
+            if not present:
+                raise AnalyzedProfile.DoesNotExist
+            validators = bundle_validators(
+                {key: (entry['updated_at'], entry['content_hash']) if key in present else None for key, entry in entries.items()},
+                fields, exclude
+            )
+            not_modified = get_conditional_response(request, **validators)
+            data = {
+                key: serializer_class.trim(present[key]['data'], fields, exclude) if key in present else None
+                for key, _, serializer_class in BUNDLE_PARTS
+            }
+        else:
+            instances, data = load_profile_bundle(profile_id, fields, exclude)
+            if not any(instances.values()):
+                raise AnalyzedProfile.DoesNotExist
+            validators = bundle_validators(
+                {key: (instance.updated_at, instance.content_hash) if instance is not None else None
+                 for key, instance in instances.items()},
+                fields, exclude
+            )
+            not_modified = get_conditional_response(request, **validators)
+        return profile_lookup_response(data, validators, not_modified, 'Profile retrieved successfully')
+    except AnalyzedProfile.DoesNotExist:
+        return Response(
+            {'error': 'No analyzed or raw data found for this profile ID'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except Exception as e:
+        return Response(
+            {'error': 'Failed to retrieve profile', 'message': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+# Columns returned by the bulk lookup; also the key of its covering index.
+PROFILE_SUMMARY_FIELDS = [
+    'profile_id', 'disc_primary', 'dominance', 'influence', 'steadiness', 'compliance', 'updated_at',
+]
+PROFILE_ID_PATTERN = re.compile(r'^[^/?\s]+$')
+
+
+def normalize_profile_ref(value):
+    """
+    Profile ID for a LinkedIn profile URL or a bare profile ID; None if it is neither.
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    profile_id = extract_linkedin_profile_id(value)
+    if profile_id:
+        return profile_id
+    value = value.rstrip('/')
+    return value if PROFILE_ID_PATTERN.match(value) else None
+
+
 @csrf_exempt
 @api_view(['POST'])
+def lookup_profiles(request):
+    """
+    Look up the DISC summary of many profiles at once (e.g. to badge a search results page).
+    
+    Expected request body:
+    {
+        "profiles": ["https://www.linkedin.com/in/sumit-patil-1b31a9271/", "another-profile-id", ...]
+    }
+    
+    Returns:
+    {
+        "profiles": {"sumit-patil-1b31a9271": {"disc_primary": "D", "dominance": 80, ..., "updated_at": "..."}},
+        "not_found": ["another-profile-id"],
+        "invalid": [...]  // entries that are neither a profile URL nor a profile ID
+    }
+    All profiles are read with one IN query probing the profile_id index; where
+    the planner picks analyzed_profile_lookup_idx (e.g. a Postgres index-only
+    scan) the table itself is not read. SQLite prefers the unique profile_id index.
+    """
+    profiles = request.data.get('profiles') if isinstance(request.data, dict) else request.data
+    if not isinstance(profiles, list) or not profiles:
+        return Response(
+            {'error': 'Request body must contain a non-empty "profiles" list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    max_items = getattr(settings, 'PROFILE_LOOKUP_MAX_ITEMS', 500)
+    if len(profiles) > max_items:
+        return Response(
+            {'error': f'A lookup can contain at most {max_items} profiles'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    profile_ids = []
+    invalid = []
+    for value in profiles:
+        profile_id = normalize_profile_ref(value)
+        if profile_id is None:
+            invalid.append(value)
+        else:
+            profile_ids.append(profile_id)
+    profile_ids = list(dict.fromkeys(profile_ids))
+
+    try:
+        rows = (
+            AnalyzedProfile.objects
+            .filter(profile_id__in=profile_ids)
+            .order_by()  # the default ordering on created_at would need the table, not just the index
+            .values(*PROFILE_SUMMARY_FIELDS)
+        ) if profile_ids else []
+        found = {}
+        for row in rows:
+            profile_id = row.pop('profile_id')
+            found[profile_id] = row
+    except Exception as e:
+        return Response(
+            {'error': 'Failed to look up profiles', 'message': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    metrics.incr('profile_lookup.bulk_requested', len(profile_ids))
+    metrics.incr('profile_lookup.bulk_found', len(found))
+    return Response(
+        {
+            'profiles': found,
+            'not_found': [profile_id for profile_id in profile_ids if profile_id not in found],
+            'invalid': invalid,
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+# Fields returned per search result, by ?type=.
+SEARCH_RESULT_FIELDS = {
+    'analyzed': (AnalyzedProfile, ['profile_id', 'name', 'headline', *PROFILE_SUMMARY_FIELDS[1:]]),
+    'raw': (RawData, ['profile_id', 'name', 'headline', 'current_company', 'location', 'updated_at']),
+}
+
+
+@csrf_exempt
+@api_view(['GET'])
+def search_profiles(request):
+    """
+    Ranked full-text search over saved profiles.
+    
+    Query parameters:
+        q       search text; every word must match (as a prefix)
+        type    "analyzed" (default) searches analyzed profiles, "raw" searches raw data
+        limit   number of results (default SEARCH_DEFAULT_RESULTS, at most SEARCH_MAX_RESULTS)
+    
+    Returns:
+    {
+        "query": "...",
+        "type": "analyzed",
+        "results": [{"profile_id": "...", "name": "...", "headline": "...", ..., "rank": 0.61}, ...]
+    }
+    Results are ordered best match first.
+    """
+    query = request.query_params.get('q', '').strip()
+    search_type = request.query_params.get('type', 'analyzed')
+    if not query:
+        return Response(
+            {'error': 'Query parameter "q" is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if search_type not in SEARCH_RESULT_FIELDS:
+        return Response(
+            {'error': f'Unknown type "{search_type}"', 'message': f'Valid types: {", ".join(SEARCH_RESULT_FIELDS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    max_results = getattr(settings, 'SEARCH_MAX_RESULTS', 100)
+    try:
+        limit = int(request.query_params.get('limit', getattr(settings, 'SEARCH_DEFAULT_RESULTS', 20)))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= max_results:
+        return Response(
+            {'error': f'"limit" must be an integer between 1 and {max_results}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    model, fields = SEARCH_RESULT_FIELDS[search_type]
+    try:
+        matches = search.ranked(model, query, limit)
+        if matches is None:
+            return Response(
+                {'error': 'Full-text search is not available on this database'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        rows = {
+            row['id']: row
+            for row in model.objects.filter(pk__in=[pk for pk, _ in matches]).order_by().values('id', *fields)
+        }
+    except Exception as e:
+        return Response(
+            {'error': 'Failed to search profiles', 'message': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    results = []
+    for pk, rank in matches:
+        row = rows.get(pk)
+        if row is not None:  # deleted since it was ranked
+            row.pop('id')
+            row['rank'] = rank
+            results.append(row)
+
+    metrics.incr('search.queries')
+    if not results:
+        metrics.incr('search.no_results')
+    return Response(
+        {'query': query, 'type': search_type, 'results': results},
+        status=status.HTTP_200_OK
+    )
+
+
+@csrf_exempt
+@api_view(['POST'])
+@renderer_classes(list(api_settings.DEFAULT_RENDERER_CLASSES) + [EventStreamRenderer])
 def generate_message(request):
     """
     Generate customizable email template, LinkedIn message, or follow-up message
@@ -486,34 +950,41 @@ def generate_message(request):
             "name": "...",
             "headline": "...",
             ... (full profile data)
-        }
+        },
+        "stream": false  // Optional, also ?stream=true or Accept: text/event-stream
     }
+    
+    With streaming enabled the response is text/event-stream: "chunk" events carry
+    model text as it arrives and a final "result" event carries the parsed JSON.
     """
     message_type = request.data.get('messageType')
     query = request.data.get('query')
     profile_data = request.data.get('profileData')
 
-    if not message_type or message_type not in ['email', 'linkedin', 'followup']:
-        return Response(
-            {'error': 'Invalid messageType. Must be "email", "linkedin", or "followup"'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+    error = validate_message_request(message_type, query, profile_data)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
 
-    if not query or not query.strip():
-        return Response(
-            {'error': 'Query is required'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+    if wants_stream(request, request.data):
+        try:
+            prompt = build_message_prompt(message_type, query, profile_data)
+        except Exception as e:
+            return Response(
+                {'error': 'Message generation failed', 'message': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return event_stream_response(message_events(prompt.text, prompt.generation_config))
 
-    if not profile_data:
+    try:
+        result, shared = generate_message_coalesced(message_type, query, profile_data)
+        response = Response(result, status=status.HTTP_200_OK)
+        response['X-Request-Coalesced'] = 'true' if shared else 'false'
+        return set_salvage_headers(response, result)
+    except IncompleteJSON as e:
         return Response(
-            {'error': 'Profile data is required'},
-            status=status.HTTP_400_BAD_REQUEST
+            {'error': 'Message response from AI was truncated', 'lostFields': e.report['lost'], 'details': e.details},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
         )
-
-    try:
-        result = generate_custom_message(message_type, query, profile_data)
-        return Response(result, status=status.HTTP_200_OK)
     except Exception as e:
         return Response(
             {'error': 'Message generation failed', 'message': str(e)},
@@ -521,153 +992,78 @@ def generate_message(request):
         )
 
 
+def message_flight_key(message_type, query, profile_data):
+    """
+    Single-flight key of a generate-message request (same profile, message type and query).
+    """
+    canonical = json.dumps(
+        {'messageType': message_type, 'query': query, 'profileData': profile_data},
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str
+    )
+    digest = hashlib.sha256(f'{MESSAGE_RESULT_VERSION}\n{canonical}'.encode('utf-8')).hexdigest()
+    linkedin_url = None
+    if isinstance(profile_data, dict):
+        linkedin_url = profile_data.get('linkedin_url') or profile_data.get('linkedin_profile')
+    profile_id = extract_linkedin_profile_id(linkedin_url)
+    return f"message:{profile_id or '-'}:{digest}"
+
+
+def generate_message_coalesced(message_type, query, profile_data):
+    """
+    generate_custom_message where concurrent identical requests share one
+    Gemini call, within and across workers. Messages are not cached: a request
+    made after the shared call finished (e.g. "regenerate") gets a new message.
+    Returns (result, shared).
+    """
+    return singleflight.do(
+        message_flight_key(message_type, query, profile_data),
+        lambda: generate_custom_message(message_type, query, profile_data),
+        handoff=True,
+    )
+
+
+def validate_message_request(message_type, query, profile_data):
+    """
+    Return an error message for an invalid generate-message request, or None.
+    """
+    if not message_type or message_type not in ['email', 'linkedin', 'followup']:
+        return 'Invalid messageType. Must be "email", "linkedin", or "followup"'
+
+    if not query or not isinstance(query, str) or not query.strip():
+        return 'Query is required'
+
+    if not profile_data:
+        return 'Profile data is required'
+
+    return None
+
+
 def generate_custom_message(message_type, query, profile_data):
     """
     Generate custom message using Gemini API based on user query and profile data.
     """
-    posts_text = 'No recent posts available'
-    if profile_data.get('posts') and len(profile_data['posts']) > 0:
-        posts_text = '\n\n'.join([
-            f"Post {i+1} ({post.get('time', 'Unknown')}): \"{post.get('text', '')}\" - {post.get('reactions', '0')} reactions, {post.get('comments', '0')} comments"
-            for i, post in enumerate(profile_data['posts'])
-        ])
-
-    profile_summary = f"""
-PROFILE INFORMATION:
-Name: {profile_data.get('name', 'Not available')}
-Location: {profile_data.get('location', 'Not available')}
-Headline (Full): {profile_data.get('headline', 'Not available')}
-Current Company: {profile_data.get('currentCompany', 'Not available')}
-Connections: {profile_data.get('connectionsCount', 'Unknown')}
-
-About: {profile_data.get('about', 'No about section available')}
-
-Experience: {profile_data.get('experience', 'No experience data available')}
-
-Education: {profile_data.get('education', 'No education data')}
-
-Top Skills: {profile_data.get('topSkills', 'No top skills listed')}
-
-All Skills: {profile_data.get('skills', 'No skills listed')}
-
-Recent Activity:
-{profile_data.get('activity', posts_text)}
-"""
-
-    if message_type == 'email':
-        prompt = f"""You are an expert email copywriter. Based on the following LinkedIn profile information and the user's specific request, create a professional, personalized email.
-
-{profile_summary}
-
-USER REQUEST: {query}
-
-Generate a professional email that:
-1. Is personalized to this specific person based on their profile
-2. Addresses the user's request: "{query}"
-3. Is warm, professional, and engaging
-4. Includes a clear subject line
-5. Has a compelling body that references specific details from their profile
-6. Is appropriate for their DISC personality type (if discernible from profile)
-7. Is concise but complete (2-3 paragraphs max)
-
-Return ONLY this JSON (no markdown):
-{{
-  "subject": "Email subject line here",
-  "body": "Complete email body here with proper formatting"
-}}"""
-    elif message_type == 'linkedin':
-        prompt = f"""You are an expert LinkedIn message writer. Based on the following LinkedIn profile information and the user's specific request, create a personalized LinkedIn connection message or InMail.
-
-{profile_summary}
-
-USER REQUEST: {query}
-
-Generate a LinkedIn message that:
-1. Is personalized to this specific person based on their profile
-2. Addresses the user's request: "{query}"
-3. Is warm, professional, and engaging
-4. Is concise (under 300 characters for connection requests, can be longer for InMail)
-5. References specific details from their profile to show you've done research
-6. Has a clear value proposition or reason for connecting
-7. Is appropriate for their communication style
-
-Return ONLY this JSON (no markdown):
-{{
-  "message": "Complete LinkedIn message here"
-}}"""
-    else:
-        prompt = f"""You are an expert follow-up message writer. Based on the following LinkedIn profile information and the user's specific request, create a personalized follow-up message.
-
-{profile_summary}
-
-USER REQUEST: {query}
-
-Generate a follow-up message that:
-1. Is personalized to this specific person based on their profile
-2. Addresses the user's request: "{query}"
-3. Acknowledges any previous conversation or interaction
-4. Provides additional value or information
-5. Is warm, professional, and not pushy
-6. Includes a soft call-to-action
-7. Is appropriate for follow-up timing (3-5 days after initial contact)
-
-Return ONLY this JSON (no markdown):
-{{
-  "message": "Complete follow-up message here"
-}}"""
-
-    gemini_api_key = settings.GEMINI_API_KEY
-    if not gemini_api_key:
-        raise ValueError('GEMINI_API_KEY is not configured in environment variables')
-
-    api_url = settings.GEMINI_API_URL
+    prompt = build_message_prompt(message_type, query, profile_data)
+    data = gemini.generate_content(prompt.text, prompt.generation_config)
+    return finalize(gemini.parse_json_response(data), MESSAGE_RESPONSE_SERIALIZERS[message_type])
+
+
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication])
+@permission_classes([IsAdminUser])
+def get_metrics(request):
+    """
+    Return in-process counters for the worker that serves the request.
+    Staff only (admin session or basic auth): the counters describe the deployment.
     
-    response = requests.post(
-        api_url,
-        headers={
-            'Content-Type': 'application/json',
-            'x-goog-api-key': gemini_api_key
+    Example: GET /api/metrics/
+    """
+    return Response(
+        {
+            'analysisCache': analysis_cache.stats(),
+            'database': db_pool.stats(),
+            'counters': metrics.snapshot(),
+            'timings': metrics.timings(),
         },
-        json={
-            'contents': [{
-                'parts': [{
-                    'text': prompt
-                }]
-            }],
-            'generationConfig': {
-                'temperature': 0.8
-            }
-        }
+        status=status.HTTP_200_OK
     )
-    
-    if response.status_code != 200:
-        raise Exception(f'Gemini API error: {response.status_code} - {response.text}')
-    
-    data = response.json()
-    
-    finish_reason = data.get('candidates', [{}])[0].get('finishReason', '')
-    if finish_reason == 'MAX_TOKENS':
-        print('WARNING: Gemini response was truncated due to MAX_TOKENS limit')
-    
-    text_response = data['candidates'][0]['content']['parts'][0]['text']
-    
-    json_text = text_response.strip()
-    json_text = json_text.replace('```json\n', '')
-    json_text = json_text.replace('```\n', '')
-    json_text = json_text.replace('```', '')
-    
-    json_match = re.search(r'\{[\s\S]*\}', json_text)
-    if not json_match:
-        raise Exception('Could not parse AI response as JSON')
-    
-    try:
-        result = json.loads(json_match.group(0))
-    except json.JSONDecodeError as e:
-        print(f'JSON parsing error: {e}')
-        print(f'Attempted to parse: {json_match.group(0)[:500]}...')
-        if finish_reason == 'MAX_TOKENS':
-            raise Exception('Response was truncated by token limit. Please increase maxOutputTokens or reduce prompt size.')
-        else:
-            raise Exception(f'Failed to parse JSON response: {str(e)}')
-    
-    return result
@@ -0,0 +1,16 @@
+"""
+Gunicorn settings picked up automatically when gunicorn starts from this directory.
+
+Only the worker hooks live here; bind address, worker count and class are
+still passed on the command line.
+"""
+
+
+def post_worker_init(worker):
+    # Open the database connection / pool before the worker takes traffic.
+    from api.db_pool import prewarm
+    prewarm()
+
+    # In 'thread' job mode, recover analysis jobs orphaned by a previous worker.
+    from api.jobs import start_recovery
+    start_recovery()